@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Batch runner of HydroShoot.
+
+This module runs a batch of simulation scenarios which share the same plant mock-up but differ in their parameters
+or meteorological data (i.e. their working directory) in a pool of worker processes.
+"""
+
+from copy import deepcopy
+from multiprocessing import get_context, get_all_start_methods, cpu_count
+from time import time
+from traceback import format_exc
+
+from hydroshoot import model
+
+_shared_mtg = None
+
+
+def run_batch(g, specs, processes=None):
+    """Runs :func:`hydroshoot.model.run` for each scenario of a batch.
+
+    Args:
+        g: a multiscale tree graph object, shared by all scenarios
+        specs (list): scenario specifications, each given as a dictionary with the following keys:
+            - 'wd' (str): working directory of the scenario (mandatory)
+            - 'name' (str): name of the scenario (the working directory is used if not provided)
+            - 'write_result' (bool): passed to :func:`hydroshoot.model.run` (default True)
+            - 'kwargs' (dict): other keyword arguments passed to :func:`hydroshoot.model.run`
+        processes (int): number of worker processes, if `None` (default) all available cores are used, if 1
+            scenarios are run sequentially in the current process
+
+    Returns:
+        (dict): for each scenario name, a dictionary holding:
+            - 'result' (DataFrame): the result of :func:`hydroshoot.model.run` (`None` if the run failed)
+            - 'runtime' (float): [s] the duration of the run
+            - 'error' (str): the traceback of the failure (`None` if the run succeeded)
+
+    Notes:
+        Each scenario runs on its own copy of :arg:`g`, which is never modified.
+        Workers are forked when the platform allows it, so that :arg:`g` is inherited rather than pickled. Scenario
+            specifications and results are exchanged between processes and must hence be picklable (PlantGL scenes
+            are therefore not supported).
+        The failure of a scenario does not interrupt the other ones.
+
+    """
+    specs = [dict(spec, name=spec.get('name', spec['wd'])) for spec in specs]
+    names = [spec['name'] for spec in specs]
+    assert len(set(names)) == len(names), "Scenario names must be unique."
+
+    if processes is None:
+        processes = min(cpu_count(), len(specs))
+
+    if processes <= 1:
+        _init_worker(g)
+        outputs = [_run_spec(spec) for spec in specs]
+    else:
+        start_method = 'fork' if 'fork' in get_all_start_methods() else 'spawn'
+        pool = get_context(start_method).Pool(processes, initializer=_init_worker, initargs=(g,))
+        try:
+            outputs = list(pool.imap_unordered(_run_spec, specs))
+        finally:
+            pool.close()
+            pool.join()
+
+    outputs = dict(outputs)
+    return {name: outputs[name] for name in names}
+
+
+def _init_worker(g):
+    global _shared_mtg
+    _shared_mtg = g
+
+
+def _run_spec(spec):
+    time_on = time()
+    try:
+        result = model.run(deepcopy(_shared_mtg), spec['wd'], write_result=spec.get('write_result', True),
+                           **spec.get('kwargs', {}))
+        error = None
+    except Exception:
+        result = None
+        error = format_exc()
+
+    return spec['name'], {'result': result, 'runtime': time() - time_on, 'error': error}
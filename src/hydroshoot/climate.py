@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Meteorological inputs of HydroShoot.
+
+This module reads the meteorological data file of a simulation ('meteo.input') into a table indexed by time, with
+the atmospheric CO2 concentration ('Ca') and pressure ('Pa') given default values when they are not provided.
+Parsed tables can be cached in a binary (pickle) file whose name holds the hash of the content of the input file, so
+that the text file is only parsed again once modified.
+"""
+
+from hashlib import sha1
+from os import makedirs, replace
+from os.path import join, isfile, exists
+
+from pandas import read_csv, read_pickle, DatetimeIndex
+
+# Version of the layout of cached tables, to be incremented whenever the parsing below changes
+CACHE_VERSION = 1
+
+
+def file_hash(file_path, block_size=2 ** 20):
+    """Computes the hash of the content of a file.
+
+    Args:
+        file_path (str): path to the file
+        block_size (int): size of the blocks read from the file
+
+    Returns:
+        (str): the hexadecimal SHA-1 digest of the content of the file
+
+    """
+    digest = sha1()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def parse_meteo(file_path):
+    """Reads a meteorological data file.
+
+    Args:
+        file_path (str): path to the file, having at least a 'time' column
+
+    Returns:
+        (DataFrame): meteorological data, indexed by time, with 'Ca' [ppm] and 'Pa' [kPa] columns
+
+    """
+    meteo = read_csv(file_path, sep=';', decimal='.', header=0)
+    meteo.time = DatetimeIndex(meteo.time)
+    meteo = meteo.set_index(meteo.time)
+
+    if 'Ca' not in meteo.columns:
+        meteo['Ca'] = [400.] * len(meteo)  # ppm [CO2]
+    if 'Pa' not in meteo.columns:
+        meteo['Pa'] = [101.3] * len(meteo)  # atmospheric pressure
+
+    return meteo
+
+
+def read_meteo(file_path, cache_dir=None):
+    """Reads a meteorological data file, using a binary cache of previously parsed files.
+
+    Args:
+        file_path (str): path to the file
+        cache_dir (str): folder of cached tables (created if it does not exist), if `None` (default) the file is
+            parsed without caching
+
+    Returns:
+        (DataFrame): meteorological data, as returned by :func:`parse_meteo`
+
+    Notes:
+        Cached tables are identified by the hash of the content of :arg:`file_path`, renaming or moving the file
+            does not invalidate the cache while any change of its content does.
+
+    """
+    if cache_dir is None:
+        return parse_meteo(file_path)
+
+    cache_path = join(cache_dir, 'meteo_v%d_%s.pckl' % (CACHE_VERSION, file_hash(file_path)))
+    if isfile(cache_path):
+        return read_pickle(cache_path)
+
+    meteo = parse_meteo(file_path)
+
+    if not exists(cache_dir):
+        makedirs(cache_dir)
+    tmp_path = cache_path + '.tmp'
+    meteo.to_pickle(tmp_path)
+    replace(tmp_path, cache_path)
+
+    return meteo
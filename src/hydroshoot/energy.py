@@ -13,18 +13,23 @@ from __future__ import print_function
 from builtins import zip
 from builtins import range
 from past.utils import old_div
+import logging
 import time
 from math import pi
+from numpy import array, abs as np_abs, cross, sqrt, concatenate, bincount
 from scipy import optimize, mean
+from scipy.sparse import coo_matrix, issparse
+from scipy.spatial import cKDTree
 from sympy.solvers import nsolve
 from sympy import Symbol
 
 from alinea.caribu.CaribuScene import CaribuScene
-from alinea.caribu.sky_tools import turtle
-import alinea.astk.icosphere as ico
 import openalea.plantgl.all as pgl
 
 from hydroshoot import utilities as utils
+from hydroshoot.irradiance import sky_directions
+
+logger = logging.getLogger(__name__)
 
 
 a_PAR = 0.87
@@ -100,19 +105,14 @@ def form_factors_simplified(g, pattern=None, infinite=False, leaf_lbl_prefix='L'
     geom = g.property('geometry')
     label = g.property('label')
     opts = {'SW': {vid: ((0.001, 0) if label[vid].startswith(leaf_lbl_prefix) else (0.001,)) for vid in geom}}
-    if not icosphere_level:
-        energy, emission, direction, elevation, azimuth = turtle.turtle(sectors=turtle_sectors, format='uoc', energy=1.)
-    else:
-        vert, fac = ico.turtle_dome(icosphere_level)
-        direction = list(ico.sample_faces(vert, fac, iter=None, spheric=False).values())
-        direction = [i[0] for i in direction]
-        direction = [tuple(list(x[:2]) + [-x[2]]) for x in direction]
+    sky, _ = sky_directions(turtle_sectors, 'uoc', icosphere_level)
+    direction = [tuple(idirect) for idirect in sky.tolist()]
 
     caribu_source = list(zip(len(direction) * [1. / len(direction)], direction))
     k_soil, k_sky, k_leaves = {}, {}, {}
 
     for s in ('pirouette', 'cacahuete'):
-        print('... %s' % s)
+        logger.info('... %s', s)
         if s == 'pirouette':
             scene = pgl_scene(g, flip=True)
         else:
@@ -140,6 +140,124 @@ def form_factors_simplified(g, pattern=None, infinite=False, leaf_lbl_prefix='L'
     return k_soil, k_sky, k_leaves
 
 
+def leaf_facets(g, leaves, length_conv=1.e-2):
+    """Approximates each leaf by a plane facet.
+
+    Args:
+        g: a multiscale tree graph object
+        leaves (list): ids of leaf vertices
+        length_conv (float): [-] conversion factor from the `unit_scene_length` to 1 m
+
+    Returns:
+        (numpy.ndarray): [m] coordinates of the area-weighted centroids of the leaves, of shape (n, 3)
+        (numpy.ndarray): [-] unit normal vectors of the leaves, of shape (n, 3)
+        (numpy.ndarray): [m2] one-sided surface areas of the leaves, of shape (n,)
+
+    """
+    geometry = g.property('geometry')
+    tesselator = pgl.Tesselator()
+
+    centroids, normals, areas = [], [], []
+    for vid in leaves:
+        geometry[vid].apply(tesselator)
+        mesh = tesselator.triangulation
+        points = array([tuple(point) for point in mesh.pointList]) * length_conv
+        triangles = array([tuple(index) for index in mesh.indexList])
+        p0, p1, p2 = [points[triangles[:, i]] for i in range(3)]
+
+        area_vectors = 0.5 * cross(p1 - p0, p2 - p0)
+        triangle_areas = sqrt((area_vectors ** 2).sum(axis=1))
+        area = triangle_areas.sum()
+        normal = area_vectors.sum(axis=0)
+
+        centroids.append((triangle_areas[:, None] * (p0 + p1 + p2) / 3.).sum(axis=0) / area)
+        normals.append(normal / sqrt((normal ** 2).sum()))
+        areas.append(area)
+
+    return array(centroids), array(normals), array(areas)
+
+
+def form_factors_matrix(g, pattern=None, length_conv=1.e-2, limit=-1.e-4, leaf_lbl_prefix='L'):
+    """Computes sky, soil and leaf-to-leaf form factors of the leaves of a plant shoot.
+
+    Args:
+        g: a multiscale tree graph object
+        pattern (tuple): 2D Coordinates of the domain bounding the scene for its replication,
+            ((xmin, ymin), (xmax, ymax)) in the scene length unit. If `None`, the scene is not repeated
+        length_conv (float): [-] conversion factor from the `unit_scene_length` to 1 m
+        limit (float): (negative) threshold of the form factors, leaf-to-leaf form factors having absolute values
+            lower than `abs(limit)` are ignored
+        leaf_lbl_prefix (str): the prefix of the leaf label
+
+    Returns:
+        (dict): [-] soil form factors of the individual leaves given as the dictionary keys
+        (dict): [-] sky form factors of the individual leaves given as the dictionary keys
+        (scipy.sparse.csr_matrix): [-] leaf-to-leaf form factors matrix, given as negative values, whose rows and
+            columns follow the order of :func:`get_leaves`
+
+    Notes:
+        Leaves are approximated by two-sided plane facets (see :func:`leaf_facets`) and the form factor between two
+            facets i and j is approximated by the differential-area-to-disc formula
+            |cos(theta_i) * cos(theta_j)| * A_j / (pi * r_ij ** 2 + A_j). Mutual shading is not considered.
+        As form factors are lower than A_j / (pi * r_ij ** 2 + A_j), :arg:`limit` translates into a maximum distance
+            beyond which leaf pairs are not evaluated. Candidate pairs are selected using a spatial index, so that the
+            full N x N matrix is never built.
+        When :arg:`pattern` is provided, the scene is assumed to be infinitely replicated and each leaf pair is
+            evaluated through its nearest periodic image.
+
+    """
+    leaves = get_leaves(g, leaf_lbl_prefix)
+    leaves_number = len(leaves)
+    centroids, normals, areas = leaf_facets(g, leaves, length_conv)
+
+    ff_min = abs(limit)
+    max_distance = sqrt(areas.max() * max(0., 1. / ff_min - 1.) / pi)
+
+    # leaf coordinates are shifted to the positive domain, as required by the toroidal topology of the spatial index
+    positions = centroids - centroids.min(axis=0)
+    z_range = positions[:, 2].max()
+    if pattern is not None:
+        (x_min, y_min), (x_max, y_max) = [[coord * length_conv for coord in corner] for corner in pattern]
+        box_size = array([x_max - x_min, y_max - y_min, 2. * (z_range + max_distance) + 1.])
+        max_distance = min(max_distance, 0.5 * box_size[:2].min())
+        positions[:, :2] = (centroids[:, :2] - array([x_min, y_min])) % box_size[:2]
+        tree = cKDTree(positions, boxsize=box_size)
+    else:
+        box_size = None
+        tree = cKDTree(positions)
+
+    pairs = tree.query_pairs(max_distance, output_type='ndarray')
+    i, j = pairs[:, 0], pairs[:, 1]
+
+    distance_vectors = positions[j] - positions[i]
+    if box_size is not None:
+        distance_vectors[:, :2] -= box_size[:2] * (distance_vectors[:, :2] / box_size[:2]).round()
+    distance_sq = (distance_vectors ** 2).sum(axis=1)
+    cos_product = np_abs((normals[i] * distance_vectors).sum(axis=1) *
+                         (normals[j] * distance_vectors).sum(axis=1)) / distance_sq
+
+    ff_ij = cos_product * areas[j] / (pi * distance_sq + areas[j])
+    ff_ji = cos_product * areas[i] / (pi * distance_sq + areas[i])
+
+    rows = concatenate((i, j))
+    cols = concatenate((j, i))
+    values = concatenate((ff_ij, ff_ji))
+    is_above = concatenate((distance_vectors[:, 2] > 0, distance_vectors[:, 2] < 0))
+
+    relevant = values >= ff_min
+    rows, cols, values, is_above = rows[relevant], cols[relevant], values[relevant], is_above[relevant]
+
+    k_leaves = coo_matrix((-values, (rows, cols)), shape=(leaves_number, leaves_number)).tocsr()
+
+    # leaves located above (resp. below) a given leaf hide the sky (resp. the soil)
+    ff_above = bincount(rows[is_above], weights=values[is_above], minlength=leaves_number)
+    ff_below = bincount(rows[~is_above], weights=values[~is_above], minlength=leaves_number)
+    k_sky = {vid: max(0., 1. - ff_above[ivid]) for ivid, vid in enumerate(leaves)}
+    k_soil = {vid: max(0., 1. - ff_below[ivid]) for ivid, vid in enumerate(leaves)}
+
+    return k_soil, k_sky, k_leaves
+
+
 def leaf_temperature_as_air_temperature(g, meteo, leaf_lbl_prefix='L'):
     """Basic model for leaf temperature, considered equal to air temperature for all leaves
 
@@ -215,7 +333,152 @@ def heat_boundary_layer_conductance(leaves_length, wind_speed=0):
     return {vid: _gbH(leaves_length[vid], u[vid]) for vid in leaves_length}
 
 
-# TODO: split leaf_temperature() into two functions following whether solo is used or not
+def solve_leaf_energy_balance(t_init, shortwave_abs, longwave_inc, evap, gbh, temp_air, max_iter=50,
+                              t_error_crit=1.e-6):
+    """Solves the energy balance of a set of leaves simultaneously using Newton iterations on arrays.
+
+    Args:
+        t_init (numpy.ndarray): [K] temperature of the individual leaves used for initialisation
+        shortwave_abs (numpy.ndarray): [W m-2] absorbed shortwave irradiance
+        longwave_inc (numpy.ndarray): [W m-2] absorbed longwave irradiance emitted by the sky, the soil and the
+            surrounding leaves
+        evap (numpy.ndarray): [mol m-2 s-1] evaporation flux
+        gbh (numpy.ndarray): [W m-2 K-1] boundary layer conductance for heat
+        temp_air (float): [K] air temperature
+        max_iter (int): maximum allowed number of Newton iterations
+        t_error_crit (float): [K] maximum allowed temperature change between two consecutive Newton iterations
+
+    Returns:
+        (numpy.ndarray): [K] the temperature of the individual leaves
+
+    Notes:
+        Each leaf balance only depends on its own temperature, the Jacobian of the system is therefore diagonal and
+            reduces to the derivative of the emitted longwave (quartic) and sensible heat terms.
+
+    """
+
+    t_leaf = array(t_init, dtype=float)
+    energy_input = shortwave_abs + longwave_inc - lambda_ * evap + gbh * temp_air
+
+    for _ in range(max_iter):
+        residual = energy_input - 2. * e_leaf * sigma * t_leaf ** 4 - gbh * t_leaf
+        derivative = -8. * e_leaf * sigma * t_leaf ** 3 - gbh
+        t_delta = residual / derivative
+        t_leaf -= t_delta
+        if np_abs(t_delta).max() < t_error_crit:
+            break
+
+    return t_leaf
+
+
+def leaf_energy_inputs(leaves, t_soil, t_sky_eff, form_factors, gbh, ei, ff_type=True):
+    """Gathers the terms of the energy budget of the leaves that do not depend on leaf temperature nor evaporation.
+
+    Args:
+        leaves (list): ids of the leaves, giving the order of the returned arrays
+        t_soil (float): [°C] soil surface temperature
+        t_sky_eff (float): [°C] effective sky temperature
+        form_factors(3-tuple of float or dict): form factors for soil, sky and leaves, see :func:`leaf_temperature`
+        gbh (float or dict): [W m-2 K-1] boundary layer conductance for heat
+        ei (float or dict): [umol m-2 s-1] photosynthetically active radition (PAR) incident on leaves
+        ff_type (bool): form factor type flag, see :func:`leaf_temperature`
+
+    Returns:
+        (numpy.ndarray): [W m-2] absorbed shortwave irradiance
+        (numpy.ndarray): [W m-2] longwave irradiance emitted by the sky and the soil, weighted by their form factors
+        (numpy.ndarray or scipy.sparse.csr_matrix): leaf-to-leaf form factors, a single value per leaf if
+            :arg:`ff_type` is True, or a matrix whose rows and columns follow :arg:`leaves` otherwise
+        (numpy.ndarray): [W m-2 K-1] boundary layer conductance for heat
+
+    """
+
+    def _values(val):
+        return array([val[vid] for vid in leaves]) if isinstance(val, dict) else array([val] * len(leaves))
+
+    k_soil, k_sky, k_leaves = form_factors
+    temp_sky = utils.celsius_to_kelvin(t_sky_eff)
+    temp_soil = utils.celsius_to_kelvin(t_soil)
+
+    shortwave_abs = a_glob * _values(ei) / (0.48 * 4.6)  # Ei not Eabs
+    longwave_sky_soil = (_values(k_sky) * e_sky * sigma * temp_sky ** 4 +
+                         _values(k_soil) * e_soil * sigma * temp_soil ** 4)
+    if ff_type:
+        ff_leaves = _values(k_leaves)
+    elif issparse(k_leaves):
+        ff_leaves = k_leaves.tocsr()
+    else:
+        leaf_index = {vid: i for i, vid in enumerate(leaves)}
+        rows, cols, values = [], [], []
+        for i, vid in enumerate(leaves):
+            for ivid, ff in k_leaves[vid].items():
+                rows.append(i)
+                cols.append(leaf_index[ivid])
+                values.append(ff)
+        ff_leaves = coo_matrix((values, (rows, cols)), shape=(len(leaves), len(leaves))).tocsr()
+
+    return shortwave_abs, longwave_sky_soil, ff_leaves, _values(gbh)
+
+
+def solve_leaf_temperature(t_init, shortwave_abs, longwave_sky_soil, ff_leaves, evap, gbh, t_air, ff_type=True,
+                           max_iter=100, t_error_crit=0.01, t_step=0.5):
+    """Computes the temperature of a set of leaves, each leaf budget being solved assuming the temperatures of
+    surrounding leaves as constant (from the previous iteration).
+
+    Args:
+        t_init (numpy.ndarray): [°C] temperature of the leaves used for initialisation
+        shortwave_abs, longwave_sky_soil, ff_leaves, gbh: energy budget terms of the leaves, see
+            :func:`leaf_energy_inputs`
+        evap (numpy.ndarray): [mol m-2 s-1] evaporation flux
+        t_air (float): [°C] air temperature
+        ff_type (bool): form factor type flag, see :func:`leaf_temperature`
+        max_iter (int): maximum allowed iteration
+        t_error_crit (float): [°C] maximum allowed error in leaf temperature
+        t_step (float): [°C] maximum temperature step between two consecutive iterations
+
+    Returns:
+        (numpy.ndarray): [°C] the temperature of the leaves
+        (int): [-] the number of iterations
+
+    """
+
+    temp_air = utils.celsius_to_kelvin(t_air)
+
+    t_prev = array(t_init, dtype=float)
+    t_new = t_prev
+    t_error_trace = []
+    it = 0
+    it_step = t_step
+    for it in range(max_iter):
+        t_prev_k = utils.celsius_to_kelvin(t_prev)
+
+        if not ff_type:
+            longwave_grain_from_leaves = -sigma * ff_leaves.dot(t_prev_k ** 4)
+        else:
+            longwave_grain_from_leaves = ff_leaves * sigma * t_prev_k ** 4
+
+        longwave_inc = e_leaf * (longwave_sky_soil + e_leaf * longwave_grain_from_leaves)
+
+        t_new = utils.kelvin_to_celsius(
+            solve_leaf_energy_balance(t_prev_k, shortwave_abs, longwave_inc, evap, gbh, temp_air))
+
+        # evaluation of leaf temperature conversion criterion
+        t_error = np_abs(t_prev - t_new).max()
+        t_error_trace.append(t_error)
+
+        if t_error < t_error_crit:
+            break
+        else:
+            try:
+                if abs(t_error_trace[-1] - t_error_trace[-2]) < t_error_crit:
+                    it_step = max(0.01, it_step / 2.)
+            except IndexError:
+                pass
+
+            t_prev = t_prev + it_step * (t_new - t_prev)
+
+    return t_new, it
+
+
 def leaf_temperature(g, meteo, t_soil, t_sky_eff, t_init=None, form_factors=None, gbh=None, ev=None, ei=None, solo=True,
                      ff_type=True, leaf_lbl_prefix='L', max_iter=100, t_error_crit=0.01, t_step=0.5):
     """Computes the temperature of each individual leaf and soil elements.
@@ -238,7 +501,9 @@ def leaf_temperature(g, meteo, t_soil, t_sky_eff, t_init=None, form_factors=None
             if True (default), calculates energy budget for each element assuming the temperatures of surrounding
                 leaves as constant (from previous calculation step)
             if False, computes simultaneously all temperatures using `sympy.solvers.nsolve` (**very costly!!!**)
-        ff_type (bool): form factor type flag. If true fform factor for a given leaf is expected to be a single value, or a dict of ff otherwxie
+        ff_type (bool): form factor type flag. If true fform factor for a given leaf is expected to be a single value,
+            or a dict of ff otherwxie. In the latter case, leaf-to-leaf form factors may alternatively be given as a
+            sparse matrix (see :func:`form_factors_matrix`)
         leaf_lbl_prefix (str): the prefix of the leaf label
         max_iter (int): maximum allowed iteration (used only when :arg:`solo` is True)
         t_error_crit (float): [°C] maximum allowed error in leaf temperature (used only when :arg:`solo` is True)
@@ -265,6 +530,9 @@ def leaf_temperature(g, meteo, t_soil, t_sky_eff, t_init=None, form_factors=None
         ei = 0
 
     k_soil, k_sky, k_leaves = form_factors
+    if issparse(k_leaves) and not solo:
+        k_leaves = {vid: {leaves[ivid]: ff for ivid, ff in zip(row.indices, row.data)}
+                    for vid, row in zip(leaves, k_leaves.tocsr())}
     properties = {}
     for what in ('t_init', 'gbh', 'ev', 'ei', 'k_soil', 'k_sky', 'k_leaves'):
         val = eval(what)
@@ -283,67 +551,13 @@ def leaf_temperature(g, meteo, t_soil, t_sky_eff, t_init=None, form_factors=None
 
     # iterative calculation of leaves temperature
     if solo:
-        t_error_trace = []
-        it_step = t_step
-        for it in range(max_iter):
-            t_dict = {}
-
-            for vid in leaves:
-                shortwave_inc = old_div(properties['ei'][vid], (0.48 * 4.6))  # Ei not Eabs
-
-                ff_sky = properties['k_sky'][vid]
-                ff_leaves = properties['k_leaves'][vid]
-                ff_soil = properties['k_soil'][vid]
-
-                gb_h = properties['gbh'][vid]
-                evap = properties['ev'][vid]
-                t_leaf = t_prev[vid]
-
-                if not ff_type:
-                    longwave_grain_from_leaves = -sigma * sum(
-                        [ff_leaves[ivid] * (utils.celsius_to_kelvin(t_prev[ivid])) ** 4 for ivid in ff_leaves])
-                else:
-                    longwave_grain_from_leaves = ff_leaves * sigma * (utils.celsius_to_kelvin(t_leaf)) ** 4
-
-                def _VineEnergyX(t_leaf):
-                    shortwave_abs = a_glob * shortwave_inc
-                    longwave_net = e_leaf * (ff_sky * e_sky * sigma * temp_sky ** 4 +
-                                             e_leaf * longwave_grain_from_leaves +
-                                             ff_soil * e_soil * sigma * temp_soil ** 4) \
-                                   - 2 * e_leaf * sigma * t_leaf ** 4
-                    latent_heat_loss = -lambda_ * evap
-                    sensible_heat_net = -gb_h * (t_leaf - temp_air)
-                    energy_balance = shortwave_abs + longwave_net + latent_heat_loss + sensible_heat_net
-                    return energy_balance
-
-                t_leaf0 = utils.kelvin_to_celsius(
-                    optimize.newton_krylov(_VineEnergyX, utils.celsius_to_kelvin(t_leaf)))
-
-                t_dict[vid] = t_leaf0
-
-            t_new = t_dict
-
-            # evaluation of leaf temperature conversion criterion
-            error_dict = {vtx: abs(t_prev[vtx] - t_new[vtx]) for vtx in leaves}
-
-            t_error = max(error_dict.values())
-            t_error_trace.append(t_error)
-
-            if t_error < t_error_crit:
-                break
-            else:
-                try:
-                    if abs(t_error_trace[-1] - t_error_trace[-2]) < t_error_crit:
-                        it_step = max(0.01, it_step / 2.)
-                except IndexError:
-                    pass
-
-                t_next = {}
-                for vtx_id in list(t_new.keys()):
-                    tx = t_prev[vtx_id] + it_step * (t_new[vtx_id] - t_prev[vtx_id])
-                    t_next[vtx_id] = tx
-
-                t_prev = t_next
+        shortwave_abs, longwave_sky_soil, ff_leaves, gb_h = leaf_energy_inputs(
+            leaves, t_soil, t_sky_eff, (k_soil, k_sky, k_leaves), properties['gbh'], properties['ei'], ff_type)
+        evap = array([properties['ev'][vid] for vid in leaves])
+        t_new, it = solve_leaf_temperature(array([t_prev[vid] for vid in leaves]), shortwave_abs, longwave_sky_soil,
+                                           ff_leaves, evap, gb_h, meteo.Tac[0], ff_type, max_iter, t_error_crit,
+                                           t_step)
+        t_new = dict(zip(leaves, t_new.tolist()))
 
     # matrix iterative calculation of leaves temperature ('not solo' case)
     else:
@@ -381,7 +595,7 @@ def leaf_temperature(g, meteo, t_soil, t_sky_eff, t_init=None, form_factors=None
 
         tt = time.time()
         t_leaf0_lst = nsolve(eq_lst, t_lst, t_leaf_lst, verify=False) - 273.15
-        print ("---%s seconds ---" % (time.time() - tt))
+        logger.debug("---%s seconds ---", time.time() - tt)
 
         t_new = {}
         for ivid, vid in enumerate(leaves):
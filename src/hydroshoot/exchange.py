@@ -7,8 +7,7 @@ Gas-exchange module of HydroShoot.
 This module computes net photosynthesis and stomatal conductance rates.
 
 """
-from copy import deepcopy
-from scipy import exp, arccos, sqrt, cos, log
+from numpy import exp, arccos, sqrt, cos, log, array, full, minimum, maximum, clip, where
 
 from hydroshoot import utilities as utils
 
@@ -232,10 +231,10 @@ def dHd_sensibility(psi, temp, dhd_max=200.,
 
     """
 
-    dhd_temp_effect = dhd_inhib_beg - (dhd_inhib_beg - dHd_inhib_max) * min(1.,
-                                                                            max(0., (temp - temp_inhib_beg)) / float(
-                                                                                temp_inhib_max - temp_inhib_beg))
-    dhd_psi_effect = dhd_max - max(0., (dhd_max - dhd_temp_effect) * min(1., (psi - psi_inhib_beg) / float(
+    dhd_temp_effect = dhd_inhib_beg - (dhd_inhib_beg - dHd_inhib_max) * minimum(1.,
+                                                                                maximum(0., (temp - temp_inhib_beg)) / float(
+                                                                                    temp_inhib_max - temp_inhib_beg))
+    dhd_psi_effect = dhd_max - maximum(0., (dhd_max - dhd_temp_effect) * minimum(1., (psi - psi_inhib_beg) / float(
         psi_inhib_max - psi_inhib_beg)))
 
     return dhd_psi_effect
@@ -331,9 +330,9 @@ def fvpd_3(model, vpd, psi, psi_crit=-0.37, m0=5.278, steepness_tuzet=1.85, d0_l
         reduction_factor = 1. / (1. + (psi / psi_crit) ** steepness_tuzet)
     elif model == 'tuzet':
         reduction_factor = (1. + exp(steepness_tuzet * psi_crit)) / (
-                    1. + exp(float(steepness_tuzet * (psi_crit - psi))))
+                    1. + exp(steepness_tuzet * (psi_crit - psi)))
     elif model == 'linear':
-        reduction_factor = 1. - min(1., float(psi / psi_crit))
+        reduction_factor = 1. - minimum(1., psi / psi_crit)
     elif model == 'vpd':
         reduction_factor = 1. / (1. + vpd / float(d0_leuning))
     else:
@@ -448,7 +447,7 @@ def compute_amono_analytic(x1, x2, leaf_temperature, vpd, gammax, rd, psi, model
     cube_r = -(cube_a * cube_b / cube_e)
     cube_Q = (cube_p ** 2. - 3. * cube_q) / 9.
     cube_R = (2. * cube_p ** 3. - 9. * cube_p * cube_q + 27. * cube_r) / 54.
-    cube_xi = arccos(max(-1., min(1., cube_R / sqrt(cube_Q ** 3.))))
+    cube_xi = arccos(clip(cube_R / sqrt(cube_Q ** 3.), -1., 1.))
 
     a_mono = -2. * sqrt(cube_Q) * cos(cube_xi / 3.) - cube_p / 3.
 
@@ -501,15 +500,16 @@ def compute_an_analytic(leaf_temperature, vpd, x1c, x2c, x1j, x2j, x1t, x2t, rd,
     a_t = compute_amono_analytic(x1t, x2t, leaf_temperature, vpd, gammax, rd, psi, model, g0, rbt, ca, m0, psi0,
                                  d0_leuning, steepness_tuzet)
 
-    a_n = min(a_c, a_j, a_t)
+    a_n = minimum(minimum(a_c, a_j), a_t)
+
+    # parameters of the limiting process
+    is_c_limited = a_n == a_c
+    is_j_limited = ~is_c_limited & (a_n == a_j)
+    x1 = where(is_c_limited, x1c, where(is_j_limited, x1j, x1t))
+    x2 = where(is_c_limited, x2c, where(is_j_limited, x2j, x2t))
 
     # chlorophyll partial pressure [ubar]
-    if min(a_c, a_j, a_t) == a_c:
-        c_c = (gammax * x1c + (a_c + rd) * x2c) / (x1c - a_c - rd)
-    elif min(a_c, a_j, a_t) == a_j:
-        c_c = (gammax * x1j + (a_j + rd) * x2j) / (x1j - a_j - rd)
-    else:
-        c_c = (gammax * x1t + (a_t + rd) * x2t) / (x1t - a_t - rd)
+    c_c = (gammax * x1 + (a_n + rd) * x2) / (x1 - a_n - rd)
 
     # inter-cellular partial pressure [ubar]
     c_i = c_c + a_n / mesophyll_conductance(leaf_temperature)
@@ -554,7 +554,7 @@ def an_gs_ci(photo_params, meteo_leaf, psi, leaf_temperature, model='misson', g0
     ppfd = meteo_leaf['PPFD']
     hs = meteo_leaf['hs']
 
-    ppfd = max(1.e-6, ppfd)  # To avoid numerical instability
+    ppfd = maximum(1.e-6, ppfd)  # To avoid numerical instability
 
     vpd = utils.vapor_pressure_deficit(air_temperature, leaf_temperature, hs)
 
@@ -592,6 +592,114 @@ def transpiration_rate(leaf_temperature, ea, gs, gb, atm_pressure=101.3):
     return transpiration
 
 
+def leaf_gas_exchange_rates(leaf_temperature, ppfd, psi, leaf_nitrogen, leaf_length, air_temperature,
+                            relative_humidity, wind_speed, co2_concentration, atm_pressure, photo_params,
+                            photo_n_params, gs_params, rbt=2. / 3.):
+    """Computes gas exchange fluxes of a set of leaves analytically, in a single vectorized pass.
+
+    Args:
+        leaf_temperature (numpy.ndarray): [°C] leaf temperature
+        ppfd (numpy.ndarray): [umol m-2 s-1] photosynthetic photon flux density (incident or absorbed)
+        psi (numpy.ndarray): [MPa] bulk water potential of the leaves
+        leaf_nitrogen (numpy.ndarray): [gN m-2] nitrogen content per unit leaf area
+        leaf_length (numpy.ndarray): [m] leaf length, in the unit expected by :func:`boundary_layer_conductance`
+        air_temperature (float): [°C] air temperature
+        relative_humidity (float): (%) air relative humidity
+        wind_speed (float): [m s-1] wind speed
+        co2_concentration (float): [ppm] CO2 concentration in the air
+        atm_pressure (float): [kPa] atmospheric pressure
+        photo_params (dict): values at 25 °C of Farquhar's model (cf. :func:`par_photo_default`)
+        photo_n_params (dict): the (slope, intercept) values of the linear relationship between photosynthetic capacity
+            parameters (Vcmax, Jmax, TPU, Rd) and surface-based leaf Nitrogen content
+        gs_params (dict): parameters of the stomatal conductance model (model, g0, m0, psi0, D0, n)
+        rbt (float): [m2 s ubar umol-1] the combined turbulance and boundary layer resistance to CO2 transport
+
+    Returns:
+        (numpy.ndarray): [umol m-2 s-1] the net CO2 assimilation
+        (numpy.ndarray): [umol mol] intercellular CO2 concentration
+        (numpy.ndarray): [mol m-2 s-1] stomatal conductance to water vapor
+        (numpy.ndarray): [mol m-2 s-1] boundary layer conductance to water vapor
+        (numpy.ndarray): [mol m-2leaf s-1] transpiration per unit leaf surface area
+
+    """
+
+    model, g0, m0, psi0, D0, n = [gs_params[ikey] for ikey in ('model', 'g0', 'm0', 'psi0', 'D0', 'n')]
+
+    leaf_temperature, ppfd, psi, leaf_nitrogen, leaf_length = [
+        array(x, dtype=float) for x in (leaf_temperature, ppfd, psi, leaf_nitrogen, leaf_length)]
+
+    leaf_par_photo = _leaf_photo_params(leaf_temperature, psi, leaf_nitrogen, photo_params, photo_n_params)
+
+    meteo_leaf = {'Tac': air_temperature, 'hs': relative_humidity, 'PPFD': ppfd}
+    a_n, c_c, c_i, gs = an_gs_ci(leaf_par_photo, meteo_leaf, psi, leaf_temperature, model, g0, rbt,
+                                 co2_concentration, m0, psi0, D0, n)
+
+    gb = boundary_layer_conductance(leaf_length, wind_speed, atm_pressure, air_temperature, R)
+
+    # Transpiration
+    es_a = utils.saturated_air_vapor_pressure(air_temperature)
+    ea = es_a * relative_humidity / 100.
+    e = transpiration_rate(leaf_temperature, ea, gs, gb, atm_pressure)
+
+    return a_n, c_i, gs, gb, maximum(0., e)
+
+
+def leaf_dark_exchange_rates(leaf_temperature, psi, leaf_nitrogen, leaf_length, air_temperature, relative_humidity,
+                             wind_speed, co2_concentration, atm_pressure, photo_params, photo_n_params, gs_params,
+                             rbt=2. / 3.):
+    """Computes gas exchange fluxes of a set of leaves in the dark, in closed form.
+
+    Args:
+        See :func:`leaf_gas_exchange_rates`, leaves receiving no irradiance.
+
+    Returns:
+        See :func:`leaf_gas_exchange_rates`.
+
+    Notes:
+        Without irradiance, electron transport vanishes so that net CO2 assimilation reduces to mitochondrial
+            respiration (An = -Rd) and stomatal conductance to its residual value (gs = g0), whatever the water
+            potential of the leaves is. These are the limits of the An-gs-Ci system solved by
+            :func:`leaf_gas_exchange_rates` as irradiance vanishes. Intercellular CO2 concentration then follows
+            from the diffusion of respired CO2 through the residual stomatal and boundary layer resistances.
+
+    """
+
+    leaf_temperature, psi, leaf_nitrogen, leaf_length = [
+        array(x, dtype=float) for x in (leaf_temperature, psi, leaf_nitrogen, leaf_length)]
+
+    leaf_par_photo = _leaf_photo_params(leaf_temperature, psi, leaf_nitrogen, photo_params, photo_n_params)
+    r_d = arrhenius_2('Rdmax', leaf_temperature, leaf_par_photo)
+    a_n = -r_d
+
+    g0 = gs_params['g0']
+    c_i = utils.cpa2cmol(leaf_temperature,
+                         utils.cmol2cpa(leaf_temperature, co2_concentration) + r_d * (1. / g0 + rbt))
+    gs = full(leaf_temperature.shape, float(g0))
+
+    gb = boundary_layer_conductance(leaf_length, wind_speed, atm_pressure, air_temperature, R)
+
+    # Transpiration
+    es_a = utils.saturated_air_vapor_pressure(air_temperature)
+    ea = es_a * relative_humidity / 100.
+    e = transpiration_rate(leaf_temperature, ea, gs, gb, atm_pressure)
+
+    return a_n, c_i, gs, gb, maximum(0., e)
+
+
+def _leaf_photo_params(leaf_temperature, psi, leaf_nitrogen, photo_params, photo_n_params):
+    """Returns the photosynthetic parameters of each leaf, given its Nitrogen content, water potential and
+    temperature (see :func:`leaf_gas_exchange_rates`)."""
+
+    leaf_par_photo = dict(photo_params)
+    for param_name, n_param_name in (('Vcm25', 'Vcm25_N'), ('Jm25', 'Jm25_N'), ('TPU25', 'TPU25_N'), ('Rd', 'Rd_N')):
+        slope, intercept = photo_n_params[n_param_name]
+        leaf_par_photo[param_name] = slope * leaf_nitrogen + intercept
+    leaf_par_photo['dHd'] = dHd_sensibility(psi, leaf_temperature, dhd_max=photo_params['dHd'], dhd_inhib_beg=195.,
+                                            dHd_inhib_max=180., psi_inhib_beg=-.75, psi_inhib_max=-2.,
+                                            temp_inhib_beg=32, temp_inhib_max=33)
+    return leaf_par_photo
+
+
 def gas_exchange_rates(g, photo_params, photo_n_params, gs_params, meteo, E_type2,
                        leaf_lbl_prefix='L', rbt=2. / 3.):
     """Computes gas exchange fluxes at the leaf scale analytically.
@@ -619,61 +727,25 @@ def gas_exchange_rates(g, photo_params, photo_n_params, gs_params, meteo, E_type
             gs (float): [mol m-2 s-1] stomatal conductance to water vapor
             gb (float): [mol m-2 s-1] boundary layer conductance to water vapor
             E (float): [mol m-2leaf s-1] transpiration per unit leaf surface area
+        Calculations are performed for all leaves at once by :func:`leaf_gas_exchange_rates`.
 
     """
 
-    model, g0max, m0, psi0, D0, n = [gs_params[ikey] for ikey in ('model', 'g0', 'm0', 'psi0', 'D0', 'n')]
-
-    meteo_leaf = deepcopy(meteo)
-    meteo_leaf = meteo_leaf.iloc[0]
-
-    for vid in g:
-        if vid > 0:
-            node = g.node(vid)
-            if node.label.startswith(leaf_lbl_prefix):
-                t_air = meteo_leaf.Tac
-                hs = meteo_leaf.hs
-                u = meteo_leaf.u
-                c_a = meteo_leaf.Ca
-                atm_press = meteo_leaf.Pa
-
-                node.u = u  # TODO replace the meso-wind speed (u) by a micro-wind speed at the level of each leaf
-
-                psi = node.properties()['psi_head']
-                t_leaf = node.properties()['Tlc']
-                ppfd_leaf = node.properties()[E_type2]
-
-                meteo_leaf['PPFD'] = ppfd_leaf
-                meteo_leaf['Rg'] = ppfd_leaf / (0.48 * 4.6)
-
-                leaf_par_photo = deepcopy(photo_params)
-                leaf_par_photo['Vcm25'] = photo_n_params['Vcm25_N'][0] * node.Na + photo_n_params['Vcm25_N'][1]
-                leaf_par_photo['Jm25'] = photo_n_params['Jm25_N'][0] * node.Na + photo_n_params['Jm25_N'][1]
-                leaf_par_photo['TPU25'] = photo_n_params['TPU25_N'][0] * node.Na + photo_n_params['TPU25_N'][1]
-                leaf_par_photo['Rd'] = photo_n_params['Rd_N'][0] * node.Na + photo_n_params['Rd_N'][1]
-                dhd_max = leaf_par_photo['dHd']
-                dhd = dHd_sensibility(psi, t_leaf, dhd_max=dhd_max, dhd_inhib_beg=195., dHd_inhib_max=180.,
-                                      psi_inhib_beg=-.75, psi_inhib_max=-2., temp_inhib_beg=32, temp_inhib_max=33)
-
-                leaf_par_photo['dHd'] = dhd
-                node.par_photo = leaf_par_photo
-
-                g0 = g0max  # *g0_sensibility(psi, psi_crit=-1, n=4)
+    meteo_leaf = meteo.iloc[0]
+    t_air, hs, u, c_a, atm_press = [meteo_leaf[x] for x in ('Tac', 'hs', 'u', 'Ca', 'Pa')]
 
-                a_n, c_c, c_i, gs = an_gs_ci(node.par_photo, meteo_leaf, psi, t_leaf,
-                                             model, g0, rbt, c_a, m0, psi0, D0, n)
+    label = g.property('label')
+    leaves = [vid for vid in g if vid > 0 and label[vid].startswith(leaf_lbl_prefix)]
 
-                gb = boundary_layer_conductance(node.Length, u, atm_press, t_air, R)
+    psi, t_leaf, ppfd, leaf_nitrogen, leaf_length = [[g.property(name)[vid] for vid in leaves]
+                                                     for name in ('psi_head', 'Tlc', E_type2, 'Na', 'Length')]
 
-                # Transpiration
-                es_a = utils.saturated_air_vapor_pressure(t_air)
-                ea = es_a * hs / 100.
-                e = transpiration_rate(t_leaf, ea, gs, gb, atm_press)
+    a_n, c_i, gs, gb, e = leaf_gas_exchange_rates(t_leaf, ppfd, psi, leaf_nitrogen, leaf_length, t_air, hs, u, c_a,
+                                                  atm_press, photo_params, photo_n_params, gs_params, rbt)
 
-                node.An = a_n
-                node.Ci = c_i
-                node.gs = gs
-                node.gb = gb
-                node.E = max(0., e)
+    # TODO replace the meso-wind speed (u) by a micro-wind speed at the level of each leaf
+    for name, values in (('u', [u] * len(leaves)), ('An', a_n.tolist()), ('Ci', c_i.tolist()), ('gs', gs.tolist()),
+                         ('gb', gb.tolist()), ('E', e.tolist())):
+        g.properties().setdefault(name, {}).update(zip(leaves, values))
 
     return
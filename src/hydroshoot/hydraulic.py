@@ -8,6 +8,7 @@ This module computes xylem water potential value at each node of the shoot.
 """
 
 from scipy import exp, absolute, pi, log, array, optimize
+from numpy import zeros, ones, full, nan, isnan, nan_to_num, where, maximum, minimum, add
 from copy import deepcopy
 
 from openalea.plantgl.all import surface as surf
@@ -62,15 +63,45 @@ def cavitation_factor(psi, model='tuzet', fifty_cent=-0.51, sig_slope=3):
     if model == 'misson':
         k_reduction = 1. / (1. + (psi / fifty_cent) ** sig_slope)
     elif model == 'tuzet':
-        k_reduction = (1. + exp(sig_slope * fifty_cent)) / (1. + exp(float(sig_slope * (fifty_cent - psi))))
+        k_reduction = (1. + exp(sig_slope * fifty_cent)) / (1. + exp(sig_slope * (fifty_cent - psi)))
     elif model == 'linear':
-        k_reduction = 1 - min(0.95, float(psi / fifty_cent))
+        k_reduction = 1 - minimum(0.95, psi / fifty_cent)
     else:
         raise ValueError("The 'model' argument must be one of the following ('misson','tuzet', 'linear').")
 
     return k_reduction
 
 
+def cavitation_factor_derivative(psi, model='tuzet', fifty_cent=-0.51, sig_slope=3):
+    """Computes the derivative of the cavitation factor with respect to the water potential of the hydraulic segment.
+
+    Args:
+        psi (float): [MPa] water potential of the hydraulic segment
+        model (str): one of 'misson', 'tuzet' or 'linear', see :func:`cavitation_factor` for details
+        fifty_cent (float): [MPa] water potential at which the conductivity of the hydraulic segment drops to 50%
+            of its maximum value
+        sig_slope (float): a shape parameter controlling the slope of the S-curve (used only for 'misson' [-] or
+            'tuzet' [MPa-1] models)
+
+    Returns:
+        (float): [MPa-1] the derivative of :func:`cavitation_factor` with respect to :arg:`psi`
+
+    """
+
+    if model == 'misson':
+        psi_ratio = psi / fifty_cent
+        d_k_reduction = -sig_slope * psi_ratio ** (sig_slope - 1) / fifty_cent / (1. + psi_ratio ** sig_slope) ** 2
+    elif model == 'tuzet':
+        exp_term = exp(sig_slope * (fifty_cent - psi))
+        d_k_reduction = (1. + exp(sig_slope * fifty_cent)) * sig_slope * exp_term / (1. + exp_term) ** 2
+    elif model == 'linear':
+        d_k_reduction = where(psi / fifty_cent < 0.95, -1. / fifty_cent, 0.)
+    else:
+        raise ValueError("The 'model' argument must be one of the following ('misson','tuzet', 'linear').")
+
+    return d_k_reduction
+
+
 def def_param_soil(custom=None):
     """
     Returns a dictionary of classes of default soil hydrodynamic parameters for the model of van Genuchten-Muallem.
@@ -125,7 +156,7 @@ def k_soil_soil(psi, soil_class):
             Soil Science Society of America Journal 44, 892897.
     """
 
-    psi *= 1.e6 / (rho * g_p) * 100.  # MPa -> cm_H20
+    psi = psi * 1.e6 / (rho * g_p) * 100.  # MPa -> cm_H20
     param = def_param_soil()[soil_class]
     theta_r, theta_s, alpha, n, k_sat = [param[i] for i in range(5)]
     m = 1. - 1. / n
@@ -209,7 +240,325 @@ def soil_water_potential(psi_soil_init, water_withdrawal, soil_class, soil_total
     return max(psi_min, float(psi_soil))
 
 
-def hydraulic_prop(g, mass_conv=18.01528, length_conv=1.e-2, a=2.6, b=2.0, min_kmax=0.):
+class HydraulicTree(object):
+    """Compiled, array-based representation of the hydraulic structure of a plant shoot.
+
+    Args:
+        g (openalea.mtg.MTG): a multiscale tree graph object
+        vid_base (int): id of the basal vertex of the hydraulic structure, if `None` (default) it is taken from the
+            `vid_base` property of the mtg root
+        length_conv (float): conversion coefficient from the length unit of the mtg to that of [1 m]
+
+    Attributes:
+        vids (list): ids of the vertices in pre-order, their order defines the rows of all arrays
+        index (dict): row of each vertex id
+        parent (numpy.ndarray): row of the parent of each vertex (-1 for the basal vertex)
+        levels (list): arrays of the rows of vertices sharing the same topological depth, from the basal vertex
+            upwards
+        size (numpy.ndarray): number of vertices of the sub-tree borne by each vertex (itself included)
+        length (numpy.ndarray): [m] length of the hydraulic segments
+        dz (numpy.ndarray): [m] difference between the head and base elevations of the hydraulic segments
+        diameter (numpy.ndarray): [m] average diameter of the hydraulic segments
+        leaf_area (numpy.ndarray): [m2] surface area of the leaves
+        leaves (numpy.ndarray): rows of the leaves
+        rhyzo_section (numpy.ndarray): [m2] lateral section of the rhyzosphere cylinders
+        soil_class (dict): soil class of each rhyzosphere row
+
+    Notes:
+        The topology and geometry of the shoot are compiled only once, so that the computation of sap fluxes and xylem
+            water potential reduce to array sweeps over :attr:`levels`.
+        The tree must be rebuilt if the topology or geometry of the mtg change.
+        Arrays values are `nan` for vertices which do not carry the corresponding property.
+
+    """
+
+    def __init__(self, g, vid_base=None, length_conv=1.e-2):
+        if vid_base is None:
+            vid_base = g.node(g.root).vid_base
+
+        self.vids = list(traversal.pre_order2(g, vid_base))
+        self.index = {vid: row for row, vid in enumerate(self.vids)}
+        nb_vtx = len(self.vids)
+
+        self.parent = array([self.index.get(g.parent(vid), -1) for vid in self.vids], dtype=int)
+        self.parent[0] = -1
+
+        depth = zeros(nb_vtx, dtype=int)
+        for row in range(1, nb_vtx):
+            depth[row] = depth[self.parent[row]] + 1
+        self.levels = [where(depth == i_depth)[0] for i_depth in range(depth.max() + 1)]
+
+        self.size = ones(nb_vtx, dtype=int)
+        for rows in reversed(self.levels[1:]):
+            add.at(self.size, self.parent[rows], self.size[rows])
+
+        labels = [g.node(vid).label for vid in self.vids]
+        self.is_leaf = array([label.startswith('LI') for label in labels], dtype=bool)
+        self.is_rhyzo = array([label.startswith('rhyzo') for label in labels], dtype=bool)
+        self.is_rhyzo0 = array([label.startswith('rhyzo0') for label in labels], dtype=bool)
+        self.is_segment = array([label.startswith(('in', 'cx', 'Pet')) for label in labels], dtype=bool)
+        self.leaves = where(self.is_leaf)[0]
+
+        self.length = full(nb_vtx, nan)
+        self.dz = full(nb_vtx, nan)
+        self.diameter = full(nb_vtx, nan)
+        self.leaf_area = full(nb_vtx, nan)
+        self.rhyzo_section = full(nb_vtx, nan)
+        self.soil_class = {}
+
+        for row, vid in enumerate(self.vids):
+            n = g.node(vid)
+            if self.is_leaf[row]:
+                try:
+                    leaf_area = n.leaf_area * 1.
+                except (AttributeError, TypeError):
+                    leaf_area = surf(n.geometry) * length_conv ** 2  # [m2]
+                    n.leaf_area = leaf_area
+                self.leaf_area[row] = leaf_area
+            else:
+                self.length[row] = n.properties()['Length'] * length_conv
+                if self.is_rhyzo[row]:
+                    self.rhyzo_section[row] = pi * (n.TopDiameter * length_conv) * (n.depth * length_conv)
+                    self.soil_class[row] = n.soil_class
+                else:
+                    self.dz[row] = (n.properties()['TopPosition'][2] - n.properties()['BotPosition'][2]) * length_conv
+                    if self.is_segment[row]:
+                        self.diameter[row] = 0.5 * (n.TopDiameter + n.BotDiameter) * length_conv
+
+    def __len__(self):
+        return len(self.vids)
+
+    def values(self, g, name, default=nan):
+        """Reads a property of the mtg into an array following the rows of the tree.
+
+        Args:
+            g (openalea.mtg.MTG): a multiscale tree graph object
+            name (str): name of the mtg property
+            default (float): value given to vertices which do not carry the property
+
+        Returns:
+            (numpy.ndarray): the property values
+
+        """
+        prop = g.property(name)
+        values = [prop.get(vid) for vid in self.vids]
+        return array([default if value is None else value for value in values], dtype=float)
+
+    def sweep_range(self, start_vid=None, stop_vid=None):
+        """Returns the range of rows swept from :arg:`start_vid` up to :arg:`stop_vid`.
+
+        Args:
+            start_vid (int): vertex id from which the sweep starts (if `None` it is then taken to the basal vertex)
+            stop_vid (int): vertex id at which the sweep breaks (if `None` the sweep includes all the vertices borne
+                by :arg:`start_vid`)
+
+        Returns:
+            (tuple): the first and the last (excluded) rows of the sweep
+
+        Notes:
+            Vertices being stored in pre-order, the sub-tree borne by a vertex occupies contiguous rows.
+
+        """
+        row_start = 0 if start_vid is None else self.index[start_vid]
+        row_stop = row_start + self.size[row_start]
+        if row_start < self.index.get(stop_vid, -1) < row_stop:
+            row_stop = self.index[stop_vid]
+        return row_start, row_stop
+
+    def conductivity_max(self, a=2.8, b=0.1, min_kmax=0.):
+        """Computes the maximum conductivity of the hydraulic segments, see :func:`conductivity_max` for details.
+
+        Returns:
+            (numpy.ndarray): [kg s-1 m MPa-1] maximum conductivity of the hydraulic segments
+
+        """
+        return maximum(min_kmax, a * (self.diameter ** b))
+
+    def fluxes(self, leaf_transpiration, leaf_photosynthesis, mass_conv=18.01528):
+        """Accumulates leaf water and carbon fluxes through the hydraulic structure, from the leaves downwards.
+
+        Args:
+            leaf_transpiration (numpy.ndarray): [mol m-2 s-1] transpiration flux density of the leaves, given in the
+                order of :attr:`leaves`
+            leaf_photosynthesis (numpy.ndarray): [umol m-2 s-1] net carbon assimilation rate of the leaves, given in
+                the order of :attr:`leaves`
+            mass_conv (float): [gr mol-1] molar mass of H2O
+
+        Returns:
+            (numpy.ndarray): [kg s-1] water flux through each vertex
+            (numpy.ndarray): [umol s-1] carbon flux through each vertex
+
+        """
+        flux = zeros(len(self))
+        flux_c = zeros(len(self))
+        flux[self.leaves] = (leaf_transpiration * mass_conv * 1.e-3) * self.leaf_area[self.leaves]
+        flux_c[self.leaves] = leaf_photosynthesis * self.leaf_area[self.leaves]
+
+        for rows in reversed(self.levels[1:]):
+            add.at(flux, self.parent[rows], flux[rows])
+            add.at(flux_c, self.parent[rows], flux_c[rows])
+
+        return flux, flux_c
+
+    def water_potential(self, psi_head, flux, k_max, model='tuzet', psi_soil=-0.6, psi_min=-3., fifty_cent=-0.51,
+                        sig_slope=1., dist_roots=0.013, rad_roots=.0001, negligible_shoot_resistance=False,
+                        start_vid=None, stop_vid=None):
+        """Computes a transient hydraulic structure of the shoot, see :func:`transient_xylem_water_potential` for
+        details.
+
+        Args:
+            psi_head (numpy.ndarray): [MPa] current water potential at the head of each vertex (`nan` if unknown)
+            flux (numpy.ndarray): [kg s-1] water flux through each vertex
+            k_max (numpy.ndarray): [kg s-1 m MPa-1] maximum conductivity of the hydraulic segments
+
+        Returns:
+            (numpy.ndarray): [MPa] the new water potential at the head of each vertex
+            (numpy.ndarray): [kg s-1 m MPa-1] actual conductivity of each vertex (`nan` if undefined)
+
+        Notes:
+            Vertices are solved level by level so that each vertex uses the up-to-date water potential of its parent,
+                similarly to the pre-order traversal of :func:`transient_xylem_water_potential`.
+
+        """
+        psi_new = psi_head.copy()
+        k_act = full(len(self), nan)
+
+        row_start, row_stop = self.sweep_range(start_vid, stop_vid)
+
+        for level in self.levels:
+            rows = level[(level >= row_start) & (level < row_stop)]
+            if not len(rows):
+                continue
+
+            psi_base = psi_new[maximum(self.parent[rows], 0)]
+            psi_base[rows == 0] = psi_soil
+
+            is_leaf = self.is_leaf[rows]
+            psi_new[rows[is_leaf]] = psi_base[is_leaf]
+
+            is_shoot = ~(is_leaf | self.is_rhyzo[rows])
+            shoot_rows = rows[is_shoot]
+            shoot_psi_base = psi_base[is_shoot]
+            gravity = rho * g_p * self.dz[shoot_rows] * 1.e-6
+            if not negligible_shoot_resistance:
+                shoot_psi_head = psi_new[shoot_rows]
+                shoot_psi_head = where(isnan(shoot_psi_head), shoot_psi_base, shoot_psi_head)
+                psi = 0.5 * (shoot_psi_head + shoot_psi_base)
+                k_act[shoot_rows] = k_max[shoot_rows] * cavitation_factor(psi, model, fifty_cent, sig_slope)
+                psi_new[shoot_rows] = maximum(
+                    psi_min, shoot_psi_base - self.length[shoot_rows] * flux[shoot_rows] / k_act[shoot_rows] - gravity)
+            else:
+                psi_new[shoot_rows] = maximum(psi_min, shoot_psi_base - gravity)
+
+            for row, row_psi_base in zip(rows[self.is_rhyzo[rows]], psi_base[self.is_rhyzo[rows]]):
+                row_psi_head = row_psi_base if isnan(psi_new[row]) else psi_new[row]
+                psi = 0.5 * (row_psi_head + row_psi_base)
+                row_flux = flux[row] * 8640. / self.rhyzo_section[row]  # [cm d-1]
+
+                if self.is_rhyzo0[row]:
+                    k_soil = k_soil_soil(psi, self.soil_class[row])  # [cm d-1]
+                    g_act = k_soil_root(k_soil, dist_roots, rad_roots)  # [cm d-1 m-1]
+                    psi_new[row] = max(psi_min, row_psi_base - (row_flux / g_act) * rho * g_p * 1.e-6)
+                else:
+                    k_act[row] = k_soil_soil(psi, self.soil_class[row])  # [cm d-1]
+                    psi_new[row] = max(psi_min,
+                                       row_psi_base - (self.length[row] * row_flux / k_act[row]) * rho * g_p * 1.e-6)
+
+        return psi_new, k_act
+
+    def head_water_potential(self, rows, psi_head, psi_base, flux, k_max, model='tuzet', psi_min=-3.,
+                             fifty_cent=-0.51, sig_slope=1., dist_roots=0.013, rad_roots=.0001,
+                             negligible_shoot_resistance=False):
+        """Computes the water potential at the head of hydraulic segments from that at their base, and its derivative
+        with respect to the head water potential.
+
+        Args:
+            rows (numpy.ndarray): rows of the hydraulic segments (leaves excluded)
+            psi_head (numpy.ndarray): [MPa] current water potential at the head of the segments
+            psi_base (numpy.ndarray): [MPa] water potential at the base of the segments
+            flux (numpy.ndarray): [kg s-1] water flux through each vertex
+            k_max (numpy.ndarray): [kg s-1 m MPa-1] maximum conductivity of the hydraulic segments
+
+        Returns:
+            (numpy.ndarray): [MPa] the water potential at the head of the segments
+            (numpy.ndarray): [-] its derivative with respect to :arg:`psi_head`
+            (numpy.ndarray): [kg s-1 m MPa-1] actual conductivity of the segments (`nan` if undefined)
+
+        Notes:
+            See :meth:`water_potential` for the other arguments.
+            The derivatives of the rhyzosphere elements are estimated by central finite differences.
+
+        """
+        head = zeros(len(rows))
+        d_head = zeros(len(rows))
+        k_act = full(len(rows), nan)
+
+        is_shoot = ~self.is_rhyzo[rows]
+        shoot_rows = rows[is_shoot]
+        gravity = rho * g_p * self.dz[shoot_rows] * 1.e-6
+        if not negligible_shoot_resistance:
+            psi = 0.5 * (psi_head[is_shoot] + psi_base[is_shoot])
+            k_reduction = cavitation_factor(psi, model, fifty_cent, sig_slope)
+            k_act[is_shoot] = k_max[shoot_rows] * k_reduction
+            psi_loss = self.length[shoot_rows] * flux[shoot_rows] / k_act[is_shoot]
+            head[is_shoot] = psi_base[is_shoot] - psi_loss - gravity
+            d_head[is_shoot] = 0.5 * psi_loss * cavitation_factor_derivative(psi, model, fifty_cent,
+                                                                             sig_slope) / k_reduction
+        else:
+            head[is_shoot] = psi_base[is_shoot] - gravity
+
+        for i in where(~is_shoot)[0]:
+            row = rows[i]
+            row_flux = flux[row] * 8640. / self.rhyzo_section[row]  # [cm d-1]
+
+            def _rhyzo_head(row_psi_head):
+                k_soil = k_soil_soil(0.5 * (row_psi_head + psi_base[i]), self.soil_class[row])  # [cm d-1]
+                if self.is_rhyzo0[row]:
+                    g_act = k_soil_root(k_soil, dist_roots, rad_roots)  # [cm d-1 m-1]
+                    return psi_base[i] - (row_flux / g_act) * rho * g_p * 1.e-6, nan
+                else:
+                    return psi_base[i] - (self.length[row] * row_flux / k_soil) * rho * g_p * 1.e-6, k_soil
+
+            eps = 1.e-6
+            head[i], k_act[i] = _rhyzo_head(psi_head[i])
+            d_head[i] = (_rhyzo_head(psi_head[i] + eps)[0] - _rhyzo_head(psi_head[i] - eps)[0]) / (2. * eps)
+
+        is_min = head < psi_min
+        head[is_min] = psi_min
+        d_head[is_min] = 0.
+
+        return head, d_head, k_act
+
+    def solve_water_potential(self, psi_head, flux, k_max, psi_soil=-0.8, model='tuzet', psi_min=-3.0,
+                              psi_error_crit=0.001, max_iter=100, fifty_cent=-0.51, sig_slope=0.1, dist_roots=0.013,
+                              rad_roots=.0001, negligible_shoot_resistance=False, start_vid=None, stop_vid=None,
+                              psi_step=0.5, solver='relaxation'):
+        """Solves the hydraulic structure of the shoot, see :func:`xylem_water_potential` for details.
+
+        Args:
+            psi_head (numpy.ndarray): [MPa] initial water potential at the head of each vertex (`nan` if unknown)
+            flux (numpy.ndarray): [kg s-1] water flux through each vertex
+            k_max (numpy.ndarray): [kg s-1 m MPa-1] maximum conductivity of the hydraulic segments
+
+        Returns:
+            (numpy.ndarray): [MPa] the water potential at the head of each vertex
+            (numpy.ndarray): [kg s-1 m MPa-1] actual conductivity of each vertex (`nan` if undefined)
+            (int): the number of iterations
+
+        """
+        if solver == 'newton':
+            return _water_potential_newton(self, psi_head, flux, k_max, psi_soil, model, psi_min, psi_error_crit,
+                                           max_iter, fifty_cent, sig_slope, dist_roots, rad_roots,
+                                           negligible_shoot_resistance, start_vid, stop_vid)
+        elif solver == 'relaxation':
+            return _water_potential_relaxation(self, psi_head, flux, k_max, psi_soil, model, psi_min,
+                                               psi_error_crit, max_iter, fifty_cent, sig_slope, dist_roots,
+                                               rad_roots, negligible_shoot_resistance, start_vid, stop_vid, psi_step)
+        else:
+            raise ValueError("The 'solver' argument must be one of the following ('relaxation', 'newton').")
+
+
+def hydraulic_prop(g, mass_conv=18.01528, length_conv=1.e-2, a=2.6, b=2.0, min_kmax=0., hydraulic_tree=None):
     """Computes water flux `Flux` and maximum hydraulic conductivity `Kmax` of each hydraulic segment. Both properties
         are then attached to the corresponding mtg nodes.
 
@@ -221,6 +570,8 @@ def hydraulic_prop(g, mass_conv=18.01528, length_conv=1.e-2, a=2.6, b=2.0, min_k
         b (float): [-] exponent of the Kh(D) relationship, see :func:`conductivity_max` for details
         min_kmax (float): [kg s-1 m MPa-1] minimum value for the maximum conductivity, see :func:`conductivity_max`
             for details
+        hydraulic_tree (HydraulicTree): compiled representation of the hydraulic structure, if provided, fluxes are
+            accumulated over its arrays instead of traversing the mtg
 
     Returns:
         (openalea.mtg.MTG): the multiscale tree graph object
@@ -237,6 +588,15 @@ def hydraulic_prop(g, mass_conv=18.01528, length_conv=1.e-2, a=2.6, b=2.0, min_k
 
     """
 
+    if hydraulic_tree is not None:
+        tree = hydraulic_tree
+        leaf_vids = [tree.vids[row] for row in tree.leaves]
+        flux, flux_c = tree.fluxes(array([g.property('E')[vid] for vid in leaf_vids]),
+                                   array([g.property('An')[vid] for vid in leaf_vids]), mass_conv)
+        set_hydraulic_prop(g, tree, flux, flux_c, tree.conductivity_max(a, b, min_kmax))
+
+        return g
+
     vid_base = g.node(g.root).vid_base
 
     for vtx_id in traversal.post_order2(g, vid_base):
@@ -270,6 +630,27 @@ def hydraulic_prop(g, mass_conv=18.01528, length_conv=1.e-2, a=2.6, b=2.0, min_k
     return g
 
 
+def set_hydraulic_prop(g, tree, flux, flux_c, k_max):
+    """Writes the water and carbon fluxes and the maximum conductivity of the vertices of a :class:`HydraulicTree`
+    into the mtg properties `Flux`, `FluxC` and `Kmax`, see :func:`hydraulic_prop` for details.
+
+    Args:
+        g (openalea.mtg.MTG): a multiscale tree graph object
+        tree (HydraulicTree): compiled representation of the hydraulic structure
+        flux (numpy.ndarray): [kg s-1] water flux through each vertex
+        flux_c (numpy.ndarray): [umol s-1] carbon flux through each vertex
+        k_max (numpy.ndarray): [kg s-1 m MPa-1] maximum conductivity of each vertex (only written for hydraulic
+            segments)
+
+    """
+
+    g.properties().setdefault('Flux', {}).update(zip(tree.vids, flux.tolist()))
+    g.properties().setdefault('FluxC', {}).update(zip(tree.vids, flux_c.tolist()))
+    g.properties().setdefault('Kmax', {}).update(
+        (vid, k_max[row] if tree.is_segment[row] else None) for row, vid in enumerate(tree.vids)
+        if tree.is_segment[row] or tree.is_rhyzo[row])
+
+
 def transient_xylem_water_potential(g, model='tuzet', length_conv=1.e-2, psi_soil=-0.6, psi_min=-3., fifty_cent=-0.51,
                                     sig_slope=1., dist_roots=0.013, rad_roots=.0001, negligible_shoot_resistance=False,
                                     start_vid=None, stop_vid=None):
@@ -362,7 +743,8 @@ def transient_xylem_water_potential(g, model='tuzet', length_conv=1.e-2, psi_soi
 
 def xylem_water_potential(g, psi_soil=-0.8, model='tuzet', psi_min=-3.0, psi_error_crit=0.001, max_iter=100,
                           length_conv=1.E-2, fifty_cent=-0.51, sig_slope=0.1, dist_roots=0.013, rad_roots=.0001,
-                          negligible_shoot_resistance=False, start_vid=None, stop_vid=None, psi_step=0.5):
+                          negligible_shoot_resistance=False, start_vid=None, stop_vid=None, psi_step=0.5,
+                          hydraulic_tree=None, solver='relaxation'):
     """Computes the hydraulic structure of plant's shoot.
 
     Args:
@@ -387,12 +769,30 @@ def xylem_water_potential(g, psi_soil=-0.8, model='tuzet', psi_min=-3.0, psi_err
             up until the leaves)
         psi_step (float): [m] reduction factor to the xylem water potential step between two consecutive iterations
             (between 0 and 1)
+        hydraulic_tree (HydraulicTree): compiled representation of the hydraulic structure, if provided, iterations
+            are performed over its arrays instead of traversing the mtg
+        solver (str): one of 'relaxation' (damped fixed-point iterations) or 'newton' (Newton iterations over the
+            whole hydraulic network, :arg:`psi_step` is then unused)
 
     Returns:
         (int): the number of iterations
 
     """
 
+    if solver == 'newton' and hydraulic_tree is None:
+        hydraulic_tree = HydraulicTree(g, length_conv=length_conv)
+    elif solver not in ('relaxation', 'newton'):
+        raise ValueError("The 'solver' argument must be one of the following ('relaxation', 'newton').")
+
+    if hydraulic_tree is not None:
+        tree = hydraulic_tree
+        psi_head, k_act, counter = tree.solve_water_potential(
+            tree.values(g, 'psi_head'), tree.values(g, 'Flux'), tree.values(g, 'Kmax'), psi_soil, model, psi_min,
+            psi_error_crit, max_iter, fifty_cent, sig_slope, dist_roots, rad_roots, negligible_shoot_resistance,
+            start_vid, stop_vid, psi_step, solver)
+        set_water_potential(g, tree, psi_head, k_act, start_vid, stop_vid)
+        return counter
+
     counter = 0
 
     psi_error = psi_error_crit
@@ -431,3 +831,125 @@ def xylem_water_potential(g, psi_soil=-0.8, model='tuzet', psi_min=-3.0, psi_err
         counter += 1
 
     return counter
+
+
+def _water_potential_relaxation(tree, psi_head, flux, k_max, psi_soil, model, psi_min, psi_error_crit, max_iter,
+                                fifty_cent, sig_slope, dist_roots, rad_roots, negligible_shoot_resistance, start_vid,
+                                stop_vid, psi_step):
+    """Array counterpart of :func:`xylem_water_potential` over a :class:`HydraulicTree`, water potential being
+    relaxed between successive sweeps as in :func:`xylem_water_potential`.
+
+    Returns:
+        (numpy.ndarray): [MPa] water potential at the head of each vertex
+        (numpy.ndarray): [kg s-1 m MPa-1] actual conductivity of each vertex (`nan` if undefined)
+        (int): the number of iterations
+    """
+
+    counter = 0
+    psi_error = psi_error_crit
+
+    while psi_error >= psi_error_crit:
+        psi_new, k_act = tree.water_potential(psi_head, flux, k_max, model, psi_soil, psi_min, fifty_cent, sig_slope,
+                                              dist_roots, rad_roots, negligible_shoot_resistance, start_vid, stop_vid)
+        psi_head = where(isnan(psi_head), psi_new, psi_head)
+
+        if counter > max_iter:
+            psi_error = 0.
+            psi_head = psi_new
+        else:
+            psi_error = abs(psi_head - psi_new).sum()
+            psi_head = psi_head + psi_step * (psi_new - psi_head)
+
+        counter += 1
+
+    return psi_head, k_act, counter
+
+
+def _water_potential_newton(tree, psi_head, flux, k_max, psi_soil, model, psi_min, psi_error_crit, max_iter,
+                            fifty_cent, sig_slope, dist_roots, rad_roots, negligible_shoot_resistance, start_vid,
+                            stop_vid):
+    """Solves the steady-state hydraulic structure of a :class:`HydraulicTree` using Newton iterations.
+
+    The water potential of each vertex only depends on its own and on its parent's, the Jacobian of the hydraulic
+        network is therefore lower-triangular in pre-order. Newton iterations are hence carried out level by level
+        from the base upwards (each level being solved once its parents are), so that the whole network is solved in
+        a single pass. Each Newton step is kept within a bracket of the solution and replaced by a bisection if it
+        falls outside, the iterations starting from the upper bound so that the highest (stable) solution is found.
+
+    Returns:
+        (numpy.ndarray): [MPa] water potential at the head of each vertex
+        (numpy.ndarray): [kg s-1 m MPa-1] actual conductivity of each vertex (`nan` if undefined)
+        (int): the maximum number of Newton iterations needed by a level
+    """
+
+    psi_head = psi_head.copy()
+    k_act = full(len(tree), nan)
+    row_start, row_stop = tree.sweep_range(start_vid, stop_vid)
+
+    counter = 0
+    for level in tree.levels:
+        rows = level[(level >= row_start) & (level < row_stop)]
+        if not len(rows):
+            continue
+
+        psi_base = psi_head[maximum(tree.parent[rows], 0)]
+        psi_base[rows == 0] = psi_soil
+
+        is_leaf = tree.is_leaf[rows]
+        psi_head[rows[is_leaf]] = psi_base[is_leaf]
+        rows, psi_base = rows[~is_leaf], psi_base[~is_leaf]
+        if not len(rows):
+            continue
+
+        # head water potential is bounded by its value without hydraulic losses (fluxes are positive) and psi_min
+        psi_upper = where(tree.is_rhyzo[rows], psi_base, psi_base - rho * g_p * nan_to_num(tree.dz[rows]) * 1.e-6)
+        psi_upper = maximum(psi_min, psi_upper)
+        psi_lower = full(len(rows), psi_min)
+        psi = psi_upper.copy()
+
+        for i_iter in range(1, max_iter + 1):
+            head, d_head, _ = tree.head_water_potential(rows, psi, psi_base, flux, k_max, model, psi_min,
+                                                        fifty_cent, sig_slope, dist_roots, rad_roots,
+                                                        negligible_shoot_resistance)
+            residual = psi - head
+            psi_upper = where(residual > 0., psi, psi_upper)
+            psi_lower = where(residual > 0., psi_lower, psi)
+
+            d_residual = 1. - d_head
+            psi_newton = psi - residual / where(d_residual > 0., d_residual, nan)
+            is_bracketed = (psi_newton >= psi_lower) & (psi_newton <= psi_upper)
+            psi_new = where(is_bracketed, psi_newton, 0.5 * (psi_lower + psi_upper))
+
+            psi_error = abs(psi_new - psi).max()
+            psi = psi_new
+            counter = max(counter, i_iter)
+            if psi_error < psi_error_crit:
+                break
+
+        psi_head[rows] = psi
+        k_act[rows] = tree.head_water_potential(rows, psi, psi_base, flux, k_max, model, psi_min, fifty_cent,
+                                                sig_slope, dist_roots, rad_roots, negligible_shoot_resistance)[2]
+
+    return psi_head, k_act, counter
+
+
+def set_water_potential(g, tree, psi_head, k_act, start_vid=None, stop_vid=None):
+    """Writes the water potential and the actual conductivity of the vertices of a :class:`HydraulicTree` into the
+    mtg properties `psi_head` and `KL`.
+
+    Args:
+        g (openalea.mtg.MTG): a multiscale tree graph object
+        tree (HydraulicTree): compiled representation of the hydraulic structure
+        psi_head (numpy.ndarray): [MPa] water potential at the head of each vertex (`nan` values are not written)
+        k_act (numpy.ndarray): [kg s-1 m MPa-1] actual conductivity of each vertex
+        start_vid, stop_vid (int): vertex ids delimiting the vertices whose conductivity is written, see
+            :meth:`HydraulicTree.sweep_range`
+
+    """
+
+    row_start, row_stop = tree.sweep_range(start_vid, stop_vid)
+    g.properties().setdefault('psi_head', {}).update(
+        (vid, psi) for vid, psi in zip(tree.vids, psi_head.tolist()) if not isnan(psi))
+    g.properties().setdefault('KL', {}).update(
+        (tree.vids[row], None if isnan(k_act[row]) else k_act[row]) for row in range(row_start, row_stop)
+        if not tree.is_leaf[row])
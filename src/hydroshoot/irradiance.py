@@ -6,8 +6,15 @@ plant shoot geometry.
 TODO: plug to the standard interface of Caribu module.
 """
 
-from numpy import array, deg2rad
-from pandas import date_range
+from hashlib import sha1
+from os import makedirs, replace, remove, listdir, stat, utime, getpid
+from os.path import join, isfile, exists
+from zipfile import BadZipFile
+
+from numpy import (array, around, deg2rad, rad2deg, arccos, cos, linspace, zeros, full, column_stack, load, savez,
+                   clip)
+from numpy.linalg import norm
+from pandas import date_range, DataFrame, DatetimeIndex, isnull
 from pytz import timezone, utc
 from pvlib.solarposition import ephemeris
 
@@ -19,6 +26,9 @@ import alinea.astk.icosphere as ico
 
 from hydroshoot.architecture import vector_rotation
 
+# Sky discretizations already computed by :func:`sky_directions`
+_sky_cache = {}
+
 
 def local2solar(local_time, latitude, longitude, time_zone, temperature=25.):
     """Calculates UTC time and Solar time in decimal hours (solar noon is 12.00), based on
@@ -127,9 +137,170 @@ def e_conv_PPFD(irradiance_unit):
         raise TypeError("E_type must be one of the following 'Rg_Watt/m2', 'RgPAR_Watt/m2' or'PPFD_umol/m2/s'.")
 
 
+def is_dark(meteo, irradiance_unit):
+    """Checks whether meteorological data carry no irradiance (night-time or zero-irradiance time steps).
+
+    Args:
+        meteo (DataFrame): meteo data having an 'Rg' or a 'PPFD' column (see :func:`irradiance_distribution`)
+        irradiance_unit (str): unit of the irradiance flux density,
+            one of ('Rg_Watt/m2', 'RgPAR_Watt/m2', 'PPFD_umol/m2/s')
+
+    Returns:
+        (bool): `True` if the irradiance flux density is null at all time steps of :arg:`meteo`
+
+    """
+    column = 'PPFD' if irradiance_unit.split('_')[0] == 'PPFD' else 'Rg'
+    return bool((meteo[column] <= 0.).all())
+
+
+def utc_times(local_times, time_zone):
+    """Converts local times to UTC.
+
+    Args:
+        local_times (DatetimeIndex): naive local times
+        time_zone (str): a 'pytz.timezone' (e.g. 'Europe/Paris')
+
+    Returns:
+        (DatetimeIndex): UTC times
+
+    Notes:
+        Ambiguous and non-existent local times (at daylight saving time changes) are given the standard time offset,
+            as done by `pytz` localization.
+
+    """
+    local_times = DatetimeIndex(local_times)
+    times = local_times.tz_localize(time_zone, ambiguous=zeros(len(local_times), dtype=bool), nonexistent='NaT')
+    times = times.tz_convert(utc)
+
+    missing = isnull(times)
+    if missing.any():
+        tz = timezone(time_zone)
+        values = times.tz_localize(None).values
+        values[missing] = [tz.localize(t.to_pydatetime()).astimezone(utc).replace(tzinfo=None)
+                           for t in local_times[missing]]
+        times = DatetimeIndex(values).tz_localize(utc)
+
+    return times
+
+
+def solar_sources(meteo, geo_location, irradiance_unit, time_zone='Europe/Paris'):
+    """Calculates the sun position and the partitioning of irradiance between diffuse and direct light at each time
+    step of meteorological data.
+
+    Args:
+        meteo (DataFrame): meteo data indexed by local time (see :func:`irradiance_distribution`)
+        geo_location: tuple of (latitude [°], longitude [°], elevation [°])
+        irradiance_unit (str): unit of the irradiance flux density,
+            one of ('Rg_Watt/m2', 'RgPAR_Watt/m2', 'PPFD_umol/m2/s')
+        time_zone (str): a 'pytz.timezone' (e.g. 'Europe/Paris')
+
+    Returns:
+        (DataFrame): indexed as :arg:`meteo`, having the following columns:
+            energy (float): [W m-2] global irradiance
+            doy_utc (int): UTC day of year
+            hour_utc (float): [decimal hours] UTC time
+            diffuse_ratio (float): [-] diffuse-to-total irradiance ratio
+            sun (tuple): [umol m-2 s-1] direct irradiance and direction of the sun, as a (energy, (x, y, z)) tuple
+
+    Notes:
+        This table may be computed once for a whole simulation period, its rows are then given to
+            :func:`irradiance_distribution` at each time step.
+
+    """
+    column = 'PPFD' if irradiance_unit.split('_')[0] == 'PPFD' else 'Rg'
+    try:
+        energy = meteo[column].values
+    except KeyError:
+        raise TypeError(
+            "'irradiance_unit' must be one of the following 'Rg_Watt/m2', 'RgPAR_Watt/m2' or'PPFD_umol/m2/s'.")
+
+    # Convert irradiance to W m-2 (Spitters method always gets energy flux as Rg Watt m-2)
+    energy = energy * e_conv_Wm2(irradiance_unit)
+
+    latitude = geo_location[0]
+    times = utc_times(meteo.index, time_zone)
+    doy_utc = times.dayofyear.values
+    hour_utc = times.hour.values + times.minute.values / 60.
+
+    diffuse_ratio, sun_data = [], []
+    for ienergy, idoy, ihour in zip(energy, doy_utc, hour_utc):
+        # R: Attention, ne renvoie pas exactement le même RdRsH que celui du noeud 'spitters_horaire' dans topvine.
+        iratio = RdRsH(ienergy, int(idoy), ihour, latitude)
+        diffuse_ratio.append(iratio)
+
+        # Direct irradiance, it is always desirable to get energy as PPFD
+        irradiance_dir = (1 - iratio) * (ienergy * (0.48 * 4.6))
+        sun = Gensun.Gensun()(Rsun=irradiance_dir, DOY=int(idoy), heureTU=ihour, lat=latitude)
+        sun = GetLightsSun.GetLightsSun(sun).split()
+        sun_data.append((float(sun[0]), (float(sun[1]), float(sun[2]), float(sun[3]))))
+
+    return DataFrame({'energy': energy, 'doy_utc': doy_utc, 'hour_utc': hour_utc, 'diffuse_ratio': diffuse_ratio,
+                      'sun': sun_data}, index=meteo.index)
+
+
+def sky_directions(turtle_sectors='46', turtle_format='uoc', icosphere_level=None, cache_dir=None):
+    """Discretizes the sky hemisphere into the directions of diffuse light sources.
+
+    Args:
+        turtle_sectors (str): number of turtle sectors (see :func:`turtle` from `sky_tools` package)
+        turtle_format (str): format irradiance distribution, could be 'soc', or 'uoc'
+            (see :func:`turtle` from `sky_tools` package for details)
+        icosphere_level (int): the level of refinement of the dual icosphere, if given it is used instead of the
+            turtle (see :func:`alinea.astk.icosphere.turtle_dome` for details)
+        cache_dir (str): if provided, folder where the directions are saved (or read from if they were already saved)
+
+    Returns:
+        (numpy.ndarray): (n, 3) array of the (x, y, z) directions of diffuse light sources
+        (numpy.ndarray): (n,) array of the relative weights of the directions, i.e. the energies of the turtle sectors
+            for a unit sky, or uniform weights for the icosphere
+
+    Notes:
+        Directions are computed once per process for each sky discretization, the returned arrays are read-only since
+            they are shared between all callers.
+
+    """
+    key = 'turtle%s_%s' % (turtle_sectors, turtle_format) if not icosphere_level else 'icosphere%d' % icosphere_level
+
+    if key not in _sky_cache:
+        file_path = None if cache_dir is None else join(cache_dir, 'sky_%s.npz' % key)
+        if file_path is not None and isfile(file_path):
+            with load(file_path) as data:
+                directions, weights = data['directions'], data['weights']
+        else:
+            directions, weights = _build_sky(turtle_sectors, turtle_format, icosphere_level)
+            if file_path is not None:
+                if not exists(cache_dir):
+                    makedirs(cache_dir)
+                tmp_path = file_path + '.tmp'
+                with open(tmp_path, 'wb') as f:
+                    savez(f, directions=directions, weights=weights)
+                replace(tmp_path, file_path)
+
+        directions.flags.writeable = False
+        weights.flags.writeable = False
+        _sky_cache[key] = directions, weights
+
+    return _sky_cache[key]
+
+
+def _build_sky(turtle_sectors, turtle_format, icosphere_level):
+    if not icosphere_level:
+        energy, emission, direction, elevation, azimuth = turtle.turtle(sectors=turtle_sectors, format=turtle_format,
+                                                                        energy=1.)
+        weights = array(energy, dtype=float)
+    else:
+        vert, fac = ico.turtle_dome(icosphere_level)
+        direction = list(ico.sample_faces(vert, fac, iter=None, spheric=False).values())
+        direction = [idirect[0] for idirect in direction]
+        direction = [tuple(list(x[:2]) + [-x[2]]) for x in direction]
+        weights = full(len(direction), 1. / len(direction))
+
+    return array(direction, dtype=float).reshape(-1, 3), weights
+
+
 def irradiance_distribution(meteo, geo_location, irradiance_unit,
                             time_zone='Europe/Paris', turtle_sectors='46', turtle_format='uoc',
-                            sun2scene=None, rotation_angle=0., icosphere_level=None):
+                            sun2scene=None, rotation_angle=0., icosphere_level=None, solar=None):
     """Calculates irradiance distribution over a semi-hemisphere surrounding the plant [umol m-2 s-1].
 
     Args:
@@ -153,10 +324,12 @@ def irradiance_distribution(meteo, geo_location, irradiance_unit,
             direction of X-axis
         icosphere_level (int): the level of refinement of the dual icosphere
             (see :func:`alinea.astk.icosphere.turtle_dome` for details)
+        solar (DataFrame): the rows of :func:`solar_sources` matching those of :arg:`meteo`, if `None` (default) they
+            are computed from :arg:`meteo`
 
     Returns:
         [umol m-2 s-1] tuple of tuples, cumulative irradiance flux densities distributed across the semi-hemisphere
-            surrounding the plant
+            surrounding the plant, the direct (sun) sources following the diffuse ones
         (float) [-] diffuse-to-total irradiance ratio
 
     Notes:
@@ -168,60 +341,26 @@ def irradiance_distribution(meteo, geo_location, irradiance_unit,
     TODO: replace by the icosphere procedure
 
     """
+    if solar is None:
+        solar = solar_sources(meteo, geo_location, irradiance_unit, time_zone)
+
+    sky, _ = sky_directions(turtle_sectors, turtle_format, icosphere_level)
+    direction = [tuple(idirect) for idirect in sky.tolist()]
+
     diffuse_ratio = []
     nrj_sum = 0
-    for idate, date in enumerate(meteo.index):
-
-        if irradiance_unit.split('_')[0] == 'PPFD':
-            energy = meteo.loc[date].PPFD
-        else:
-            try:
-                energy = meteo.loc[date].Rg
-            except:
-                raise TypeError(
-                    "'irradiance_unit' must be one of the following 'Rg_Watt/m2', 'RgPAR_Watt/m2' or'PPFD_umol/m2/s'.")
-
-        # First check: convert irradiance to W m-2 (Spitters method always gets energy flux as Rg Watt m-2)
-        corr = e_conv_Wm2(irradiance_unit)
-        energy = energy * corr
-
-        # Second check: Convert to UTC datetime
-        latitude, longitude, elevation = [geo_location[x] for x in range(3)]
-        temperature = meteo.Tac.values[0]
-        date_utc, lst = local2solar(date, latitude, longitude, time_zone, temperature)
-        doy_utc = date_utc.timetuple().tm_yday
-        hour_utc = date_utc.hour + date_utc.minute / 60.
-        # R: Attention, ne renvoie pas exactement le même RdRsH que celui du noeud 'spitters_horaire' dans topvine.
-        diffuse_ratio_hourly = RdRsH(energy, doy_utc, hour_utc, latitude)
+    for idate, (energy, diffuse_ratio_hourly, sun) in enumerate(zip(solar.energy, solar.diffuse_ratio, solar.sun)):
         diffuse_ratio.append(diffuse_ratio_hourly * energy)
         nrj_sum += energy
 
-        # Third and final check: it is always desirable to get energy as PPFD
+        # It is always desirable to get energy as PPFD
         energy = energy * (0.48 * 4.6)
 
         irradiance_diff = diffuse_ratio_hourly * energy
-        irradiance_dir = (1 - diffuse_ratio_hourly) * energy
-
-        # diffuse irradiance
-        if not icosphere_level:
-            energy2, emission, direction, elevation, azimuth = turtle.turtle(sectors=turtle_sectors,
-                                                                             format=turtle_format,
-                                                                             energy=irradiance_diff)
-        else:
-            vert, fac = ico.turtle_dome(icosphere_level)
-            direction = ico.sample_faces(vert, fac, iter=None, spheric=False).values()
-            direction = [idirect[0] for idirect in direction]
-            direction = map(lambda x: tuple(list(x[:2]) + [-x[2]]), direction)
-
-        
-        # direct irradiance
-        sun = Gensun.Gensun()(Rsun=irradiance_dir, DOY=doy_utc, heureTU=hour_utc, lat=latitude)
-        sun = GetLightsSun.GetLightsSun(sun)
-        sun_data = [(float(sun.split()[0]), (float(sun.split()[1]), float(sun.split()[2]), float(sun.split()[3])))]
 
         # diffuse irradiance (distributed over a dome) + direct irradiance (localized as point source(s))
         #sky = zip(len(direction) * [irradiance_diff / len(direction)], direction)
-        source = zip(len(direction) * [irradiance_diff / len(direction)], direction,sun_data)
+        source = zip(len(direction) * [irradiance_diff / len(direction)], direction, [sun])
 
         #source = zip(set(sky),sun_data)
         source = [list(isource) for isource in source]
@@ -235,7 +374,7 @@ def irradiance_distribution(meteo, geo_location, irradiance_unit,
             for isource in source:
                 source_cum.append([isource[0], isource[1]])
 
-        if date == meteo.index[-1]:
+        if idate == len(solar) - 1:
             source_cum = [tuple(isource) for isource in source_cum]
 
     # Rotate irradiance sources to cope with plant row orientation
@@ -355,3 +494,417 @@ def hsCaribu(mtg, unit_scene_length, geometry='geometry', opticals='opticals', c
                 mtg.properties()['geometry'] = geometry0
 
     return mtg, caribu_scene
+
+
+class LightScene(object):
+    """A Caribu scene of the static geometry of a plant, lit by successive light sources.
+
+    The geometry of the plant is triangulated (and replicated according to :arg:`pattern`) once, when the object is
+    created, then each call to :meth:`irradiance` only replaces the light sources of the scene before running Caribu.
+
+    Args:
+        mtg (MTG): plant Multiscale Tree Graph
+        unit_scene_length (str): the unit of length used for scene coordinate and for pattern
+            (should be one of `CaribuScene.units` default)
+        geometry (str): the name of the property to use for computing scene geometry from the mtg
+        opticals (str): the name of the property to use for caribu optical properties
+        consider (list(int)): vertices to be considered for the computation, if None (default) all vertices with a
+            geometry are considered
+        direct: see :func:`runCaribu` from `CaribuScene` package
+        infinite: see :func:`runCaribu` from `CaribuScene` package
+        nz: see :func:`runCaribu` from `CaribuScene` package
+        ds: see :func:`runCaribu` from `CaribuScene` package
+        pattern: see :func:`runCaribu` from `CaribuScene` package
+        soil_reflectance (float): [-] the reflectance of the soil (between 0 and 1)
+        cache (IrradianceCache): if provided, a disk cache of irradiance results shared with other scenes and runs
+
+    Notes:
+        The scene geometry and optical properties are assumed to remain unchanged once the object is created.
+        Irradiance is identical to that computed by :func:`hsCaribu` with the same arguments.
+
+    """
+
+    wave_band = 'SW'
+
+    def __init__(self, mtg, unit_scene_length, geometry='geometry', opticals='opticals', consider=None, direct=True,
+                 infinite=False, nz=50, ds=0.5, pattern=None, soil_reflectance=0.15, cache=None):
+        geom = mtg.property(geometry)
+        if consider is not None:
+            geom = {vid: geom[vid] for vid in geom if vid in consider}
+        self.vids = list(geom.keys())
+        self.run_args = dict(direct=direct, infinite=infinite, d_sphere=ds, layers=nz, split_face=False)
+
+        # CaribuScene reads the 'geometry' property of the MTG, which is restored once the scene is built
+        properties = mtg.properties()
+        geometry0 = properties.get('geometry')
+        properties['geometry'] = geom
+        try:
+            self._caribu_scene = CaribuScene(mtg, light=[(1., (0., 0., -1.))],
+                                             opt={self.wave_band: mtg.property(opticals)},
+                                             soil_reflectance={self.wave_band: soil_reflectance},
+                                             scene_unit=unit_scene_length,
+                                             pattern=pattern)
+        finally:
+            if geometry0 is None:
+                mtg.remove_property('geometry')
+            else:
+                properties['geometry'] = geometry0
+
+        self.cache = cache
+        self.fingerprint = None if cache is None else self._fingerprint(mtg.property(opticals), unit_scene_length,
+                                                                        pattern, soil_reflectance)
+
+    def _fingerprint(self, opticals, unit_scene_length, pattern, soil_reflectance):
+        """Hashes the triangulated geometry, the optical properties and the Caribu settings of the scene."""
+        digest = sha1()
+        for vid in self.vids:
+            digest.update(repr(vid).encode())
+            digest.update(array(self._caribu_scene.scene[vid], dtype=float).tobytes())
+            digest.update(array(opticals[vid], dtype=float).tobytes())
+        digest.update(repr((unit_scene_length, pattern, soil_reflectance, sorted(self.run_args.items()))).encode())
+        return digest.hexdigest()
+
+    def irradiance(self, source):
+        """Runs Caribu for given light sources.
+
+        Args:
+            source (list): a tuple of tuples, giving energy unit and sky coordinates (see :func:`hsCaribu`)
+
+        Returns:
+            (dict): [umol m-2 s-1] incident irradiance (`Ei`) of the scene elements given as the dictionary keys
+            (dict): [umol m-2 s-1] absorbed irradiance (`Eabs`) of the scene elements given as the dictionary keys
+
+        """
+        if sum([x[0] for x in source]) == 0.:
+            return {vid: 0. for vid in self.vids}, {vid: 0. for vid in self.vids}
+
+        if self.cache is not None:
+            key = self.cache.key(self.fingerprint, source)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return dict(zip(self.vids, cached[0].tolist())), dict(zip(self.vids, cached[1].tolist()))
+
+        self._caribu_scene.light = source
+        raw, aggregated = self._caribu_scene.run(**self.run_args)
+        ei, eabs = aggregated[self.wave_band]['Ei'], aggregated[self.wave_band]['Eabs']
+
+        if self.cache is not None:
+            self.cache.put(key, [ei[vid] for vid in self.vids], [eabs[vid] for vid in self.vids])
+
+        return ei, eabs
+
+
+class IrradianceCache(object):
+    """A disk cache of the irradiance of scene elements, with least-recently-used eviction.
+
+    Results are stored in one file per scene and light sources, whose name is the hash of the fingerprint of the
+    scene (see :class:`LightScene`) and of the light sources rounded to :arg:`decimals`. Files are written atomically,
+    the cache may hence be shared between concurrent runs.
+
+    Args:
+        cache_dir (str): folder of cached results (created if it does not exist)
+        max_size (float): [MB] maximum size of the cache, least recently used results are removed beyond it
+        decimals (int): number of decimals to which source energies and directions are rounded before being hashed
+
+    """
+
+    prefix = 'irradiance_'
+
+    def __init__(self, cache_dir, max_size=100., decimals=6):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.decimals = decimals
+        if not exists(cache_dir):
+            makedirs(cache_dir)
+
+    def key(self, fingerprint, source):
+        """Returns the key of the results of a scene lit by given light sources.
+
+        Args:
+            fingerprint (str): the fingerprint of the scene
+            source (list): a tuple of tuples, giving energy unit and sky coordinates (see :func:`hsCaribu`)
+
+        Returns:
+            (str): the hexadecimal key of the results
+
+        """
+        sources = around(array([(energy,) + tuple(direction) for energy, direction in source], dtype=float),
+                         self.decimals) + 0.  # adding 0. turns -0. into 0.
+        digest = sha1(fingerprint.encode())
+        digest.update(sources.tobytes())
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return join(self.cache_dir, self.prefix + key + '.npz')
+
+    def get(self, key):
+        """Reads cached results.
+
+        Args:
+            key (str): the key of the results (see :meth:`key`)
+
+        Returns:
+            (tuple): the (`Ei`, `Eabs`) arrays of the scene elements, or `None` if the results are not cached (or if
+                the cached file is corrupt, in which case it is removed)
+
+        """
+        file_path = self._path(key)
+        try:
+            with load(file_path) as data:
+                ei, eabs = data['ei'], data['eabs']
+        except (IOError, OSError):
+            return None
+        except (BadZipFile, ValueError, EOFError, KeyError):  # corrupt file, computed again
+            try:
+                remove(file_path)
+            except OSError:  # removed by a concurrent run
+                pass
+            return None
+
+        try:
+            utime(file_path)  # marks the results as recently used
+        except OSError:  # removed by a concurrent run
+            pass
+        return ei, eabs
+
+    def put(self, key, ei, eabs):
+        """Writes results to the cache, then removes the least recently used ones if the cache exceeds its size.
+
+        Args:
+            key (str): the key of the results (see :meth:`key`)
+            ei (list): [umol m-2 s-1] incident irradiance of the scene elements
+            eabs (list): [umol m-2 s-1] absorbed irradiance of the scene elements
+
+        """
+        file_path = self._path(key)
+        tmp_path = file_path + '.%d.tmp' % getpid()
+        with open(tmp_path, 'wb') as f:
+            savez(f, ei=array(ei, dtype=float), eabs=array(eabs, dtype=float))
+        replace(tmp_path, file_path)
+        self.evict()
+
+    def evict(self):
+        """Removes the least recently used results until the cache fits in :attr:`max_size`."""
+        files = []
+        for file_name in listdir(self.cache_dir):
+            if file_name.startswith(self.prefix) and file_name.endswith('.npz'):
+                try:
+                    file_stat = stat(join(self.cache_dir, file_name))
+                except OSError:  # removed by a concurrent run
+                    continue
+                files.append((file_stat.st_mtime, file_stat.st_size, file_name))
+
+        size = sum(file_size for _, file_size, _ in files)
+        for _, file_size, file_name in sorted(files):
+            if size <= self.max_size * 1.e6:
+                break
+            try:
+                remove(join(self.cache_dir, file_name))
+            except OSError:
+                pass
+            size -= file_size
+
+
+class DirectionalResponses(object):
+    """Irradiance responses of the elements of a static scene to unit-energy light sources.
+
+    Caribu is run once for each new light direction with a unit energy source and the resulting per-element `Ei` and
+    `Eabs` values are stored column-wise in response matrices. Irradiance from any combination of sources is then
+    obtained as the weighted sum of the responses to their directions, which holds since both the projection and the
+    radiosity computations are linear in source energy.
+
+    Args:
+        mtg (MTG): plant Multiscale Tree Graph, having `geometry` and `opticals` properties
+        unit_scene_length (str): the unit of length used for scene coordinate and for pattern
+            (should be one of `CaribuScene.units` default)
+        direct: see :func:`runCaribu` from `CaribuScene` package
+        infinite: see :func:`runCaribu` from `CaribuScene` package
+        nz: see :func:`runCaribu` from `CaribuScene` package
+        ds: see :func:`runCaribu` from `CaribuScene` package
+        pattern: see :func:`runCaribu` from `CaribuScene` package
+        soil_reflectance (float): [-] the reflectance of the soil (between 0 and 1)
+        decimals (int): number of decimals to which source directions are rounded before being compared
+        cache (IrradianceCache): if provided, a disk cache of the responses to unit-energy sources
+        bins (DirectionBins): if provided, sun directions are replaced by the nearest bin direction lying within the
+            tolerance of the bins, so that successive sun positions share the same responses (diffuse sources always
+            use their exact direction)
+
+    Notes:
+        The scene geometry and optical properties are assumed to remain unchanged once the object is created.
+        Binning only changes the direction of the sun, not its energy. The resulting error on irradiance
+            can be estimated with :meth:`binning_report`.
+
+    """
+
+    def __init__(self, mtg, unit_scene_length, direct=False, infinite=True, nz=50, ds=0.5, pattern=None,
+                 soil_reflectance=0.15, decimals=6, cache=None, bins=None):
+        self.light_scene = LightScene(mtg, unit_scene_length, direct=direct, infinite=infinite, nz=nz, ds=ds,
+                                      pattern=pattern, soil_reflectance=soil_reflectance, cache=cache)
+        self.vids = self.light_scene.vids
+        self.decimals = decimals
+        self.bins = bins
+        self.binned = {}
+
+        self.directions = {}
+        self._ei_columns = []
+        self._eabs_columns = []
+        self._ei = zeros((len(self.vids), 0))
+        self._eabs = zeros((len(self.vids), 0))
+
+    def direction_key(self, direction):
+        return tuple(round(float(x), self.decimals) for x in direction)
+
+    def response_key(self, direction, sun=False):
+        """Returns the key of the direction whose response is used for a given light direction.
+
+        Args:
+            direction (tuple): (x, y, z) light direction
+            sun (bool): whether the direction is that of the direct (sun) source, the only one subject to binning
+
+        Returns:
+            (tuple): the rounded light direction, or that of its bin if binning applies to it
+
+        """
+        key = self.direction_key(direction)
+        if not sun or self.bins is None:
+            return key
+
+        if key not in self.binned:
+            bin_direction, deviation = self.bins.snap(key)
+            self.binned[key] = (key if bin_direction is None else self.direction_key(bin_direction), deviation)
+        return self.binned[key][0]
+
+    def compute(self, directions, sun=None):
+        """Runs Caribu for the directions that have not been computed yet.
+
+        Args:
+            directions (list): (x, y, z) light directions, computed exactly
+            sun (tuple): if provided, (x, y, z) direction of the sun, replaced by its bin direction if binning applies
+
+        Returns:
+            (int): the number of Caribu runs
+
+        """
+        keys = [self.response_key(direction) for direction in directions]
+        if sun is not None:
+            keys.append(self.response_key(sun, sun=True))
+
+        runs = 0
+        for key in keys:
+            if key not in self.directions:
+                ei, eabs = self.light_scene.irradiance([(1., key)])
+                self._ei_columns.append([ei[vid] for vid in self.vids])
+                self._eabs_columns.append([eabs[vid] for vid in self.vids])
+                self.directions[key] = len(self.directions)
+                runs += 1
+
+        if runs > 0:
+            self._ei = column_stack(self._ei_columns)
+            self._eabs = column_stack(self._eabs_columns)
+
+        return runs
+
+    def irradiance(self, source, sun=None):
+        """Computes per-element irradiance from the stored responses.
+
+        Args:
+            source (list): a tuple of tuples, giving energy unit and sky coordinates (see :func:`hsCaribu`)
+            sun (tuple): if provided, (x, y, z) direction of the direct source of :arg:`source`, the only source
+                whose direction is binned, diffuse sources always use their exact direction
+
+        Returns:
+            (dict): [umol m-2 s-1] incident irradiance (`Ei`) of the scene elements given as the dictionary keys
+            (dict): [umol m-2 s-1] absorbed irradiance (`Eabs`) of the scene elements given as the dictionary keys
+
+        """
+        source = [(energy, direction) for energy, direction in source if energy > 0.]
+        if len(source) == 0:
+            return {vid: 0. for vid in self.vids}, {vid: 0. for vid in self.vids}
+
+        sun_key = None if sun is None else self.direction_key(sun)
+        is_sun = [self.direction_key(direction) == sun_key for energy, direction in source]
+        self.compute([direction for (energy, direction), i_sun in zip(source, is_sun) if not i_sun],
+                     sun if any(is_sun) else None)
+
+        weights = zeros(len(self.directions))
+        for (energy, direction), i_sun in zip(source, is_sun):
+            weights[self.directions[self.response_key(direction, sun=i_sun)]] += energy
+
+        ei = self._ei.dot(weights)
+        eabs = self._eabs.dot(weights)
+
+        return dict(zip(self.vids, ei.tolist())), dict(zip(self.vids, eabs.tolist()))
+
+    def binning_report(self, samples=10):
+        """Summarizes the error resulting from the binning of light directions.
+
+        Args:
+            samples (int): maximum number of binned directions for which Caribu is run with the exact direction in
+                order to estimate the error on absorbed irradiance (evenly picked among binned directions)
+
+        Returns:
+            (dict): having the following keys:
+                'directions' (int): number of distinct sun directions submitted to binning
+                'binned' (int): number of sun directions replaced by a bin direction
+                'responses' (int): number of directions for which Caribu was run
+                'max_deviation', 'mean_deviation' (float): [°] maximum and mean angles between binned directions
+                    and their bin direction
+                'max_error', 'mean_error' (float): [-] maximum and mean relative errors on the total absorbed
+                    irradiance of the scene for a unit-energy source, over the sampled directions (`None` if none)
+
+        """
+        binned = [(key, bin_key, deviation) for key, (bin_key, deviation) in self.binned.items() if bin_key != key]
+        deviations = [deviation for key, bin_key, deviation in binned]
+
+        errors = []
+        if samples > 0 and len(binned) > 0:
+            for i in sorted(set(linspace(0, len(binned) - 1, min(samples, len(binned))).astype(int))):
+                key, bin_key, deviation = binned[i]
+                ei, eabs = self.light_scene.irradiance([(1., key)])
+                exact = sum(eabs.values())
+                if exact > 0.:
+                    errors.append(abs(self._eabs[:, self.directions[bin_key]].sum() - exact) / exact)
+
+        return {'directions': len(self.binned),
+                'binned': len(binned),
+                'responses': len(self.directions),
+                'max_deviation': max(deviations) if deviations else 0.,
+                'mean_deviation': sum(deviations) / len(deviations) if deviations else 0.,
+                'max_error': max(errors) if errors else None,
+                'mean_error': sum(errors) / len(errors) if errors else None}
+
+
+class DirectionBins(object):
+    """A fixed set of light directions to which other directions are snapped.
+
+    Args:
+        directions (array): (n, 3) array of (x, y, z) bin directions, e.g. the directions of a fine icosphere
+            (see :func:`sky_directions`)
+        tolerance (float): [°] maximum angle between a direction and the bin direction it is snapped to
+
+    """
+
+    def __init__(self, directions, tolerance=1.):
+        directions = array(directions, dtype=float).reshape(-1, 3)
+        self.directions = directions / norm(directions, axis=1)[:, None]
+        self.tolerance = tolerance
+        self._min_cosine = cos(deg2rad(tolerance))
+
+    def snap(self, direction):
+        """Finds the bin direction of a light direction.
+
+        Args:
+            direction (tuple): (x, y, z) light direction
+
+        Returns:
+            (tuple): the (x, y, z) nearest bin direction, or `None` if it lies beyond the tolerance
+            (float): [°] the angle between the direction and the nearest bin direction
+
+        """
+        direction = array(direction, dtype=float)
+        cosines = self.directions.dot(direction / norm(direction))
+        nearest = cosines.argmax()
+        deviation = float(rad2deg(arccos(clip(cosines[nearest], -1., 1.))))
+        if cosines[nearest] < self._min_cosine:
+            return None, deviation
+        return tuple(self.directions[nearest].tolist()), deviation
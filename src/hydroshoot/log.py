@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""
+Console reporting of HydroShoot.
+
+The modules of HydroShoot report the progress of simulations through loggers of the 'hydroshoot' hierarchy of the
+standard `logging` package:
+    - `logging.INFO`: simulation settings and a summary of each time step
+    - `logging.DEBUG`: the convergence errors of the solver at each iteration
+"""
+
+import logging
+import sys
+
+SILENT = logging.CRITICAL + 1
+
+logger = logging.getLogger('hydroshoot')
+logger.addHandler(logging.NullHandler())
+
+_console_handler = logging.StreamHandler(sys.stdout)
+_console_handler.setFormatter(logging.Formatter('%(message)s'))
+
+
+def set_console_level(level=logging.INFO):
+    """Sets the level of the messages of HydroShoot printed to the console.
+
+    Args:
+        level (int): a `logging` level (e.g. `logging.DEBUG` to follow the convergence of the solver at each
+            iteration), or `None` to silence HydroShoot
+
+    Notes:
+        Messages are printed to the standard output by a handler attached to the 'hydroshoot' logger.
+
+    """
+    if level is None:
+        logger.setLevel(SILENT)
+    else:
+        logger.setLevel(level)
+        if _console_handler not in logger.handlers:
+            logger.addHandler(_console_handler)
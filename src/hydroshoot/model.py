@@ -5,9 +5,12 @@ energy-exchange, and soil water depletion, for each given time step.
 from __future__ import division
 from __future__ import print_function
 from past.utils import old_div
+import logging
 import numpy as np
-from copy import deepcopy
+from os import fsync, replace
 from os.path import isfile
+from time import perf_counter
+from pickle import dump, load, HIGHEST_PROTOCOL
 from datetime import datetime, timedelta
 from pandas import read_csv, DataFrame, date_range, DatetimeIndex, merge
 
@@ -15,14 +18,65 @@ import openalea.mtg.traversal as traversal
 from openalea.plantgl.all import Scene, surface
 
 from hydroshoot import (architecture, irradiance, exchange, hydraulic, energy,
-                        display, solver)
+                        display, solver, output, log, climate, pipeline)
+from hydroshoot.profiling import PhaseTimer
+from hydroshoot.stages import StageRunner, forked_workers_allowed
 from hydroshoot.params import Params
 
+logger = logging.getLogger(__name__)
 
-def run(g, wd, scene=None, write_result=True, **kwargs):
+
+def run(g, wd, scene=None, write_result=True, callback=None, **kwargs):
     """
     Calculates leaf gas and energy exchange in addition to the hydraulic structure of an individual plant.
 
+    :Parameters:
+    - **g**: a multiscale tree graph object
+    - **wd**: string, working directory
+    - **scene**: PlantGl scene
+    - **write_result**: bool, if True, the resulting time series are written to 'time_series.output' in the output
+      folder
+    - **callback**: callable, if provided, it is called with the record of each time step (see :func:`iter_run`),
+      e.g. to collect timings with :func:`hydroshoot.profiling.profile_table`
+    - **kwargs**: see :func:`iter_run`
+
+    :Returns:
+    - a `pandas.DataFrame` of the time series of intercepted global radiation ('Rg'), net plant carbon assimilation
+      ('An'), plant transpiration ('E') and median leaf temperature ('Tleaf')
+    """
+    time_on = datetime.now()
+
+    records = []
+    for record in iter_run(g, wd, scene, **kwargs):
+        if callback is not None:
+            callback(record)
+        records.append({name: record[name] for name in ('date', 'Rg', 'An', 'E', 'Tleaf')})
+
+    # Results DataFrame
+    results_df = DataFrame(records, columns=['date', 'Rg', 'An', 'E', 'Tleaf']).set_index('date')
+    results_df.index.name = 'time'
+
+    # Write
+    if write_result:
+        output_path = wd + 'output' + Params(wd + 'params.json').simulation.output_index + '/'
+        results_df.to_csv(output_path + 'time_series.output',
+                          sep=';', decimal='.')
+
+    time_off = datetime.now()
+
+    logger.info('')
+    logger.info('beg time %s', time_on)
+    logger.info('end time %s', time_off)
+    logger.info('--- Total runtime: %d minute(s) ---', int((time_off - time_on).seconds / 60.))
+
+    return results_df
+
+
+def iter_run(g, wd, scene=None, **kwargs):
+    """
+    Calculates leaf gas and energy exchange in addition to the hydraulic structure of an individual plant, and
+    yields the results of each time step as soon as it is solved.
+
     :Parameters:
     - **g**: a multiscale tree graph object
     - **wd**: string, working directory
@@ -32,11 +86,55 @@ def run(g, wd, scene=None, write_result=True, **kwargs):
         - **gdd_since_budbreak**: [°Cd] growing degree-day since bubreak
         - **sun2scene**: PlantGl scene, when prodivided, a sun object (sphere) is added to it
         - **soil_size**: [cm] length of squared mesh size
+        - **checkpoint_interval**: int, number of time steps between two successive checkpoints written to the
+          output folder (no checkpoint is written if 0, the default)
+        - **resume**: bool, if True, the simulation continues from the last checkpoint found in the output folder
+          (default False)
+        - **columnar_output**: bool, if True, the per-vertex time series of 'psi_head', 'Tlc', 'An', 'gs', 'E', 'Ei'
+          and 'Eabs' are written to the 'results' folder of the output folder (see :mod:`hydroshoot.output`), and
+          the geometry of **scene** is saved only once instead of pickling the mtg at each time step (default False)
+        - **leaf_properties**: list of the names of leaf properties (e.g. 'psi_head', 'Tlc', 'Eabs', 'An', 'gs')
+          whose values are added to each time step record (none by default)
+        - **log_level**: level of the messages printed to the console (see :func:`hydroshoot.log.set_console_level`),
+          e.g. `logging.DEBUG` to follow the convergence of the solver, or `None` for a silent run (default
+          `logging.INFO`, unless the application has configured its own logging handlers)
+        - **irradiance_processes**: int, number of worker processes computing the irradiance of upcoming time
+          steps while the current one is solved (see :mod:`hydroshoot.pipeline`), irradiance is computed in the main
+          process if 0 (default), with stored irradiance responses, when **sun2scene** is provided or when worker
+          processes cannot be forked (e.g. in the workers of :func:`hydroshoot.batch.run_batch`)
+        - **irradiance_lookahead**: int, maximum number of time steps whose irradiance is computed ahead of the
+          current one (twice **irradiance_processes** by default)
+        - **startup_processes**: int, maximum number of initialisation stages (form factors, sun positions and
+          irradiance of the 10 days prior to the simulation) run concurrently in forked processes (see
+          :mod:`hydroshoot.stages`), stages are run one after the other in the main process if 0 (default) or when
+          processes cannot be forked (e.g. in the workers of :func:`hydroshoot.batch.run_batch`); in all cases the
+          timings and critical path of the initialisation are logged
+
+    :Yields:
+    - a dictionary per time step holding:
+        - **date**: the time step
+        - **Rg**: [W m-2 ground] intercepted global radiation
+        - **An**: [umol s-1] net plant carbon assimilation
+        - **E**: [g h-1] plant transpiration (per meteo time step)
+        - **Tleaf**: [°C] median leaf temperature
+        - **psi_soil**: [MPa] soil water potential
+        - **iterations**: dict of the numbers of iterations and final errors of the solver (see
+          :func:`hydroshoot.solver.solve_interactions`)
+        - **timings**: dict of the wall time [s] spent in each computation phase of the time step and in the whole
+          time step ('total'), see :func:`hydroshoot.profiling.profile_table`
+        - **leaf_vids**: list of leaf ids, giving the order of the values in **leaf_properties**
+        - **leaf_properties**: dict of `numpy.array` of the requested leaf properties
+
+    :Notes:
+    - When resuming from a checkpoint, the records of the steps solved before the checkpoint are yielded first,
+      without leaf properties nor timings.
     """
-    print('++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++')
-    print('+ Project: ', wd)
-    print('++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++')
-    time_on = datetime.now()
+    if 'log_level' in kwargs or not logging.getLogger().handlers:
+        log.set_console_level(kwargs.get('log_level', logging.INFO))
+
+    logger.info('++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++')
+    logger.info('+ Project: %s', wd)
+    logger.info('++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++')
 
     # Read user parameters
     params_path = wd + 'params.json'
@@ -47,17 +145,13 @@ def run(g, wd, scene=None, write_result=True, **kwargs):
     # ==============================================================================
     # Initialisation
     # ==============================================================================
+    # Expensive stages depending only on inputs, run concurrently in forked processes if requested
+    startup = StageRunner(kwargs.get('startup_processes', 0))
+
     #   Climate data
     meteo_path = wd + params.simulation.meteo
-    meteo_tab = read_csv(meteo_path, sep=';', decimal='.', header=0)
-    meteo_tab.time = DatetimeIndex(meteo_tab.time)
-    meteo_tab = meteo_tab.set_index(meteo_tab.time)
-
-    #   Adding missing data
-    if 'Ca' not in meteo_tab.columns:
-        meteo_tab['Ca'] = [400.] * len(meteo_tab)  # ppm [CO2]
-    if 'Pa' not in meteo_tab.columns:
-        meteo_tab['Pa'] = [101.3] * len(meteo_tab)  # atmospheric pressure
+    cache_dir = None if params.simulation.cache_dir is None else wd + params.simulation.cache_dir
+    meteo_tab = climate.read_meteo(meteo_path, cache_dir)
 
     #   Determination of the simulation period
     sdate = datetime.strptime(params.simulation.sdate, "%Y-%m-%d %H:%M:%S")
@@ -83,24 +177,25 @@ def run(g, wd, scene=None, write_result=True, **kwargs):
     t_base = params.phenology.t_base
     budbreak_date = datetime.strptime(params.phenology.emdate, "%Y-%m-%d %H:%M:%S")
 
-    if 'gdd_since_budbreak' in kwargs:
-        gdd_since_budbreak = kwargs['gdd_since_budbreak']
-    elif min(meteo_tab.index) <= budbreak_date:
-        tdays = date_range(budbreak_date, sdate, freq='D')
-        tmeteo = meteo_tab.loc[tdays].Tac.to_frame()
-        tmeteo = tmeteo.set_index(DatetimeIndex(tmeteo.index).normalize())
-        df_min = tmeteo.groupby(tmeteo.index).aggregate(np.min).Tac
-        df_max = tmeteo.groupby(tmeteo.index).aggregate(np.max).Tac
-        # df_tt = merge(df_max, df_min, how='inner', left_index=True, right_index=True)
-        # df_tt.columns = ('max', 'min')
-        # df_tt['gdd'] = df_tt.apply(lambda x: 0.5 * (x['max'] + x['min']) - t_base)
-        # gdd_since_budbreak = df_tt['gdd'].cumsum()[-1]
-        df_tt = 0.5 * (df_min + df_max) - t_base
-        gdd_since_budbreak = df_tt.cumsum()[-1]
-    else:
-        raise ValueError('Cumulative degree-days temperature is not provided.')
+    with startup.stage('gdd'):
+        if 'gdd_since_budbreak' in kwargs:
+            gdd_since_budbreak = kwargs['gdd_since_budbreak']
+        elif min(meteo_tab.index) <= budbreak_date:
+            tdays = date_range(budbreak_date, sdate, freq='D')
+            tmeteo = meteo_tab.loc[tdays].Tac.to_frame()
+            tmeteo = tmeteo.set_index(DatetimeIndex(tmeteo.index).normalize())
+            df_min = tmeteo.groupby(tmeteo.index).aggregate(np.min).Tac
+            df_max = tmeteo.groupby(tmeteo.index).aggregate(np.max).Tac
+            # df_tt = merge(df_max, df_min, how='inner', left_index=True, right_index=True)
+            # df_tt.columns = ('max', 'min')
+            # df_tt['gdd'] = df_tt.apply(lambda x: 0.5 * (x['max'] + x['min']) - t_base)
+            # gdd_since_budbreak = df_tt['gdd'].cumsum()[-1]
+            df_tt = 0.5 * (df_min + df_max) - t_base
+            gdd_since_budbreak = df_tt.cumsum()[-1]
+        else:
+            raise ValueError('Cumulative degree-days temperature is not provided.')
 
-    print('GDD since budbreak = %d °Cd' % gdd_since_budbreak)
+    logger.info('GDD since budbreak = %d °Cd', gdd_since_budbreak)
 
     # Determination of perennial structure arms (for grapevine)
     # arm_vid = {g.node(vid).label: g.node(vid).components()[0]._vid for vid in g.VtxList(Scale=2) if
@@ -145,133 +240,187 @@ def run(g, wd, scene=None, write_result=True, **kwargs):
     icosphere_level = params.irradiance.icosphere_level
     turtle_format = params.irradiance.turtle_format
 
-    limit = params.energy.limit
-    energy_budget = params.simulation.energy_budget
-    solo = params.energy.solo
-    simplified_form_factors = params.simulation.simplified_form_factors
-    print('Energy_budget: %s' % energy_budget)
-
-    # Optical properties
-    opt_prop = params.irradiance.opt_prop
-
-    print('Hydraulic structure: %s' % params.simulation.hydraulic_structure)
-
-    psi_min = params.hydraulic.psi_min
-
-    # Parameters of leaf Nitrogen content-related models
-    Na_dict = params.exchange.Na_dict
-
-    # Computation of the form factor matrix
-    form_factors=None
-    if energy_budget:
-        print('Computing form factors...')
-        if not simplified_form_factors:
-            form_factors = energy.form_factors_matrix(g, pattern, length_conv, limit=limit)
-        else:
-            form_factors = energy.form_factors_simplified(g, pattern=pattern, infinite=True, leaf_lbl_prefix=leaf_lbl_prefix,
-                                           turtle_sectors=turtle_sectors, icosphere_level=icosphere_level,
-                                           unit_scene_length=unit_scene_length)
-
-    # Soil class
-    soil_class = params.soil.soil_class
-    print('Soil class: %s' % soil_class)
-
-    # Rhyzosphere concentric radii determination
-    rhyzo_radii = params.soil.rhyzo_radii
-    rhyzo_number = len(rhyzo_radii)
-
-    # Add rhyzosphere elements to mtg
-    rhyzo_solution = params.soil.rhyzo_solution
-    print('rhyzo_solution: %s' % rhyzo_solution)
-
-    if rhyzo_solution:
-        dist_roots, rad_roots = params.soil.roots
-        if not any(item.startswith('rhyzo') for item in list(g.property('label').values())):
-            vid_collar = architecture.mtg_base(g, vtx_label=vtx_label)
-            vid_base = architecture.add_soil_components(g, rhyzo_number, rhyzo_radii,
-                                                        soil_dimensions, soil_class, vtx_label)
-        else:
-            vid_collar = g.node(g.root).vid_collar
-            vid_base = g.node(g.root).vid_base
-
-            radius_prev = 0.
-
-            for ivid, vid in enumerate(g.Ancestors(vid_collar)[1:]):
-                radius = rhyzo_radii[ivid]
-                g.node(vid).Length = radius - radius_prev
-                g.node(vid).depth = old_div(soil_dimensions[2], length_conv)  # [m]
-                g.node(vid).TopDiameter = radius * 2.
-                g.node(vid).BotDiameter = radius * 2.
-                g.node(vid).soil_class = soil_class
-                radius_prev = radius
+    # Sky discretizations of irradiance and form factors, saved to (or read from) the cache folder
+    if cache_dir is not None:
+        irradiance.sky_directions(turtle_sectors, turtle_format, None, cache_dir)
+        irradiance.sky_directions(turtle_sectors, 'uoc', icosphere_level, cache_dir)
+
+    # Stage processes are stopped if the initialisation fails
+    try:
+        # Sun positions and diffuse-to-total irradiance ratios over the whole simulation period
+        startup.submit('solar_sources', irradiance.solar_sources, meteo, geo_location, E_type, tzone)
+
+        # Light sources of the 10 days prior to the simulation, used to estimate leaf Nitrogen content
+        estimate_nitrogen = 'Na' not in g.property_names()
+        if estimate_nitrogen:
+            assert (sdate - min(
+                meteo_tab.index)).days >= 10, 'Meteorological data do not cover 10 days prior to simulation date.'
+
+            ppfd10_date = sdate + timedelta(days=-10)
+            ppfd10t = date_range(ppfd10_date, sdate, freq='H')
+            ppfd10_meteo = meteo_tab.loc[ppfd10t]
+            startup.submit('nitrogen_sources', irradiance.irradiance_distribution, ppfd10_meteo, geo_location, E_type,
+                           tzone, turtle_sectors, turtle_format, None, scene_rotation, None)
+
+        limit = params.energy.limit
+        energy_budget = params.simulation.energy_budget
+        solo = params.energy.solo
+        simplified_form_factors = params.simulation.simplified_form_factors
+        logger.info('Energy_budget: %s', energy_budget)
+
+        # Optical properties
+        opt_prop = params.irradiance.opt_prop
+
+        logger.info('Hydraulic structure: %s', params.simulation.hydraulic_structure)
+
+        psi_min = params.hydraulic.psi_min
+
+        # Parameters of leaf Nitrogen content-related models
+        Na_dict = params.exchange.Na_dict
+
+        # Computation of the form factor matrix
+        if energy_budget:
+            logger.info('Computing form factors...')
+            if not simplified_form_factors:
+                startup.submit('form_factors', energy.form_factors_matrix, g, pattern, length_conv, limit=limit,
+                               leaf_lbl_prefix=leaf_lbl_prefix)
+            else:
+                startup.submit('form_factors', energy.form_factors_simplified, g, pattern=pattern, infinite=True,
+                               leaf_lbl_prefix=leaf_lbl_prefix, turtle_sectors=turtle_sectors,
+                               icosphere_level=icosphere_level, unit_scene_length=unit_scene_length)
+
+        # Soil class
+        soil_class = params.soil.soil_class
+        logger.info('Soil class: %s', soil_class)
+
+        # Rhyzosphere concentric radii determination
+        rhyzo_radii = params.soil.rhyzo_radii
+        rhyzo_number = len(rhyzo_radii)
+
+        # Add rhyzosphere elements to mtg
+        rhyzo_solution = params.soil.rhyzo_solution
+        logger.info('rhyzo_solution: %s', rhyzo_solution)
+
+        with startup.stage('soil'):
+            if rhyzo_solution:
+                dist_roots, rad_roots = params.soil.roots
+                if not any(item.startswith('rhyzo') for item in list(g.property('label').values())):
+                    vid_collar = architecture.mtg_base(g, vtx_label=vtx_label)
+                    vid_base = architecture.add_soil_components(g, rhyzo_number, rhyzo_radii,
+                                                                soil_dimensions, soil_class, vtx_label)
+                else:
+                    vid_collar = g.node(g.root).vid_collar
+                    vid_base = g.node(g.root).vid_base
+
+                    radius_prev = 0.
+
+                    for ivid, vid in enumerate(g.Ancestors(vid_collar)[1:]):
+                        radius = rhyzo_radii[ivid]
+                        g.node(vid).Length = radius - radius_prev
+                        g.node(vid).depth = old_div(soil_dimensions[2], length_conv)  # [m]
+                        g.node(vid).TopDiameter = radius * 2.
+                        g.node(vid).BotDiameter = radius * 2.
+                        g.node(vid).soil_class = soil_class
+                        radius_prev = radius
 
-    else:
-        dist_roots, rad_roots = None, None
-        # Identifying and attaching the base node of a single MTG
-        vid_collar = architecture.mtg_base(g, vtx_label=vtx_label)
-        vid_base = vid_collar
-
-    g.node(g.root).vid_base = vid_base
-    g.node(g.root).vid_collar = vid_collar
-
-    # Initializing sapflow to 0
-    for vtx_id in traversal.pre_order2(g, vid_base):
-        g.node(vtx_id).Flux = 0.
-
-    # Addition of a soil element
-    if 'Soil' not in list(g.properties()['label'].values()):
-        if 'soil_size' in kwargs:
-            if kwargs['soil_size'] > 0.:
-                architecture.add_soil(g, kwargs['soil_size'])
-        else:
-            architecture.add_soil(g, 500.)
-
-    # Suppression of undesired geometry for light and energy calculations
-    geom_prop = g.properties()['geometry']
-    vidkeys = []
-    for vid in g.properties()['geometry']:
-        n = g.node(vid)
-        if not n.label.startswith(('L', 'other', 'soil')):
-            vidkeys.append(vid)
-    [geom_prop.pop(x) for x in vidkeys]
-    g.properties()['geometry'] = geom_prop
-
-    # Attaching optical properties to MTG elements
-    g = irradiance.optical_prop(g, leaf_lbl_prefix=leaf_lbl_prefix,
-                                stem_lbl_prefix=stem_lbl_prefix, wave_band='SW',
-                                opt_prop=opt_prop)
-
-    # Estimation of Nitroen surface-based content according to Prieto et al. (2012)
-    # Estimation of intercepted irradiance over past 10 days:
-    if not 'Na' in g.property_names():
-        print('Computing Nitrogen profile...')
-        assert (sdate - min(
-            meteo_tab.index)).days >= 10, 'Meteorological data do not cover 10 days prior to simulation date.'
-
-        ppfd10_date = sdate + timedelta(days=-10)
-        ppfd10t = date_range(ppfd10_date, sdate, freq='H')
-        ppfd10_meteo = meteo_tab.loc[ppfd10t]
-        caribu_source, RdRsH_ratio = irradiance.irradiance_distribution(ppfd10_meteo, geo_location, E_type,
-                                                                        tzone, turtle_sectors, turtle_format,
-                                                                        None, scene_rotation, None)
-
-        # Compute irradiance interception and absorbtion
-        g, caribu_scene = irradiance.hsCaribu(mtg=g,
-                                              unit_scene_length=unit_scene_length,
-                                              source=caribu_source, direct=False,
-                                              infinite=True, nz=50, ds=0.5,
-                                              pattern=pattern)
-
-        g.properties()['Ei10'] = {vid: g.node(vid).Ei * time_conv / 10. / 1.e6 for vid in list(g.property('Ei').keys())}
-
-        # Estimation of leaf surface-based nitrogen content:
-        for vid in g.VtxList(Scale=3):
-            if g.node(vid).label.startswith(leaf_lbl_prefix):
-                g.node(vid).Na = exchange.leaf_Na(gdd_since_budbreak, g.node(vid).Ei10,
-                                                  Na_dict['aN'],
-                                                  Na_dict['bN'],
-                                                  Na_dict['aM'],
-                                                  Na_dict['bM'])
+            else:
+                dist_roots, rad_roots = None, None
+                # Identifying and attaching the base node of a single MTG
+                vid_collar = architecture.mtg_base(g, vtx_label=vtx_label)
+                vid_base = vid_collar
+
+            g.node(g.root).vid_base = vid_base
+            g.node(g.root).vid_collar = vid_collar
+
+            # Initializing sapflow to 0
+            for vtx_id in traversal.pre_order2(g, vid_base):
+                g.node(vtx_id).Flux = 0.
+
+            # Compiled hydraulic structure, reused over all iterations and time steps
+            hydraulic_tree = hydraulic.HydraulicTree(g, vid_base, length_conv)
+
+        with startup.stage('scene'):
+            # Addition of a soil element
+            if 'Soil' not in list(g.properties()['label'].values()):
+                if 'soil_size' in kwargs:
+                    if kwargs['soil_size'] > 0.:
+                        architecture.add_soil(g, kwargs['soil_size'])
+                else:
+                    architecture.add_soil(g, 500.)
+
+            # Suppression of undesired geometry for light and energy calculations
+            geom_prop = g.properties()['geometry']
+            vidkeys = []
+            for vid in g.properties()['geometry']:
+                n = g.node(vid)
+                if not n.label.startswith(('L', 'other', 'soil')):
+                    vidkeys.append(vid)
+            [geom_prop.pop(x) for x in vidkeys]
+            g.properties()['geometry'] = geom_prop
+
+            # Attaching optical properties to MTG elements
+            g = irradiance.optical_prop(g, leaf_lbl_prefix=leaf_lbl_prefix,
+                                        stem_lbl_prefix=stem_lbl_prefix, wave_band='SW',
+                                        opt_prop=opt_prop)
+
+            # Disk cache of irradiance results, shared by the runs on the same plant geometry
+            if cache_dir is not None and params.irradiance.cache_size > 0:
+                irradiance_cache = irradiance.IrradianceCache(cache_dir, max_size=params.irradiance.cache_size)
+            else:
+                irradiance_cache = None
+
+            # Caribu scene of the plant, built once as only light sources change between time steps, and irradiance
+            # responses of the scene to unit-energy sources, computed once per light direction
+            sun_bins_level = params.irradiance.sun_bins_level
+            if sun_bins_level:
+                direction_bins = irradiance.DirectionBins(
+                    irradiance.sky_directions(icosphere_level=sun_bins_level, cache_dir=cache_dir)[0],
+                    tolerance=params.irradiance.sun_bins_tolerance)
+            else:
+                direction_bins = None
+
+            if params.irradiance.precompute_responses or direction_bins is not None:
+                irradiance_responses = irradiance.DirectionalResponses(g, unit_scene_length=unit_scene_length,
+                                                                       direct=False, infinite=True, nz=50, ds=0.5,
+                                                                       pattern=pattern, cache=irradiance_cache,
+                                                                       bins=direction_bins)
+                light_scene = irradiance_responses.light_scene
+            else:
+                irradiance_responses = None
+                light_scene = irradiance.LightScene(g, unit_scene_length=unit_scene_length, direct=False, infinite=True,
+                                                    nz=50, ds=0.5, pattern=pattern, cache=irradiance_cache)
+
+        # Estimation of Nitroen surface-based content according to Prieto et al. (2012)
+        # Estimation of intercepted irradiance over past 10 days:
+        if estimate_nitrogen:
+            logger.info('Computing Nitrogen profile...')
+            caribu_source, RdRsH_ratio = startup.result('nitrogen_sources')
+
+            # Compute irradiance interception and absorbtion, concurrently with the form factors
+            startup.submit('nitrogen_irradiance', light_scene.irradiance, caribu_source)
+            g.properties()['Ei'], g.properties()['Eabs'] = startup.result('nitrogen_irradiance')
+
+            g.properties()['Ei10'] = {vid: g.node(vid).Ei * time_conv / 10. / 1.e6
+                                      for vid in list(g.property('Ei').keys())}
+
+            # Estimation of leaf surface-based nitrogen content:
+            for vid in g.VtxList(Scale=3):
+                if g.node(vid).label.startswith(leaf_lbl_prefix):
+                    g.node(vid).Na = exchange.leaf_Na(gdd_since_budbreak, g.node(vid).Ei10,
+                                                      Na_dict['aN'],
+                                                      Na_dict['bN'],
+                                                      Na_dict['aM'],
+                                                      Na_dict['bM'])
+
+        solar = startup.result('solar_sources')
+        form_factors = startup.result('form_factors') if energy_budget else None
+    finally:
+        startup.close()
+
+    if logger.isEnabledFor(logging.INFO):
+        startup_report = startup.report()
+        logger.info('Initialisation stages [s]:\n%s', startup_report.round(3).to_string())
+        logger.info('Initialisation critical path: %s', ' > '.join(startup_report.index[startup_report.critical]))
 
     # Define path to folder
     output_path = wd + 'output' + output_index + '/'
@@ -283,148 +432,266 @@ def run(g, wd, scene=None, write_result=True, **kwargs):
     # Simulations
     # ==============================================================================
 
-    sapflow = []
-    # sapEast = []
-    # sapWest = []
-    an_ls = []
-    rg_ls = []
-    psi_stem = {}
-    Tlc_dict = {}
-    Ei_dict = {}
-    an_dict = {}
-    gs_dict = {}
-
-    # The time loop +++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
-    for date in meteo.time:
-        print("=" * 72)
-        print('Date', date, '\n')
-
-        # Select of meteo data
-        imeteo = meteo[meteo.time == date]
-
-        # Add a date index to g
-        g.date = datetime.strftime(date, "%Y%m%d%H%M%S")
-
-        # Read soil water potntial at midnight
-        if 'psi_soil' in kwargs:
-            psi_soil = kwargs['psi_soil']
-        else:
-            if date.hour == 0:
-                try:
-                    psi_soil_init = psi_pd.loc[date.date()][0]
-                    psi_soil = psi_soil_init
-                except KeyError:
-                    pass
-            # Estimate soil water potntial evolution due to transpiration
-            else:
-                psi_soil = hydraulic.soil_water_potential(psi_soil,
-                                                          g.node(vid_collar).Flux * time_conv,
-                                                          soil_class, soil_total_volume, psi_min)
-
-        if 'sun2scene' not in kwargs or not kwargs['sun2scene']:
-            sun2scene = None
-        elif kwargs['sun2scene']:
-            sun2scene = display.visu(g, def_elmnt_color_dict=True, scene=Scene())
-
-        # Compute irradiance distribution over the scene
-        caribu_source, RdRsH_ratio = irradiance.irradiance_distribution(imeteo, geo_location, E_type, tzone,
-                                                                        turtle_sectors, turtle_format, sun2scene,
-                                                                        scene_rotation, None)
-
-        # Compute irradiance interception and absorbtion
-        g, caribu_scene = irradiance.hsCaribu(mtg=g,
-                                              unit_scene_length=unit_scene_length,
-                                              source=caribu_source, direct=False,
-                                              infinite=True, nz=50, ds=0.5,
-                                              pattern=pattern)
-
-        # g.properties()['Ei'] = {vid: 1.2 * g.node(vid).Ei for vid in g.property('Ei').keys()}
-
-        # Trace intercepted irradiance on each time step
-        rg_ls.append(sum([old_div(g.node(vid).Ei, (0.48 * 4.6)) * surface(g.node(vid).geometry) * (length_conv ** 2) \
-                          for vid in g.property('geometry') if g.node(vid).label.startswith('L')]))
+    # Leaves whose properties are added to time step records
+    leaf_properties = kwargs.get('leaf_properties', ())
+    leaf_vids = energy.get_leaves(g, leaf_lbl_prefix)
 
+    # Aggregated records of past time steps, kept for checkpoints only
+    history = []
 
-        # Hack forcing of soil temperture (model of soil temperature under development)
-        t_soil = energy.forced_soil_temperature(imeteo)
-
-        # Climatic data for energy balance module
-        # TODO: Change the t_sky_eff formula (cf. Gliah et al., 2011, Heat and Mass Transfer, DOI: 10.1007/s00231-011-0780-1)
-        t_sky_eff = RdRsH_ratio * t_cloud + (1 - RdRsH_ratio) * t_sky
-
-        solver.solve_interactions(g, imeteo, psi_soil, t_soil, t_sky_eff,
-                                  vid_collar, vid_base, length_conv, time_conv,
-                                  rhyzo_total_volume, params, form_factors, simplified_form_factors)
-
-        # Write mtg to an external file
+    # Initial guesses of the solver taken from previous time steps
+    if params.numerical_resolution.warm_start != 'none':
+        warm_start = solver.WarmStart(params.numerical_resolution.warm_start)
+    else:
+        warm_start = None
+
+    # Checkpoints
+    checkpoint_path = output_path + 'checkpoint.pckl'
+    checkpoint_interval = kwargs.get('checkpoint_interval', 0)
+    first_step = 0
+
+    if kwargs.get('resume', False) and isfile(checkpoint_path):
+        checkpoint = read_checkpoint(checkpoint_path)
+        if checkpoint['dates'] != list(meteo.time):
+            raise ValueError("The checkpoint in '%s' does not match the simulation period." % checkpoint_path)
+        logger.info('Resuming simulation from %s', checkpoint['dates'][checkpoint['step'] - 1])
+
+        first_step = checkpoint['step']
+        psi_soil = checkpoint['psi_soil']
+        g.date = checkpoint['mtg_date']
+        for prop_name, prop_values in checkpoint['properties'].items():
+            g.properties()[prop_name] = prop_values
+        history = checkpoint['history']
+        warm_start = checkpoint.get('warm_start', warm_start)
+        for record in history:
+            yield record
+
+    # Columnar store of the per-vertex time series
+    if kwargs.get('columnar_output', False):
+        results_store = output.ColumnarWriter(output_path + 'results/', hydraulic_tree.vids, append=first_step > 0)
+        if first_step > 0:
+            results_store.truncate(meteo.time.iloc[first_step - 1])
         if scene is not None:
-            architecture.mtg_save(g, scene, output_path)
-
-        # Plot stuff..
-        sapflow.append(g.node(vid_collar).Flux)
-        # sapEast.append(g.node(arm_vid['arm1']).Flux)
-        # sapWest.append(g.node(arm_vid['arm2']).Flux)
-
-        an_ls.append(g.node(vid_collar).FluxC)
-
-        psi_stem[date] = deepcopy(g.property('psi_head'))
-        Tlc_dict[date] = deepcopy(g.property('Tlc'))
-        Ei_dict[date] = deepcopy(g.property('Eabs'))
-        an_dict[date] = deepcopy(g.property('An'))
-        gs_dict[date] = deepcopy(g.property('gs'))
-
-        print('---------------------------')
-        print('psi_soil', round(psi_soil, 4))
-        print('psi_collar', round(g.node(3).psi_head, 4))
-        print('psi_leaf', round(np.median([g.node(vid).psi_head for vid in list(g.property('gs').keys())]), 4))
-        print('')
-        # print 'Rdiff/Rglob ', RdRsH_ratio
-        # print 't_sky_eff ', t_sky_eff
-        print('gs', np.median(list(g.property('gs').values())))
-        print('flux H2O', round(g.node(vid_collar).Flux * 1000. * time_conv, 4))
-        print('flux C2O', round(g.node(vid_collar).FluxC, 4))
-        print('Tleaf ', round(np.median([g.node(vid).Tlc for vid in list(g.property('gs').keys())]), 2), \
-            'Tair ', round(imeteo.Tac[0], 4))
-        print('')
-        print("=" * 72)
-
-    # End time loop +++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
-
-    # Write output
-    # Plant total transpiration
-    sapflow = [flow * time_conv * 1000. for flow in sapflow]
-
-    # sapEast, sapWest = [np.array(flow) * time_conv * 1000. for i, flow in enumerate((sapEast, sapWest))]
-
-    # Median leaf temperature
-    t_ls = [np.median(list(Tlc_dict[date].values())) for date in meteo.time]
-
-    # Intercepted global radiation
-    rg_ls = old_div(np.array(rg_ls), (soil_dimensions[0] * soil_dimensions[1]))
-
-    results_dict = {
-        'Rg': rg_ls,
-        'An': an_ls,
-        'E': sapflow,
-        # 'sapEast': sapEast,
-        # 'sapWest': sapWest,
-        'Tleaf': t_ls
-    }
+            architecture.mtg_save_geometry(scene, output_path)
+    else:
+        results_store = None
+
+    # Irradiance of the upcoming time steps computed in worker processes (not with stored responses, which make
+    # irradiance cheap, nor when the sun is drawn in the main process)
+    irradiance_processes = kwargs.get('irradiance_processes', 0)
+    if irradiance_processes > 0 and not forked_workers_allowed():
+        logger.warning('Irradiance workers cannot be forked from this process, irradiance is computed in the main '
+                       'process.')
+        irradiance_processes = 0
+
+    if irradiance_processes > 0 and irradiance_responses is None and not kwargs.get('sun2scene', False):
+        lit_steps = [step for step in range(first_step, len(meteo))
+                     if not irradiance.is_dark(meteo.iloc[step:step + 1], E_type)]
+        irradiance_pipeline = pipeline.IrradiancePipeline(light_scene, meteo, solar, lit_steps,
+                                                          processes=irradiance_processes,
+                                                          lookahead=kwargs.get('irradiance_lookahead', None),
+                                                          geo_location=geo_location, irradiance_unit=E_type,
+                                                          time_zone=tzone, turtle_sectors=turtle_sectors,
+                                                          turtle_format=turtle_format, rotation_angle=scene_rotation)
+    else:
+        irradiance_pipeline = None
+
+    # Pending results are written and worker processes stopped however the time loop ends (completion, error or
+    # generator closed by the caller)
+    try:
+        # The time loop +++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+        for step, date in enumerate(meteo.time.iloc[first_step:], first_step):
+            timer = PhaseTimer()
+            step_time_on = perf_counter()
+            logger.info('=' * 72)
+            logger.info('Date %s\n', date)
+
+            # Select of meteo data
+            imeteo = meteo.iloc[[step]]
+
+            # Add a date index to g
+            g.date = datetime.strftime(date, "%Y%m%d%H%M%S")
+
+            # Read soil water potntial at midnight
+            if 'psi_soil' in kwargs:
+                psi_soil = kwargs['psi_soil']
+            else:
+                if date.hour == 0:
+                    try:
+                        psi_soil_init = psi_pd.loc[date.date()][0]
+                        psi_soil = psi_soil_init
+                    except KeyError:
+                        pass
+                # Estimate soil water potntial evolution due to transpiration
+                else:
+                    psi_soil = hydraulic.soil_water_potential(psi_soil,
+                                                              g.node(vid_collar).Flux * time_conv,
+                                                              soil_class, soil_total_volume, psi_min)
+
+            if 'sun2scene' not in kwargs or not kwargs['sun2scene']:
+                sun2scene = None
+            elif kwargs['sun2scene']:
+                sun2scene = display.visu(g, def_elmnt_color_dict=True, scene=Scene())
+
+            # Night-time (or zero-irradiance) steps need neither sky discretization nor Caribu
+            is_dark = irradiance.is_dark(imeteo, E_type)
+
+            if is_dark:
+                RdRsH_ratio = 1.
+                g.properties()['Ei'] = {vid: 0. for vid in g.property('geometry')}
+                g.properties()['Eabs'] = {vid: 0. for vid in g.property('geometry')}
+                rg = 0.
+            else:
+                if irradiance_pipeline is not None:
+                    # Wait for the irradiance computed in worker processes
+                    with timer.phase('irradiance_pipeline'):
+                        RdRsH_ratio, g.properties()['Ei'], g.properties()['Eabs'] = irradiance_pipeline.get(step)
+                else:
+                    # Compute irradiance distribution over the scene
+                    with timer.phase('irradiance_distribution'):
+                        caribu_source, RdRsH_ratio = irradiance.irradiance_distribution(imeteo, geo_location, E_type,
+                                                                                        tzone, turtle_sectors,
+                                                                                        turtle_format, sun2scene,
+                                                                                        scene_rotation, None,
+                                                                                        solar=solar.iloc[[step]])
+
+                    # Compute irradiance interception and absorbtion
+                    with timer.phase('hsCaribu'):
+                        if irradiance_responses is not None:
+                            # the sun is the last source, only its direction is binned
+                            sun = caribu_source[-1][1] if solar.sun.iloc[step][0] > 0. else None
+                            ei, eabs = irradiance_responses.irradiance(caribu_source, sun=sun)
+                        else:
+                            ei, eabs = light_scene.irradiance(caribu_source)
+                        g.properties()['Ei'], g.properties()['Eabs'] = ei, eabs
+
+                # g.properties()['Ei'] = {vid: 1.2 * g.node(vid).Ei for vid in g.property('Ei').keys()}
+
+                # Trace intercepted irradiance on each time step
+                rg = sum([old_div(g.node(vid).Ei, (0.48 * 4.6)) * surface(g.node(vid).geometry) * (length_conv ** 2) \
+                          for vid in g.property('geometry') if g.node(vid).label.startswith('L')])
+
+
+            # Hack forcing of soil temperture (model of soil temperature under development)
+            t_soil = energy.forced_soil_temperature(imeteo)
+
+            # Climatic data for energy balance module
+            # TODO: Change the t_sky_eff formula (cf. Gliah et al., 2011, Heat and Mass Transfer, DOI: 10.1007/s00231-011-0780-1)
+            t_sky_eff = RdRsH_ratio * t_cloud + (1 - RdRsH_ratio) * t_sky
+
+            iterations = solver.solve_interactions(g, imeteo, psi_soil, t_soil, t_sky_eff,
+                                                   vid_collar, vid_base, length_conv, time_conv,
+                                                   rhyzo_total_volume, params, form_factors, simplified_form_factors,
+                                                   hydraulic_tree=hydraulic_tree, is_dark=is_dark,
+                                                   warm_start=warm_start, timer=timer)
+
+            # Write results to external files
+            if results_store is not None:
+                results_store.append(g, date)
+            elif scene is not None:
+                architecture.mtg_save(g, scene, output_path)
+
+            # Time step record
+            record = {
+                'date': date,
+                'Rg': old_div(rg, (soil_dimensions[0] * soil_dimensions[1])),  # Intercepted global radiation
+                'An': g.node(vid_collar).FluxC,
+                'E': g.node(vid_collar).Flux * time_conv * 1000.,  # Plant total transpiration
+                'Tleaf': np.median(list(g.property('Tlc').values())),  # Median leaf temperature
+                'psi_soil': psi_soil,
+                'iterations': iterations}
+
+            # Summary of the time step (medians are only computed when they are reported)
+            if logger.isEnabledFor(logging.INFO):
+                logger.info('---------------------------')
+                logger.info('psi_soil %s', round(psi_soil, 4))
+                logger.info('psi_collar %s', round(g.node(3).psi_head, 4))
+                logger.info('psi_leaf %s',
+                            round(np.median([g.node(vid).psi_head for vid in list(g.property('gs').keys())]), 4))
+                logger.info('')
+                # logger.info('Rdiff/Rglob %s', RdRsH_ratio)
+                # logger.info('t_sky_eff %s', t_sky_eff)
+                logger.info('gs %s', np.median(list(g.property('gs').values())))
+                logger.info('flux H2O %s', round(g.node(vid_collar).Flux * 1000. * time_conv, 4))
+                logger.info('flux C2O %s', round(g.node(vid_collar).FluxC, 4))
+                logger.info('Tleaf %s Tair %s',
+                            round(np.median([g.node(vid).Tlc for vid in list(g.property('gs').keys())]), 2),
+                            round(imeteo.Tac[0], 4))
+                logger.info('')
+                logger.info('=' * 72)
+
+            if checkpoint_interval:
+                history.append(dict(record))
+                if (step + 1) % checkpoint_interval == 0 or step + 1 == len(meteo.time):
+                    if results_store is not None:
+                        results_store.flush()
+                    write_checkpoint(checkpoint_path, {
+                        'dates': list(meteo.time),
+                        'step': step + 1,
+                        'psi_soil': psi_soil,
+                        'mtg_date': g.date,
+                        'properties': {prop_name: g.property(prop_name) for prop_name in g.property_names()
+                                       if prop_name != 'geometry'},
+                        'history': history,
+                        'warm_start': warm_start})
+
+            record['timings'] = dict(timer.durations, total=perf_counter() - step_time_on)
+            record['leaf_vids'] = leaf_vids
+            record['leaf_properties'] = {prop_name: np.array([g.property(prop_name)[vid] for vid in leaf_vids])
+                                         for prop_name in leaf_properties}
+
+            yield record
+
+        # End time loop +++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+        if warm_start is not None:
+            for loop, savings in warm_start.savings().items():
+                logger.info('Warm start, %s iterations: mean %s over %d cold steps, %s over %d warm steps, %s saved',
+                            loop, savings['cold'], savings['cold_steps'], savings['warm'], savings['warm_steps'],
+                            savings['saved'])
+
+        if direction_bins is not None:
+            report = irradiance_responses.binning_report()
+            logger.info('Light direction binning: %d responses for %d directions (%d binned), '
+                        'deviation max %.2f° mean %.2f°, absorbed irradiance error max %s mean %s',
+                        report['responses'], report['directions'], report['binned'], report['max_deviation'],
+                        report['mean_deviation'], report['max_error'], report['mean_error'])
+    finally:
+        if results_store is not None:
+            results_store.close()
+        if irradiance_pipeline is not None:
+            irradiance_pipeline.close()
+
+
+def write_checkpoint(file_path, checkpoint):
+    """Writes atomically a simulation checkpoint to a pickle file.
+
+    Args:
+        file_path (str): path to the checkpoint file
+        checkpoint (dict): simulation state to be saved
+
+    Notes:
+        The checkpoint is first written to a temporary file which then replaces :arg:`file_path`, so that an
+            interrupted writing never corrupts the previous checkpoint.
 
-    # Results DataFrame
-    results_df = DataFrame(results_dict, index=meteo.time)
+    """
+    tmp_path = file_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        dump(checkpoint, f, protocol=HIGHEST_PROTOCOL)
+        f.flush()
+        fsync(f.fileno())
+    replace(tmp_path, file_path)
 
-    # Write
-    if write_result:
-        results_df.to_csv(output_path + 'time_series.output',
-                      sep=';', decimal='.')
 
-    time_off = datetime.now()
+def read_checkpoint(file_path):
+    """Reads a simulation checkpoint written by :func:`write_checkpoint`.
 
-    print ("")
-    print(("beg time", time_on))
-    print(("end time", time_off))
-    print ("--- Total runtime: %d minute(s) ---" %
-           int((time_off - time_on).seconds / 60.))
+    Args:
+        file_path (str): path to the checkpoint file
 
-    return results_df
+    Returns:
+        (dict): the saved simulation state
+
+    """
+    with open(file_path, 'rb') as f:
+        return load(f)
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar output store of HydroShoot.
+
+This module writes the per-vertex time series of multiscale tree graph (MTG) properties (e.g. `psi_head`, `Tlc`,
+`An`, `gs`, `E`, `Ei`, `Eabs`) to a folder of compressed numpy chunks, each chunk holding a (time x vertex) array per
+property. Results can then be read back for given properties, periods or vertices without unpickling whole MTGs.
+"""
+
+from os import listdir, makedirs, remove, replace
+from os.path import join, exists
+
+from numpy import array, full, nan, isnan, concatenate, savez_compressed, load, datetime64, searchsorted
+from pandas import DataFrame, DatetimeIndex
+
+DEFAULT_PROPERTIES = ('psi_head', 'Tlc', 'An', 'gs', 'E', 'Ei', 'Eabs')
+
+
+class ColumnarWriter(object):
+    """Appends per-vertex time series of MTG properties to a columnar store.
+
+    Args:
+        path (str): path to the store folder (created if it does not exist)
+        vids (list): ids of the vertices to be stored, their order defines the columns of all arrays
+        properties (tuple): names of the MTG properties to be stored
+        chunk_size (int): number of time steps per chunk file
+        append (bool): if True, new time steps are written after those already in the store (e.g. when resuming a
+            simulation), otherwise (default) the time steps already in the store are removed
+
+    Notes:
+        Vertices that do not carry a given property are given `nan` values.
+        Each chunk file is written atomically, the rows of the last (incomplete) chunk are written on :meth:`close`.
+
+    """
+
+    def __init__(self, path, vids, properties=DEFAULT_PROPERTIES, chunk_size=24, append=False):
+        if not exists(path):
+            makedirs(path)
+        elif not append:
+            for chunk in _chunk_files(path):
+                remove(join(path, chunk))
+
+        self.path = path
+        self.vids = list(vids)
+        self.properties = tuple(properties)
+        self.chunk_size = chunk_size
+
+        self._chunk_id = len(_chunk_files(path))
+        self._times = []
+        self._rows = {name: [] for name in self.properties}
+
+        _write_npz(join(path, 'index.npz'), vids=array(self.vids), properties=array(self.properties))
+
+    def append(self, g, date):
+        """Adds the current values of the stored properties of the MTG.
+
+        Args:
+            g: a multiscale tree graph object
+            date (datetime): date of the time step
+
+        """
+        self._times.append(datetime64(date, 's'))
+        for name in self.properties:
+            prop = g.property(name)
+            self._rows[name].append([_to_float(prop.get(vid)) for vid in self.vids])
+
+        if len(self._times) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Writes the pending time steps to a new chunk file."""
+        if not self._times:
+            return
+
+        arrays = {name: array(rows, dtype=float) for name, rows in self._rows.items()}
+        _write_npz(join(self.path, 'chunk_%05d.npz' % self._chunk_id), time=array(self._times), **arrays)
+
+        self._chunk_id += 1
+        self._times = []
+        self._rows = {name: [] for name in self.properties}
+
+    def truncate(self, date):
+        """Removes the stored time steps posterior to a given date (e.g. when resuming a simulation).
+
+        Args:
+            date (datetime): last time step to be kept
+
+        """
+        self.flush()
+        date = datetime64(date, 's')
+        for chunk in _chunk_files(self.path):
+            chunk_path = join(self.path, chunk)
+            with load(chunk_path) as data:
+                arrays = {key: data[key] for key in data.files}
+            last = searchsorted(arrays['time'], date, side='right')
+            if last == 0:
+                remove(chunk_path)
+            elif last < len(arrays['time']):
+                _write_npz(chunk_path, **{key: value[:last] for key, value in arrays.items()})
+        self._chunk_id = len(_chunk_files(self.path))
+
+    def close(self):
+        """Writes the remaining time steps."""
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ColumnarReader(object):
+    """Reads per-vertex time series from a store written by :class:`ColumnarWriter`.
+
+    Args:
+        path (str): path to the store folder
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with load(join(path, 'index.npz')) as index:
+            self.vids = index['vids'].tolist()
+            self.properties = tuple(index['properties'].tolist())
+        self._columns = {vid: column for column, vid in enumerate(self.vids)}
+
+        self._chunks = _chunk_files(path)
+        self._chunk_times = []
+        for chunk in self._chunks:
+            with load(join(path, chunk)) as data:
+                self._chunk_times.append(data['time'])
+
+    @property
+    def times(self):
+        """(pandas.DatetimeIndex): time steps of the store"""
+        if not self._chunk_times:
+            return DatetimeIndex([])
+        return DatetimeIndex(concatenate(self._chunk_times))
+
+    def read(self, name, start=None, end=None, vids=None):
+        """Reads the time series of a property.
+
+        Args:
+            name (str): name of the property
+            start (datetime): first time step to be read, if `None` (default) reading starts at the first time step
+            end (datetime): last time step to be read (included), if `None` (default) reading ends at the last
+                time step
+            vids (list): ids of the vertices to be read, if `None` (default) all vertices are read
+
+        Returns:
+            (pandas.DataFrame): property values indexed by time (rows) and vertex id (columns)
+
+        Notes:
+            Only the chunks overlapping the requested period are loaded.
+
+        """
+        if name not in self.properties:
+            raise KeyError("'%s' is not stored, available properties are %s." % (name, self.properties))
+
+        columns = slice(None) if vids is None else [self._columns[vid] for vid in vids]
+        start = None if start is None else datetime64(start, 's')
+        end = None if end is None else datetime64(end, 's')
+
+        times, values = [], []
+        for chunk, chunk_times in zip(self._chunks, self._chunk_times):
+            if (start is not None and chunk_times[-1] < start) or (end is not None and chunk_times[0] > end):
+                continue
+            first = 0 if start is None else searchsorted(chunk_times, start, side='left')
+            last = len(chunk_times) if end is None else searchsorted(chunk_times, end, side='right')
+            with load(join(self.path, chunk)) as data:
+                values.append(data[name][first:last, columns])
+            times.append(chunk_times[first:last])
+
+        nb_vids = len(self.vids) if vids is None else len(vids)
+        return DataFrame(concatenate(values) if values else full((0, nb_vids), nan),
+                         index=DatetimeIndex(concatenate(times) if times else []),
+                         columns=self.vids if vids is None else list(vids))
+
+    def snapshot(self, name, date):
+        """Returns the values of a property at a given time step.
+
+        Args:
+            name (str): name of the property
+            date (datetime): time step
+
+        Returns:
+            (dict): property values with vertex ids as keys, vertices having no value are omitted
+
+        """
+        series = self.read(name, start=date, end=date)
+        if series.empty:
+            raise KeyError("No time step '%s' in the store." % date)
+        return {vid: value for vid, value in series.iloc[0].items() if not isnan(value)}
+
+
+def _chunk_files(path):
+    return sorted(f for f in listdir(path) if f.startswith('chunk_') and f.endswith('.npz'))
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return nan
+
+
+def _write_npz(file_path, **arrays):
+    tmp_path = file_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        savez_compressed(f, **arrays)
+    replace(tmp_path, file_path)
@@ -66,6 +66,7 @@ class Simulation:
         self.energy_budget = simulation_dict['energy_budget']
         self.soil_water_deficit = simulation_dict['soil_water_deficit']
         self.meteo = simulation_dict['meteo']
+        self.cache_dir = simulation_dict.get('cache_dir', None)
 
 
 class Phenology:
@@ -91,6 +92,9 @@ class NumericalResolution:
         self.psi_error_threshold = numerical_resolution_dict['psi_error_threshold']
         self.t_step = numerical_resolution_dict['t_step']
         self.t_error_crit = numerical_resolution_dict['t_error_crit']
+        self.hydraulic_solver = numerical_resolution_dict.get('hydraulic_solver', 'relaxation')
+        self.night_fast_path = numerical_resolution_dict.get('night_fast_path', True)
+        self.warm_start = numerical_resolution_dict.get('warm_start', 'none')
 
 
 class Irradiance:
@@ -103,6 +107,10 @@ class Irradiance:
         self.turtle_format = irradiance_dict['turtle_format']
         self.turtle_sectors = irradiance_dict['turtle_sectors']
         self.icosphere_level = irradiance_dict['icosphere_level']
+        self.precompute_responses = irradiance_dict.get('precompute_responses', False)
+        self.cache_size = irradiance_dict.get('cache_size', 100.)
+        self.sun_bins_level = irradiance_dict.get('sun_bins_level', None)
+        self.sun_bins_tolerance = irradiance_dict.get('sun_bins_tolerance', 1.)
 
 
 class Energy:
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Irradiance pipeline of HydroShoot.
+
+The irradiance absorbed by the plant at a given time step only depends on meteorological data and on the (static)
+geometry of the plant, not on its physiological state. This module hence computes the irradiance of upcoming time
+steps in a pool of worker processes, while the main process solves the gas-exchange, hydraulic and energy budgets of
+the current time step.
+"""
+
+from multiprocessing import get_context
+
+from hydroshoot import irradiance
+from hydroshoot.stages import forked_workers_allowed
+
+_shared = None
+
+
+class IrradiancePipeline(object):
+    """Computes the irradiance of the time steps of a simulation ahead of their use.
+
+    Args:
+        light_scene (LightScene): the Caribu scene of the plant (see :class:`hydroshoot.irradiance.LightScene`)
+        meteo (DataFrame): meteo data of the simulation period
+            (see :func:`hydroshoot.irradiance.irradiance_distribution`)
+        solar (DataFrame): the rows of :func:`hydroshoot.irradiance.solar_sources` matching those of :arg:`meteo`
+        steps (list): positions in :arg:`meteo` of the time steps to be computed, in the order they are requested
+        processes (int): number of worker processes
+        lookahead (int): maximum number of time steps computed ahead of the requested one, twice the number of
+            worker processes if `None` (default)
+        distribution_args: keyword arguments passed to :func:`hydroshoot.irradiance.irradiance_distribution`
+            (e.g. 'geo_location', 'irradiance_unit', 'time_zone', 'turtle_sectors', 'turtle_format',
+            'rotation_angle')
+
+    Notes:
+        Workers are forked, so that the light scene is inherited rather than pickled (Caribu scenes cannot be
+            pickled), the pipeline can hence not be used where processes cannot be forked (see
+            :func:`hydroshoot.stages.forked_workers_allowed`).
+        Irradiance is identical to that computed in the main process, time steps are only computed earlier.
+
+    """
+
+    def __init__(self, light_scene, meteo, solar, steps, processes=2, lookahead=None, **distribution_args):
+        if not forked_workers_allowed():
+            raise RuntimeError('Irradiance workers can only be forked from a non-daemonic process, on platforms '
+                               'supporting the fork start method.')
+
+        self.steps = list(steps)
+        self.lookahead = 2 * processes if lookahead is None else lookahead
+
+        self._positions = {step: position for position, step in enumerate(self.steps)}
+        self._next = 0
+        self._pending = {}
+
+        self._pool = get_context('fork').Pool(processes, initializer=_init_worker,
+                                              initargs=(light_scene, meteo, solar, distribution_args))
+
+    def get(self, step):
+        """Returns the irradiance of a time step, and submits the computation of the following ones.
+
+        Args:
+            step (int): position of the time step in the meteo data, one of :attr:`steps`
+
+        Returns:
+            (float): [-] diffuse-to-total irradiance ratio
+            (dict): [umol m-2 s-1] incident irradiance (`Ei`) of the scene elements given as the dictionary keys
+            (dict): [umol m-2 s-1] absorbed irradiance (`Eabs`) of the scene elements given as the dictionary keys
+
+        """
+        last = min(self._positions[step] + self.lookahead, len(self.steps) - 1)
+        while self._next <= last:
+            next_step = self.steps[self._next]
+            self._pending[next_step] = self._pool.apply_async(_step_irradiance, (next_step,))
+            self._next += 1
+
+        return self._pending.pop(step).get()
+
+    def close(self):
+        """Stops the worker processes, discarding the time steps computed but not requested."""
+        self._pool.terminate()
+        self._pool.join()
+        self._pending = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _init_worker(light_scene, meteo, solar, distribution_args):
+    global _shared
+    _shared = light_scene, meteo, solar, distribution_args
+
+
+def _step_irradiance(step):
+    light_scene, meteo, solar, distribution_args = _shared
+    source, diffuse_ratio = irradiance.irradiance_distribution(meteo.iloc[[step]], solar=solar.iloc[[step]],
+                                                               **distribution_args)
+    ei, eabs = light_scene.irradiance(source)
+    return diffuse_ratio, ei, eabs
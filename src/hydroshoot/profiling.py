@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Profiling tools of HydroShoot.
+
+This module measures the wall time spent in the computation phases of each time step (irradiance, gas-exchange,
+hydraulic and energy calculations) and gathers it, together with the iteration counts and final errors of the
+solver, into tables that can be compared between runs.
+"""
+
+from contextlib import contextmanager
+from time import perf_counter
+
+from pandas import DataFrame
+
+PHASES = ('irradiance_distribution', 'hsCaribu', 'gas_exchange_rates', 'hydraulic_prop', 'xylem_water_potential',
+          'leaf_temperature')
+
+
+class PhaseTimer(object):
+    """Accumulates the wall time spent in named computation phases.
+
+    Notes:
+        Phases may be entered several times (e.g. at each iteration of the solver), their durations are then summed.
+
+    """
+
+    def __init__(self):
+        self.durations = {}
+        self.calls = {}
+
+    @contextmanager
+    def phase(self, name):
+        """Times the enclosed block of code.
+
+        Args:
+            name (str): name of the phase
+
+        """
+        time_on = perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[name] = self.durations.get(name, 0.) + perf_counter() - time_on
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def reset(self):
+        """Clears all durations."""
+        self.durations = {}
+        self.calls = {}
+
+
+def profile_table(records):
+    """Gathers the timings and solver statistics of time step records into a table.
+
+    Args:
+        records (iterable): time step records, as yielded by :func:`hydroshoot.model.iter_run`
+
+    Returns:
+        (pandas.DataFrame): indexed by time step, with the following columns:
+            - one per phase of :data:`PHASES` (and any other timed phase): [s] wall time spent in the phase
+            - 'total': [s] wall time of the whole time step
+            - 'iter_temperature', 'iter_hydraulic' and 'iter_xylem': the numbers of iterations of the solver (see
+                :func:`hydroshoot.solver.solve_interactions`)
+            - 't_error' and 'psi_error': the final errors of the leaf temperature and hydraulic loops
+            - 'warm_start': whether the solver was initialized from the solutions of previous time steps
+
+    Notes:
+        Records without timings (e.g. those restored from a checkpoint) are skipped.
+
+    """
+    rows, dates = [], []
+    for record in records:
+        if 'timings' not in record:
+            continue
+        row = dict(record['timings'])
+        for name, value in record['iterations'].items():
+            row['iter_' + name if name in ('temperature', 'hydraulic', 'xylem') else name] = value
+        rows.append(row)
+        dates.append(record['date'])
+
+    table = DataFrame(rows, index=dates)
+    table.index.name = 'time'
+
+    phases = [name for name in PHASES if name in table.columns]
+    others = sorted(name for name in table.columns if name not in phases and name != 'total')
+    return table.reindex(columns=phases + (['total'] if 'total' in table.columns else []) + others)
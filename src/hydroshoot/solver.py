@@ -1,12 +1,19 @@
 from __future__ import print_function
 from builtins import range
-from copy import deepcopy
-import openalea.mtg.traversal as traversal
+import logging
+from numpy import array, mean, minimum, nan, where
 from hydroshoot import hydraulic, exchange, energy
+from hydroshoot.state import ShootState
+from hydroshoot.profiling import PhaseTimer
+
+logger = logging.getLogger(__name__)
+
+LOOPS = ('temperature', 'hydraulic', 'xylem')
 
 
 def solve_interactions(g, meteo, psi_soil, t_soil, t_sky_eff, vid_collar, vid_base,
-                       length_conv, time_conv, rhyzo_total_volume, params, form_factors, simplified_form_factors):
+                       length_conv, time_conv, rhyzo_total_volume, params, form_factors, simplified_form_factors,
+                       hydraulic_tree=None, is_dark=False, warm_start=None, timer=None):
     """Computes gas-exchange, energy and hydraulic structure of plant's shoot jointly.
 
     Args:
@@ -21,6 +28,34 @@ def solve_interactions(g, meteo, psi_soil, t_soil, t_sky_eff, vid_collar, vid_ba
         time_conv (float): [-] conversion factor from meteo data time step to seconds
         rhyzo_total_volume (float): [m3] volume of the soil occupied with roots
         params (params): [-] :class:`hydroshoot.params.Params()` object
+        hydraulic_tree (HydraulicTree): compiled hydraulic structure of the shoot, see
+            :class:`hydroshoot.hydraulic.HydraulicTree`, it is built from :arg:`g` if not provided
+        is_dark (bool): `True` for night-time or zero-irradiance time steps
+        warm_start (WarmStart): if provided, xylem water potential and leaf temperature are initialized from the
+            solutions of the previous time steps (see :class:`WarmStart`), which is then updated with the solution of
+            the current time step; otherwise they are initialized to soil water potential and air temperature
+        timer (PhaseTimer): if provided, the wall time spent in gas-exchange, hydraulic and energy calculations is
+            added to it (see :class:`hydroshoot.profiling.PhaseTimer`)
+
+    Returns:
+        (dict): the number of iterations of the leaf temperature loop ('temperature'), of the hydraulic loop, summed
+            over all temperature iterations ('hydraulic'), and of the xylem water potential solver, summed over all
+            hydraulic iterations ('xylem'), the final errors of the leaf temperature ('t_error') and hydraulic
+            ('psi_error') loops (`None` for loops that are not run), and whether the solver was initialized from
+            the guesses of :arg:`warm_start` ('warm_start')
+
+    Notes:
+        Mtg properties are read once per time step into the arrays of a :class:`hydroshoot.state.ShootState`, on
+            which gas-exchange, hydraulic and energy calculations iterate; the solution (leaf 'An', 'Ci', 'gs', 'gb',
+            'E', 'u' and 'Tlc', and 'psi_head', 'KL', 'Flux', 'FluxC' and 'Kmax' of the hydraulic structure) is
+            written back to the mtg once the time step is solved.
+        In the dark, net assimilation reduces to mitochondrial respiration and stomatal conductance to its residual
+            value whatever the leaf water potential is, so that transpiration, hence sap flux, no longer depends on
+            xylem water potential. If `params.numerical_resolution.night_fast_path` is `True` (default), gas-exchange
+            rates of dark time steps are then computed in closed form (see
+            :func:`hydroshoot.exchange.leaf_dark_exchange_rates`) and xylem water potential is solved only once per
+            leaf temperature iteration, without relaxing the hydraulic loop. Leaf temperature then results from the
+            longwave, sensible and latent heat balance of the leaves only, shortwave irradiance being null.
 
     """
     unit_scene_length = params.simulation.unit_scene_length
@@ -55,6 +90,8 @@ def solve_interactions(g, meteo, psi_soil, t_soil, t_sky_eff, vid_collar, vid_ba
     max_iter = params.numerical_resolution.max_iter
     psi_error_threshold = params.numerical_resolution.psi_error_threshold
     temp_error_threshold = params.numerical_resolution.t_error_crit
+    hydraulic_solver = params.numerical_resolution.hydraulic_solver
+    night_path = is_dark and params.numerical_resolution.night_fast_path
 
     modelx, psi_critx, slopex = [xylem_k_cavitation[ikey] for ikey in ('model', 'fifty_cent', 'sig_slope')]
 
@@ -64,74 +101,127 @@ def solve_interactions(g, meteo, psi_soil, t_soil, t_sky_eff, vid_collar, vid_ba
         par_gs['model'] = 'vpd'
         negligible_shoot_resistance = True
 
-        print("par_gs: 'model' is forced to 'vpd'")
-        print("negligible_shoot_resistance is forced to True.")
+        logger.info("par_gs: 'model' is forced to 'vpd'")
+        logger.info("negligible_shoot_resistance is forced to True.")
+
+    if hydraulic_tree is None:
+        hydraulic_tree = hydraulic.HydraulicTree(g, vid_base, length_conv)
+    tree = hydraulic_tree
+
+    # Array-backed state of the hydraulic segments (leaves included), written to the mtg once the time step is solved
+    state = ShootState(tree.vids)
+    leaves = energy.get_leaves(g, leaf_lbl_prefix)
+    leaf_rows = state.rows(leaves)
+    collar_row = tree.index[vid_collar]
+    collar_ancestor_rows = state.rows([vid for vid in g.Ancestors(vid_collar) if vid in state.index])
+
+    # Inputs that are constant over the time step
+    air_temperature, hs, u, c_a, atm_press = [meteo.iloc[0][x] for x in ('Tac', 'hs', 'u', 'Ca', 'Pa')]
+    ppfd, leaf_nitrogen, leaf_length = [tree.values(g, name)[leaf_rows] for name in (irradiance_type2, 'Na', 'Length')]
+
+    def leaf_gas_exchange(leaf_temperature, leaf_psi):
+        # Gas-exchange rates (An, Ci, gs, gb, E) of the leaves
+        if night_path:
+            return exchange.leaf_dark_exchange_rates(leaf_temperature, leaf_psi, leaf_nitrogen, leaf_length,
+                                                     air_temperature, hs, u, c_a, atm_press, par_photo, par_photo_n,
+                                                     par_gs, rbt)
+        return exchange.leaf_gas_exchange_rates(leaf_temperature, ppfd, leaf_psi, leaf_nitrogen, leaf_length,
+                                                air_temperature, hs, u, c_a, atm_press, par_photo, par_photo_n,
+                                                par_gs, rbt)
+    k_max = tree.conductivity_max(xylem_k_max['a'], xylem_k_max['b'], xylem_k_max['min_kmax'])
+    segment_k_max = where(tree.is_segment, k_max, nan)
+
+    if energy_budget:
+        leaves_length = energy.get_leaves_length(g, leaf_lbl_prefix=leaf_lbl_prefix,
+                                                 unit_scene_length=unit_scene_length)
+        leaf_wind_speed = energy.leaf_wind_as_air_wind(g, meteo, leaf_lbl_prefix)
+        gbH = energy.heat_boundary_layer_conductance(leaves_length, leaf_wind_speed)
+        if solo:
+            shortwave_abs, longwave_sky_soil, ff_leaves, gb_h = energy.leaf_energy_inputs(
+                leaves, t_soil, t_sky_eff, form_factors, gbH, g.property('Ei'), simplified_form_factors)
+
+    initial_guess = None if warm_start is None else warm_start.guess(psi_soil, air_temperature)
+
+    if initial_guess is None:
+        # Initialize all xylem potential values to soil water potential
+        state['psi_head'] = psi_soil
+
+        # Initialize leaf  temperature to air temperature
+        state['Tlc'] = air_temperature
+    else:
+        psi_guess, t_guess = initial_guess
+        state['psi_head'] = psi_guess
+        state['Tlc'] = air_temperature
+        state['Tlc'][leaf_rows] = t_guess
+
+    for name in ('An', 'Ci', 'gs', 'gb', 'E'):
+        state[name] = nan
+    k_act = None
 
-    # Initialize all xylem potential values to soil water potential
-    for vtx_id in traversal.pre_order2(g, vid_base):
-        g.node(vtx_id).psi_head = psi_soil
+    if timer is None:
+        timer = PhaseTimer()
+
+    iterations = {'temperature': 0, 'hydraulic': 0, 'xylem': 0, 't_error': None, 'psi_error': None,
+                  'warm_start': initial_guess is not None}
 
     # Temperature loop +++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
     t_error_trace = []
     it_step = temp_step
 
-    # Initialize leaf  temperature to air temperature
-    g.properties()['Tlc'] = energy.leaf_temperature_as_air_temperature(g, meteo, leaf_lbl_prefix)
-
     for it in range(max_iter):
-        t_prev = deepcopy(g.property('Tlc'))
+        iterations['temperature'] += 1
+        t_prev = state['Tlc'][leaf_rows]
 
         # Hydraulic loop +++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
         if hydraulic_structure:
             psi_error_trace = []
             ipsi_step = psi_step
             for ipsi in range(max_iter):
-                psi_prev = deepcopy(g.property('psi_head'))
+                iterations['hydraulic'] += 1
+                psi_prev = state['psi_head'].copy()
 
                 # Compute gas-exchange fluxes. Leaf T and Psi are from prev calc loop
-                exchange.gas_exchange_rates(g, par_photo, par_photo_n, par_gs,
-                                            meteo, irradiance_type2, leaf_lbl_prefix, rbt)
+                with timer.phase('gas_exchange_rates'):
+                    for name, values in zip(('An', 'Ci', 'gs', 'gb', 'E'),
+                                            leaf_gas_exchange(t_prev, psi_prev[leaf_rows])):
+                        state[name][leaf_rows] = values
 
                 # Compute sap flow and hydraulic properties
-                hydraulic.hydraulic_prop(g, mass_conv=mass_conv, length_conv=length_conv,
-                                         a=xylem_k_max['a'], b=xylem_k_max['b'], min_kmax=xylem_k_max['min_kmax'])
+                with timer.phase('hydraulic_prop'):
+                    flux, flux_c = tree.fluxes(state['E'][tree.leaves], state['An'][tree.leaves], mass_conv)
 
                 # Update soil water status
-                psi_collar = hydraulic.soil_water_potential(psi_soil, g.node(vid_collar).Flux * time_conv,
+                psi_collar = hydraulic.soil_water_potential(psi_soil, flux[collar_row] * time_conv,
                                                             soil_class, rhyzo_total_volume, psi_min)
 
                 if soil_water_deficit:
                     psi_collar = max(-1.3, psi_collar)
                 else:
                     psi_collar = max(-0.7, psi_collar)
-
-                    for vid in g.Ancestors(vid_collar):
-                        g.node(vid).psi_head = psi_collar
+                    state['psi_head'][collar_ancestor_rows] = psi_collar
 
                 # Compute xylem water potential
-                n_iter_psi = hydraulic.xylem_water_potential(g, psi_soil=psi_collar, model=modelx, psi_min=psi_min,
-                                                             psi_error_crit=psi_error_threshold, max_iter=max_iter,
-                                                             length_conv=length_conv, fifty_cent=psi_critx,
-                                                             sig_slope=slopex, dist_roots=dist_roots,
-                                                             rad_roots=rad_roots,
-                                                             negligible_shoot_resistance=negligible_shoot_resistance,
-                                                             start_vid=vid_collar, stop_vid=None, psi_step=psi_step)
+                with timer.phase('xylem_water_potential'):
+                    psi_new, k_act, n_iter_psi = tree.solve_water_potential(
+                        state['psi_head'], flux, segment_k_max, psi_soil=psi_collar, model=modelx, psi_min=psi_min,
+                        psi_error_crit=psi_error_threshold, max_iter=max_iter, fifty_cent=psi_critx,
+                        sig_slope=slopex, dist_roots=dist_roots, rad_roots=rad_roots,
+                        negligible_shoot_resistance=negligible_shoot_resistance, start_vid=vid_collar, stop_vid=None,
+                        psi_step=psi_step, solver=hydraulic_solver)
 
-                psi_new = g.property('psi_head')
+                state['psi_head'] = psi_new
+                iterations['xylem'] += n_iter_psi
 
                 # Evaluate xylem conversion criterion
-                psi_error_dict = {}
-                for vtx_id in list(g.property('psi_head').keys()):
-                    psi_error_dict[vtx_id] = abs(psi_prev[vtx_id] - psi_new[vtx_id])
-
-                psi_error = max(psi_error_dict.values())
+                psi_error = abs(psi_prev - psi_new).max()
                 psi_error_trace.append(psi_error)
+                iterations['psi_error'] = float(psi_error)
 
-                print('psi_error = ', round(psi_error,
-                                            3), ':: Nb_iter = %d' % n_iter_psi, 'ipsi_step = %f' % ipsi_step)
+                logger.debug('psi_error = %s :: Nb_iter = %d ipsi_step = %f', round(psi_error, 3), n_iter_psi,
+                             ipsi_step)
 
                 # Manage temperature step to ensure convergence
-                if psi_error < psi_error_threshold:
+                if psi_error < psi_error_threshold or night_path:
                     break
                 else:
                     try:
@@ -140,51 +230,46 @@ def solve_interactions(g, meteo, psi_soil, t_soil, t_sky_eff, vid_collar, vid_ba
                     except IndexError:
                         pass
 
-                    psi_new_dict = {}
-                    for vtx_id in list(psi_new.keys()):
-                        psix = psi_prev[vtx_id] + ipsi_step * (psi_new[vtx_id] - psi_prev[vtx_id])
-                        psi_new_dict[vtx_id] = psix
-
-                    g.properties()['psi_head'] = psi_new_dict
+                    state['psi_head'] = psi_prev + ipsi_step * (psi_new - psi_prev)
 
         else:
             # Compute gas-exchange fluxes. Leaf T and Psi are from prev calc loop
-            exchange.gas_exchange_rates(g, par_photo, par_photo_n, par_gs,
-                                        meteo, irradiance_type2, leaf_lbl_prefix, rbt)
+            with timer.phase('gas_exchange_rates'):
+                for name, values in zip(('An', 'Ci', 'gs', 'gb', 'E'),
+                                        leaf_gas_exchange(t_prev, state['psi_head'][leaf_rows])):
+                    state[name][leaf_rows] = values
 
             # Compute sap flow and hydraulic properties
-            hydraulic.hydraulic_prop(g, mass_conv=mass_conv, length_conv=length_conv,
-                                     a=xylem_k_max['a'], b=xylem_k_max['b'], min_kmax=xylem_k_max['min_kmax'])
+            with timer.phase('hydraulic_prop'):
+                flux, flux_c = tree.fluxes(state['E'][tree.leaves], state['An'][tree.leaves], mass_conv)
 
         # End Hydraulic loop +++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
         # Compute leaf temperature
         if energy_budget:
-            leaves_length = energy.get_leaves_length(g, leaf_lbl_prefix=leaf_lbl_prefix, unit_scene_length=unit_scene_length)
-            leaf_wind_speed = energy.leaf_wind_as_air_wind(g, meteo, leaf_lbl_prefix)
-            gbH = energy.heat_boundary_layer_conductance(leaves_length, leaf_wind_speed)
-            t_init = g.property('Tlc')
-            ev = g.property('E')
-            ei = g.property('Ei')
-            g.properties()['Tlc'], t_iter = energy.leaf_temperature(g, meteo, t_soil, t_sky_eff, t_init=t_init,
-                                                                    form_factors=form_factors, gbh=gbH, ev=ev, ei=ei,
-                                                                    solo=solo, ff_type=simplified_form_factors,
-                                                                    leaf_lbl_prefix=leaf_lbl_prefix, max_iter=max_iter,
-                                                                    t_error_crit=temp_error_threshold, t_step=temp_step)
-
-
-            # t_iter_list.append(t_iter)
-            t_new = deepcopy(g.property('Tlc'))
+            with timer.phase('leaf_temperature'):
+                if solo:
+                    t_new, t_iter = energy.solve_leaf_temperature(
+                        t_prev, shortwave_abs, longwave_sky_soil, ff_leaves, state['E'][leaf_rows], gb_h,
+                        air_temperature, simplified_form_factors, max_iter, temp_error_threshold, temp_step)
+                else:
+                    t_leaves, t_iter = energy.leaf_temperature(
+                        g, meteo, t_soil, t_sky_eff, t_init=dict(zip(leaves, t_prev.tolist())),
+                        form_factors=form_factors, gbh=gbH, ev=dict(zip(leaves, state['E'][leaf_rows].tolist())),
+                        ei=g.property('Ei'), solo=solo, ff_type=simplified_form_factors,
+                        leaf_lbl_prefix=leaf_lbl_prefix, max_iter=max_iter, t_error_crit=temp_error_threshold,
+                        t_step=temp_step)
+                    t_new = array([t_leaves[vid] for vid in leaves])
 
             # Evaluation of leaf temperature conversion creterion
-            error_dict = {vtx: abs(t_prev[vtx] - t_new[vtx]) for vtx in list(g.property('Tlc').keys())}
-
-            t_error = round(max(error_dict.values()), 3)
-            print('t_error = ', t_error, 'counter =', it, 't_iter = ', t_iter, 'it_step = ', it_step)
+            t_error = round(abs(t_prev - t_new).max(), 3)
+            logger.debug('t_error = %s counter = %s t_iter = %s it_step = %s', t_error, it, t_iter, it_step)
             t_error_trace.append(t_error)
+            iterations['t_error'] = float(t_error)
 
             # Manage temperature step to ensure convergence
             if t_error < temp_error_threshold:
+                state['Tlc'][leaf_rows] = t_new
                 break
             else:
                 assert (it <= max_iter), 'The energy budget solution did not converge.'
@@ -195,11 +280,118 @@ def solve_interactions(g, meteo, psi_soil, t_soil, t_sky_eff, vid_collar, vid_ba
                 except IndexError:
                     pass
 
-                t_new_dict = {}
-                for vtx_id in list(t_new.keys()):
-                    tx = t_prev[vtx_id] + it_step * (t_new[vtx_id] - t_prev[vtx_id])
-                    t_new_dict[vtx_id] = tx
-
-                g.properties()['Tlc'] = t_new_dict
+                state['Tlc'][leaf_rows] = t_prev + it_step * (t_new - t_prev)
 
     # End temperature loop +++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+    # Solution of the time step written to the mtg
+    g.properties().setdefault('u', {}).update((vid, u) for vid in leaves)
+    state.to_mtg(g, ['An', 'Ci', 'gs', 'gb', 'E', 'Tlc'], rows=leaf_rows)
+    hydraulic.set_hydraulic_prop(g, tree, flux, flux_c, k_max)
+    if k_act is None:
+        state.to_mtg(g, ['psi_head'])
+    else:
+        hydraulic.set_water_potential(g, tree, state['psi_head'], k_act, start_vid=vid_collar)
+
+    if warm_start is not None:
+        warm_start.update(state['psi_head'], psi_soil, state['Tlc'][leaf_rows], air_temperature)
+        warm_start.record(iterations)
+
+    return iterations
+
+
+class WarmStart(object):
+    """Initial guesses of :func:`solve_interactions` built from the solutions of previous time steps.
+
+    Args:
+        mode (str): one of 'previous', to start from the solution of the last time step, or 'extrapolated', to
+            linearly extrapolate the solutions of the last two time steps
+
+    Notes:
+        Xylem water potential and leaf temperature are stored as deviations from soil water potential and air
+            temperature, respectively, so that initial guesses follow the changes of these boundary conditions between
+            time steps.
+        Xylem water potential guesses are bounded by soil water potential.
+        The numbers of iterations of the time steps solved with and without initial guesses are recorded (see
+            :meth:`record`) so that the iterations saved by warm starts can be reported (see :meth:`savings`).
+
+    """
+
+    def __init__(self, mode='previous'):
+        if mode not in ('previous', 'extrapolated'):
+            raise ValueError("Warm start mode must be one of 'previous' or 'extrapolated', got '%s'." % mode)
+        self.mode = mode
+        self._psi_deviations = []
+        self._temperature_deviations = []
+        self.iterations = {'cold': [], 'warm': []}
+
+    def __len__(self):
+        return len(self._psi_deviations)
+
+    def guess(self, psi_soil, air_temperature):
+        """Returns the initial guesses of the solver.
+
+        Args:
+            psi_soil (float): [MPa] soil (root zone) water potential of the current time step
+            air_temperature (float): [°C] air temperature of the current time step
+
+        Returns:
+            (tuple): [MPa] xylem water potential of the hydraulic segments and [°C] temperature of the leaves, as
+                :class:`numpy.ndarray` ordered as in :func:`update`, or `None` if no time step has been solved yet
+
+        """
+        if len(self) == 0:
+            return None
+
+        psi_deviation, temperature_deviation = self._psi_deviations[-1], self._temperature_deviations[-1]
+        if self.mode == 'extrapolated' and len(self) == 2:
+            psi_deviation = 2. * psi_deviation - self._psi_deviations[0]
+            temperature_deviation = 2. * temperature_deviation - self._temperature_deviations[0]
+
+        return psi_soil + minimum(psi_deviation, 0.), air_temperature + temperature_deviation
+
+    def update(self, psi_head, psi_soil, leaf_temperature, air_temperature):
+        """Stores the solution of a time step.
+
+        Args:
+            psi_head (numpy.ndarray): [MPa] xylem water potential of the hydraulic segments
+            psi_soil (float): [MPa] soil (root zone) water potential
+            leaf_temperature (numpy.ndarray): [°C] temperature of the leaves
+            air_temperature (float): [°C] air temperature
+
+        """
+        self._psi_deviations = (self._psi_deviations + [psi_head - psi_soil])[-2:]
+        self._temperature_deviations = (self._temperature_deviations + [leaf_temperature - air_temperature])[-2:]
+
+    def record(self, iterations):
+        """Records the numbers of iterations of a solved time step.
+
+        Args:
+            iterations (dict): the iterations returned by :func:`solve_interactions`, whose 'warm_start' item tells
+                whether the time step was solved from initial guesses
+
+        """
+        self.iterations['warm' if iterations['warm_start'] else 'cold'].append(
+            {loop: iterations[loop] for loop in LOOPS})
+
+    def savings(self):
+        """Compares the numbers of iterations of the time steps solved with and without initial guesses.
+
+        Returns:
+            (dict): for each solver loop ('temperature', 'hydraulic' and 'xylem'), a dict of the number of time steps
+                solved without ('cold_steps') and with ('warm_steps') initial guesses, their mean numbers of
+                iterations ('cold' and 'warm', `None` if there is no such step) and the number of iterations saved
+                by warm steps compared to the mean of cold steps ('saved', `None` if either mean is undefined)
+
+        """
+        summary = {}
+        for loop in LOOPS:
+            counts = {mode: [step[loop] for step in self.iterations[mode]] for mode in ('cold', 'warm')}
+            means = {mode: float(mean(counts[mode])) if counts[mode] else None for mode in counts}
+            if None in means.values():
+                saved = None
+            else:
+                saved = (means['cold'] - means['warm']) * len(counts['warm'])
+            summary[loop] = {'cold_steps': len(counts['cold']), 'warm_steps': len(counts['warm']),
+                             'cold': means['cold'], 'warm': means['warm'], 'saved': saved}
+        return summary
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+Initialisation stages of HydroShoot.
+
+Before its first time step, a simulation runs several expensive computations which only depend on inputs known from
+the start, e.g. the form factors of the plant geometry, the irradiance over the 10 days preceding the simulation or
+the sun positions of the simulation period. This module runs such computations as stages in forked processes, which
+inherit the state of the main process at the time the stage is submitted, and reports the critical path of the
+initialisation.
+"""
+
+from contextlib import contextmanager
+from multiprocessing import get_context, get_all_start_methods, current_process
+from time import perf_counter
+
+from pandas import DataFrame
+
+COLUMNS = ['process', 'start', 'end', 'duration', 'wait', 'critical']
+
+
+class StageRunner(object):
+    """Runs independent initialisation stages concurrently and records their timings.
+
+    Args:
+        processes (int): maximum number of stages running at the same time in forked processes, if 0 (default) or if
+            processes cannot be forked (see :func:`forked_workers_allowed`), stages are run in the main process when
+            submitted
+
+    Notes:
+        A stage sees the state of the main process at the time it is submitted, changes made by the stage (e.g. to
+            MTG properties) are lost, only its returned value is sent back to the main process.
+
+    """
+
+    def __init__(self, processes=0):
+        self.processes = processes if forked_workers_allowed() else 0
+        self.origin = perf_counter()
+        self.stages = {}
+        self._running = {}
+        self._results = {}
+
+    def _record(self, name, process, start, end, received, wait=0.):
+        self.stages[name] = {'process': process, 'start': start - self.origin, 'end': end - self.origin,
+                             'received': received - self.origin, 'wait': wait}
+
+    @contextmanager
+    def stage(self, name):
+        """Times the enclosed block of code as a stage run in the main process.
+
+        Args:
+            name (str): name of the stage
+
+        """
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            end = perf_counter()
+            self._record(name, 'main', start, end, end)
+
+    def submit(self, name, func, *args, **kwargs):
+        """Starts a stage.
+
+        Args:
+            name (str): name of the stage, used to get its result (see :meth:`result`)
+            func (callable): the function run by the stage
+            args, kwargs: arguments of :arg:`func`, inherited rather than pickled by the forked process
+
+        Notes:
+            If :attr:`processes` stages are already running, the oldest one is waited for before the new one starts.
+
+        """
+        if self.processes == 0:
+            with self.stage(name):
+                self._results[name] = func(*args, **kwargs)
+            return
+
+        while len(self._running) >= self.processes:
+            self._collect(next(iter(self._running)))
+
+        context = get_context('fork')
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=_run_stage, args=(sender, func, args, kwargs), daemon=True)
+        process.start()
+        sender.close()
+        self._running[name] = process, receiver
+
+    def result(self, name):
+        """Returns the result of a stage, waiting for it if it is still running.
+
+        Args:
+            name (str): name of the stage
+
+        Returns:
+            the value returned by the function of the stage
+
+        """
+        if name in self._running:
+            self._collect(name)
+        return self._results.pop(name)
+
+    def _collect(self, name):
+        process, receiver = self._running.pop(name)
+        wait_on = perf_counter()
+        try:
+            status, value, start, end = receiver.recv()
+        except EOFError:
+            status, value = 'error', RuntimeError("Stage '%s' exited unexpectedly." % name)
+            start = end = wait_on
+        finally:
+            receiver.close()
+            process.join()
+
+        received = perf_counter()
+        self._record(name, 'worker', start, end, received, wait=received - wait_on)
+        if status == 'error':
+            raise value
+        self._results[name] = value
+
+    def close(self):
+        """Stops the stages still running, discarding their results."""
+        for process, receiver in self._running.values():
+            process.terminate()
+            process.join()
+            receiver.close()
+        self._running = {}
+
+    def report(self):
+        """Tabulates the timings of the stages and their critical path.
+
+        Returns:
+            (pandas.DataFrame): indexed by stage name, in the order the stages started, with the following columns:
+                - 'process': 'main' or 'worker'
+                - 'start', 'end' and 'duration': [s] times since the runner was created, and duration of the stage
+                - 'wait': [s] time spent by the main process waiting for the result of the stage
+                - 'critical': True for the stages of the critical path, i.e. the chain of stages, each depending on
+                    the previous one, which ends with the stage ending last
+
+        Notes:
+            Worker stages depend on the main stages which ended before their submission, main stages depend on the
+                previous main stage and on the worker stages whose results were received before they started. Time
+                spent in the main process outside of stages is not reported.
+
+        """
+        table = DataFrame.from_dict(self.stages, orient='index',
+                                    columns=['process', 'start', 'end', 'received', 'wait'])
+        table['duration'] = table.end - table.start
+        table['critical'] = False
+        table = table.sort_values('start')
+
+        # chain of stages leading to the one ending last
+        current = table.end.idxmax() if len(table) > 0 else None
+        while current is not None:
+            table.loc[current, 'critical'] = True
+            start = table.start[current]
+            before = (table.process == 'main') & (table.end <= start)
+            if table.process[current] == 'main':
+                before |= (table.process == 'worker') & (table.received <= start)
+            current = table.end[before].idxmax() if before.any() else None
+
+        return table[COLUMNS]
+
+
+def forked_workers_allowed():
+    """Tells whether worker processes can be forked from the current process.
+
+    Returns:
+        (bool): False if the platform does not support the 'fork' start method, or if the current process is
+            daemonic (e.g. a worker of :func:`hydroshoot.batch.run_batch`), daemonic processes not being allowed to
+            have children
+
+    """
+    return 'fork' in get_all_start_methods() and not current_process().daemon
+
+
+def _run_stage(connection, func, args, kwargs):
+    start = perf_counter()
+    try:
+        status, value = 'done', func(*args, **kwargs)
+    except Exception as err:
+        status, value = 'error', err
+    connection.send((status, value, start, perf_counter()))
+    connection.close()
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Array-backed state store of HydroShoot.
+
+This module holds the properties of the vertices of a multiscale tree graph (MTG) as contiguous arrays, indexed by a
+stable vertex-to-row mapping, so that iterative calculations avoid creating and copying property dictionaries.
+"""
+
+from numpy import array, full, nan
+
+
+class ShootState(object):
+    """Struct-of-arrays store of MTG vertex properties.
+
+    Args:
+        vids (iterable): ids of the vertices to be stored, their order defines the rows of all arrays
+
+    Notes:
+        Arrays are plain `numpy.float64` arrays which may be modified in place. Rows of vertices that do not carry a
+            given property are filled with `nan`.
+
+    """
+
+    def __init__(self, vids):
+        self.vids = list(vids)
+        self.index = {vid: row for row, vid in enumerate(self.vids)}
+        self.arrays = {}
+
+    def __len__(self):
+        return len(self.vids)
+
+    def __contains__(self, name):
+        return name in self.arrays
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def __setitem__(self, name, values):
+        values = array(values, dtype=float)
+        if values.ndim == 0:
+            values = full(len(self.vids), float(values))
+        assert values.shape == (len(self.vids),), "Arrays must have one value per stored vertex."
+        self.arrays[name] = values
+
+    def rows(self, vids):
+        """Returns the rows of the given vertices.
+
+        Args:
+            vids (iterable): ids of stored vertices
+
+        Returns:
+            (numpy.ndarray): the row indices of :arg:`vids`
+
+        """
+        return array([self.index[vid] for vid in vids], dtype=int)
+
+    def load(self, g, name, default=nan):
+        """Reads a property of the MTG into the store.
+
+        Args:
+            g: a multiscale tree graph object
+            name (str): name of the MTG property
+            default (float): value given to vertices that do not carry the property
+
+        Returns:
+            (numpy.ndarray): the array of the property values
+
+        """
+        prop = g.property(name)
+        self.arrays[name] = array([prop.get(vid, default) for vid in self.vids], dtype=float)
+        return self.arrays[name]
+
+    def to_mtg(self, g, names=None, rows=None):
+        """Writes stored arrays back to the MTG.
+
+        Args:
+            g: a multiscale tree graph object
+            names (list): names of the properties to write, if `None` (default) all stored arrays are written
+            rows (numpy.ndarray): rows of the vertices to be written, if `None` (default) all vertices are written
+
+        Returns:
+            the multiscale tree graph object
+
+        Notes:
+            Written properties replace the existing MTG properties, vertices that are not written are therefore
+                removed from the property dictionary.
+
+        """
+        if names is None:
+            names = list(self.arrays.keys())
+        vids = self.vids if rows is None else [self.vids[row] for row in rows]
+        for name in names:
+            values = self.arrays[name] if rows is None else self.arrays[name][rows]
+            g.properties()[name] = dict(zip(vids, values.tolist()))
+        return g
+
+    @classmethod
+    def from_mtg(cls, g, vids, names):
+        """Creates a store from MTG properties.
+
+        Args:
+            g: a multiscale tree graph object
+            vids (iterable): ids of the vertices to be stored
+            names (list): names of the MTG properties to be loaded
+
+        Returns:
+            (ShootState)
+
+        """
+        state = cls(vids)
+        for name in names:
+            state.load(g, name)
+        return state
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic canopies for HydroShoot.
+
+This module generates digitization tables of virtual vineyards, made of any number of plants, shoots per plant and
+leaves per shoot, in one of the training systems of the `example/virtual_canopies` folder ('vsp', 'gdc' or 'lyre').
+The tables follow the format read by :func:`hydroshoot.architecture.vine_mtg` and may hence be written to a
+'digit.input' file or turned directly into a plant mock-up (MTG) using the usual reconstruction functions of
+:mod:`hydroshoot.architecture`.
+"""
+
+from io import StringIO
+from math import ceil
+
+from numpy import array, cos, sin, sign, pi, radians, random
+from pandas import DataFrame
+
+from hydroshoot import architecture
+
+COLUMNS = ['Plant_Nb', 'Tronc', 'Elmnt', 'Sar', 'Rameau', 'Row', 'X', 'Y', 'Z']
+
+# Training systems, described by:
+#   - 'trunk_height' [cm]: height of the trunk
+#   - 'arms': the lateral offset [cm] of each arm and the direction of the row (+1 or -1) along which it extends
+#   - 'elevation' [deg]: the angles from the horizontal of the first and last internodes of shoots, shoots being
+#       oriented outwards of the row for arms having a lateral offset
+TRAINING_SYSTEMS = {
+    'vsp': {'trunk_height': 50., 'arms': ((0., 1.), (0., -1.)), 'elevation': (80., 80.)},
+    'gdc': {'trunk_height': 150., 'arms': ((60., 1.), (-60., 1.)), 'elevation': (30., -60.)},
+    'lyre': {'trunk_height': 70., 'arms': ((30., 1.), (-30., 1.)), 'elevation': (75., 60.)}}
+
+
+def digitization_table(n_plants=1, n_shoots=10, n_leaves=10, training='vsp', seed=0, plant_spacing=100.,
+                       internode_length=6., spur_spacing=10.):
+    """Generates the digitization table of a virtual vineyard.
+
+    Args:
+        n_plants (int): number of plants, set in a row along the x-axis
+        n_shoots (int): number of primary shoots per plant
+        n_leaves (int): number of primary internodes (hence of primary leaves) per shoot
+        training (str): one of 'vsp', 'gdc' or 'lyre' (see :data:`TRAINING_SYSTEMS`)
+        seed (int): seed of the random perturbations of the geometry
+        plant_spacing (float): [cm] distance between two consecutive plants of the row
+        internode_length (float): [cm] length of primary internodes
+        spur_spacing (float): [cm] distance between two consecutive spurs along an arm
+
+    Returns:
+        (DataFrame): the digitization table, having the columns of :data:`COLUMNS`
+
+    Notes:
+        Each plant has a single trunk which splits into the arms of the training system. Arms bear one spur (a
+            pruning complex and a cane) every :arg:`spur_spacing` and each spur bears two shoots.
+        Secondary shoots are not part of the table, they are added by :func:`hydroshoot.architecture.vine_axeII`
+            (see :func:`synthetic_mtg`).
+
+    """
+    try:
+        system = TRAINING_SYSTEMS[training]
+    except KeyError:
+        raise ValueError("Unknown training system '{}', expected one of {}.".format(
+            training, sorted(TRAINING_SYSTEMS.keys())))
+
+    rng = random.RandomState(seed)
+    arms = system['arms']
+    n_spurs = int(ceil(n_shoots / 2.))
+    elevation_start, elevation_end = radians(system['elevation'])
+
+    rows = []
+    for plant in range(1, n_plants + 1):
+        x0 = (plant - 1) * plant_spacing
+
+        # Trunk
+        n_trunk = int(ceil(system['trunk_height'] / spur_spacing))
+        for i in range(1, n_trunk + 1):
+            z = system['trunk_height'] * i / n_trunk
+            jitter = (0., 0.) if i == n_trunk else rng.uniform(-1., 1., 2)
+            rows.append((plant, 0, i, 0, 0, 0, x0 + jitter[0], jitter[1], z))
+        trunk_top = array((x0, 0., system['trunk_height']))
+
+        shoot_count = 0
+        for arm, (offset, direction) in enumerate(arms, start=1):
+            arm_spurs = n_spurs // len(arms) + (1 if arm <= n_spurs % len(arms) else 0)
+            if arm_spurs == 0:
+                continue
+
+            # Internodes of the arm which reach its lateral offset
+            n_lateral = int(ceil(abs(offset) / spur_spacing))
+            elmnt = 0
+            for i in range(1, n_lateral + 1):
+                elmnt += 1
+                position = trunk_top + (0., offset * i / n_lateral, 0.)
+                rows.append((plant, arm, elmnt, 0, 0, 0) + tuple(position))
+
+            # Internodes of the arm bearing spurs
+            for spur in range(1, arm_spurs + 1):
+                elmnt += 1
+                node = trunk_top + (direction * spur * spur_spacing, offset, rng.uniform(-1., 1.))
+                complex_id = '{}.a'.format(elmnt)
+                rows.append((plant, arm, elmnt, 0, 0, 0) + tuple(node))
+                rows.append((plant, arm, complex_id, 0, 0, 0) + tuple(node + (0., 0., 2.)))
+                cane = node + (0., 0., 4.)
+                rows.append((plant, arm, complex_id, 1, 0, 0) + tuple(cane))
+
+                for shoot in (1, 2):
+                    if shoot_count == n_shoots:
+                        break
+                    shoot_count += 1
+                    base = cane + (direction * (shoot - 1) * 2., 0., 1.)
+                    rows.append((plant, arm, complex_id, 1, shoot, 0) + tuple(base))
+
+                    # Shoots lean outwards of the row, or to either side of it if the arm is on the row
+                    side = sign(offset) if offset != 0 else rng.choice((-1., 1.))
+                    azimuth = side * pi / 2. + rng.uniform(-0.3, 0.3)
+                    for row in range(1, n_leaves + 1):
+                        weight = (row - 1.) / max(1, n_leaves - 1)
+                        elevation = (1 - weight) * elevation_start + weight * elevation_end + rng.uniform(-0.1, 0.1)
+                        base = base + internode_length * array(
+                            (cos(elevation) * cos(azimuth), cos(elevation) * sin(azimuth), sin(elevation)))
+                        rows.append((plant, arm, complex_id, 1, shoot, row) + tuple(base))
+
+    table = DataFrame(rows, columns=COLUMNS)
+    table[['X', 'Y', 'Z']] = table[['X', 'Y', 'Z']].round(2)
+    return table
+
+
+def write_digitization_table(table, file_path):
+    """Writes a digitization table to a file which can be read by :func:`hydroshoot.architecture.vine_mtg`.
+
+    Args:
+        table (DataFrame): a digitization table, as returned by :func:`digitization_table`
+        file_path (str): path of the file (e.g. 'digit.input')
+
+    """
+    table.to_csv(file_path, sep=';', index=False)
+
+
+def synthetic_mtg(n_plants=1, n_shoots=10, n_leaves=10, training='vsp', seed=0, secondary_shoots=False, **kwargs):
+    """Constructs the mock-up of a virtual vineyard.
+
+    Args:
+        n_plants (int): number of plants
+        n_shoots (int): number of primary shoots per plant
+        n_leaves (int): number of primary leaves per shoot
+        training (str): one of 'vsp', 'gdc' or 'lyre'
+        seed (int): seed of the random perturbations of the geometry, both in the digitization table and in the
+            reconstruction of petioles, leaves and secondary shoots
+        secondary_shoots (bool): if True, secondary shoots are added to primary shoots by
+            :func:`hydroshoot.architecture.vine_axeII`
+        kwargs: other keyword arguments passed to :func:`digitization_table`
+
+    Returns:
+        a multiscale tree graph object
+
+    Notes:
+        The reconstruction follows that of the examples of the `example/virtual_canopies` folder.
+        The global state of the random generator of `numpy`, which is used by :mod:`hydroshoot.architecture`, is
+            restored once the mock-up is built.
+        :func:`hydroshoot.model.run` simulates the hydraulic structure of a single plant, mock-ups of several plants
+            are hence meant for studies of light interception and energy balance.
+
+    """
+    from openalea.mtg import traversal
+
+    table = digitization_table(n_plants, n_shoots, n_leaves, training, seed, **kwargs)
+    digit = StringIO()
+    write_digitization_table(table, digit)
+    digit.seek(0)
+
+    random_state = random.get_state()
+    random.seed(seed)
+    try:
+        g = architecture.vine_mtg(digit)
+        for v in traversal.iter_mtg2(g, g.root):
+            architecture.vine_phyto_modular(g, v)
+            if secondary_shoots:
+                architecture.vine_axeII(g, v, pruning_type='avg_field_model', N_max=6, insert_angle=90,
+                                        N_max_order=6)
+            architecture.vine_petiole(g, v, pet_ins=90., pet_ins_cv=0., phyllo_angle=180.)
+            architecture.vine_leaf(g, v, leaf_inc=-45., leaf_inc_cv=100., lim_max=12.5, lim_min=5.,
+                                   order_lim_max=5.5 if secondary_shoots else 6., max_order=55,
+                                   rand_rot_angle=90., cordon_vector=array([1., 0., 0.]))
+            architecture.vine_mtg_properties(g, v)
+            architecture.vine_mtg_geometry(g, v)
+            architecture.vine_transform(g, v)
+    finally:
+        random.set_state(random_state)
+
+    return g
@@ -5,7 +5,7 @@
 Some useful common functions.
 """
 
-from math import exp
+from numpy import exp
 
 ideal_gas_cst = 8.314510  # L kPa mol-1 K-1
 absolute_zero = -273.15  # absolute zero temperature
@@ -0,0 +1,336 @@
+""" Performance benchmarks of hydroshoot.
+
+This script is not collected by pytest, it is run from the command line:
+
+    python benchmark_hydroshoot.py                  # micro benchmarks (single functions on the potted grapevine)
+    python benchmark_hydroshoot.py --macro          # micro and macro benchmarks (one day of `model.run`)
+    python benchmark_hydroshoot.py -k caribu -r 10  # benchmarks whose name contains 'caribu', timed 10 times
+    python benchmark_hydroshoot.py --scaling        # micro benchmarks on synthetic canopies of increasing size
+
+The result of each benchmark is appended as a JSON line to a history file ('benchmark_history.jsonl' by default),
+together with the commit and the machine it was obtained on, and is compared to the last result of the same benchmark
+recorded in this history.
+"""
+from __future__ import print_function
+
+import json
+import platform
+import shutil
+import subprocess
+import tempfile
+from argparse import ArgumentParser
+from collections import OrderedDict
+from datetime import datetime
+from os.path import dirname, join, abspath
+from time import perf_counter
+
+from numpy import median
+
+import non_regression_data
+from openalea.mtg import traversal
+from hydroshoot import __version__, architecture, energy, exchange, hydraulic, irradiance, model, synthetic
+from hydroshoot.params import Params
+from hydroshoot.profiling import profile_table
+
+examples_dir = join(dirname(abspath(__file__)), '..', 'example')
+default_history = join(dirname(abspath(__file__)), 'benchmark_history.jsonl')
+
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(kind):
+    """Registers a benchmark.
+
+    The decorated function prepares the benchmark and returns the callable to be timed, which may return a dictionary
+    of additional metrics to be recorded.
+    """
+
+    def register(func):
+        BENCHMARKS[func.__name__] = (kind, func)
+        return func
+
+    return register
+
+
+# =============================================================================
+# Micro benchmarks
+# =============================================================================
+
+def _potted_syrah_with_irradiance():
+    g = non_regression_data.potted_syrah()
+    params = Params(join(non_regression_data.sources_dir, 'params.json'))
+    meteo = non_regression_data.meteo().iloc[[12], :]
+
+    g = irradiance.optical_prop(g, leaf_lbl_prefix='L', stem_lbl_prefix=('in', 'Pet', 'cx'), wave_band='SW',
+                                opt_prop=params.irradiance.opt_prop)
+    source, _ = irradiance.irradiance_distribution(meteo, (43.61, 3.87, 44.0), params.irradiance.E_type)
+    g, _ = irradiance.hsCaribu(g, unit_scene_length='cm', source=source, direct=False, infinite=True)
+
+    leaves = energy.get_leaves(g, 'L')
+    for vid in leaves:
+        g.node(vid).psi_head = -0.5
+        g.node(vid).Tlc = meteo.Tac.iloc[0]
+        g.node(vid).Na = 2.
+    return g, params, meteo, source
+
+
+@benchmark('micro')
+def vine_mtg():
+    digit = join(non_regression_data.sources_dir, 'grapevine_pot.csv')
+    return lambda: architecture.vine_mtg(digit)
+
+
+@benchmark('micro')
+def hscaribu():
+    g, params, meteo, source = _potted_syrah_with_irradiance()
+    return lambda: irradiance.hsCaribu(g, unit_scene_length='cm', source=source, direct=False, infinite=True)
+
+
+@benchmark('micro')
+def light_scene():
+    g, params, meteo, source = _potted_syrah_with_irradiance()
+    scene = irradiance.LightScene(g, unit_scene_length='cm', direct=False, infinite=True)
+    return lambda: scene.irradiance(source)
+
+
+@benchmark('micro')
+def gas_exchange_rates():
+    g, params, meteo, source = _potted_syrah_with_irradiance()
+    return lambda: exchange.gas_exchange_rates(g, params.exchange.par_photo, params.exchange.par_photo_N,
+                                               params.exchange.par_gs, meteo, 'Ei', 'L', params.exchange.rbt)
+
+
+@benchmark('micro')
+def leaf_temperature():
+    g, params, meteo, source = _potted_syrah_with_irradiance()
+    exchange.gas_exchange_rates(g, params.exchange.par_photo, params.exchange.par_photo_N, params.exchange.par_gs,
+                                meteo, 'Ei', 'L', params.exchange.rbt)
+    gbh = energy.heat_boundary_layer_conductance(energy.get_leaves_length(g, 'L'),
+                                                 energy.leaf_wind_as_air_wind(g, meteo, 'L'))
+    t_air = meteo.Tac.iloc[0]
+
+    def run():
+        _, n_iter = energy.leaf_temperature(g, meteo, t_soil=t_air, t_sky_eff=t_air - 20., t_init=g.property('Tlc'),
+                                            gbh=gbh, ev=g.property('E'), ei=g.property('Ei'))
+        return {'iterations': n_iter}
+
+    return run
+
+
+def _xylem_water_potential_run(g, params, meteo):
+    exchange.gas_exchange_rates(g, params.exchange.par_photo, params.exchange.par_photo_N, params.exchange.par_gs,
+                                meteo, 'Ei', 'L', params.exchange.rbt)
+    vid_collar = architecture.mtg_base(g, vtx_label='inT')
+    for vid in traversal.pre_order2(g, vid_collar):
+        g.node(vid).Flux = 0.
+    hydraulic_tree = hydraulic.HydraulicTree(g, vid_collar)
+    hydraulic.hydraulic_prop(g, a=params.hydraulic.Kx_dict['a'], b=params.hydraulic.Kx_dict['b'],
+                             min_kmax=params.hydraulic.Kx_dict['min_kmax'], hydraulic_tree=hydraulic_tree)
+    k_vul = params.hydraulic.par_K_vul
+
+    def run():
+        n_iter = hydraulic.xylem_water_potential(g, psi_soil=-0.5, model=k_vul['model'],
+                                                 fifty_cent=k_vul['fifty_cent'], sig_slope=k_vul['sig_slope'],
+                                                 start_vid=vid_collar, hydraulic_tree=hydraulic_tree)
+        return {'iterations': int(n_iter)}
+
+    return run
+
+
+@benchmark('micro')
+def xylem_water_potential():
+    g, params, meteo, source = _potted_syrah_with_irradiance()
+    return _xylem_water_potential_run(g, params, meteo)
+
+
+# =============================================================================
+# Scaling benchmarks
+# =============================================================================
+
+def _synthetic_vine(n_shoots, n_leaves):
+    """Prepares a synthetic VSP vine (see :mod:`hydroshoot.synthetic`) with uniformly irradiated leaves."""
+    g = synthetic.synthetic_mtg(n_shoots=n_shoots, n_leaves=n_leaves, training='vsp')
+    params = Params(join(non_regression_data.sources_dir, 'params.json'))
+    meteo = non_regression_data.meteo().iloc[[12], :]
+
+    for vid in energy.get_leaves(g, 'L'):
+        g.node(vid).Ei = 500.
+        g.node(vid).psi_head = -0.5
+        g.node(vid).Tlc = meteo.Tac.iloc[0]
+        g.node(vid).Na = 2.
+    return g, params, meteo
+
+
+def _register_scaling_benchmarks(n_shoots, n_leaves):
+    size = n_shoots * n_leaves
+
+    def xylem_water_potential_scaling():
+        g, params, meteo = _synthetic_vine(n_shoots, n_leaves)
+        return _xylem_water_potential_run(g, params, meteo)
+
+    def gas_exchange_rates_scaling():
+        g, params, meteo = _synthetic_vine(n_shoots, n_leaves)
+        return lambda: exchange.gas_exchange_rates(g, params.exchange.par_photo, params.exchange.par_photo_N,
+                                                   params.exchange.par_gs, meteo, 'Ei', 'L', params.exchange.rbt)
+
+    for func in (xylem_water_potential_scaling, gas_exchange_rates_scaling):
+        func.__name__ = func.__name__.replace('scaling', '%d_leaves' % size)
+        benchmark('scaling')(func)
+
+
+for _n_shoots, _n_leaves in ((4, 25), (20, 50), (100, 100), (400, 250)):
+    _register_scaling_benchmarks(_n_shoots, _n_leaves)
+
+
+# =============================================================================
+# Macro benchmarks
+# =============================================================================
+
+def _one_day_run(example, build_mtg, **kwargs):
+    """Prepares one day of `model.run` on a copy of an example folder."""
+    wd = join(tempfile.mkdtemp(), example)
+    shutil.copytree(join(examples_dir, example), wd)
+
+    params_path = join(wd, 'params.json')
+    with open(params_path) as f:
+        params = json.load(f)
+    day = params['simulation']['sdate'].split(' ')[0]
+    params['simulation']['sdate'] = day + ' 00:00:00'
+    params['simulation']['edate'] = day + ' 23:00:00'
+    with open(params_path, 'w') as f:
+        json.dump(params, f, indent=2)
+
+    g = build_mtg(wd)
+
+    def run():
+        records = []
+        try:
+            model.run(g, wd + '/', write_result=False, callback=records.append, log_level=None, **kwargs)
+        finally:
+            shutil.rmtree(dirname(wd))
+        table = profile_table(records)
+        return {'phases': table.drop(columns=[c for c in table.columns if c.startswith('iter_')
+                                              or c.endswith('_error')]).sum().round(3).to_dict(),
+                'iterations': {c: int(table[c].sum()) for c in table.columns if c.startswith('iter_')}}
+
+    return run
+
+
+def _field_vine(wd, axe_ii):
+    g = architecture.vine_mtg(join(wd, 'digit.input'))
+    for v in traversal.iter_mtg2(g, g.root):
+        architecture.vine_phyto_modular(g, v)
+        if axe_ii:
+            architecture.vine_axeII(g, v, pruning_type='avg_field_model', N_max=6, insert_angle=90, N_max_order=6)
+        architecture.vine_petiole(g, v, pet_ins=90., pet_ins_cv=0., phyllo_angle=180.)
+        architecture.vine_leaf(g, v, leaf_inc=-45., leaf_inc_cv=100., lim_max=12.5, lim_min=5.,
+                               order_lim_max=5.5 if axe_ii else 6., max_order=55, rand_rot_angle=90.,
+                               cordon_vector=None)
+        architecture.vine_mtg_properties(g, v)
+        architecture.vine_mtg_geometry(g, v)
+        architecture.vine_transform(g, v)
+    return g
+
+
+@benchmark('macro')
+def run_potted_grapevine():
+    return _one_day_run('potted_grapevine', lambda wd: non_regression_data.potted_syrah(),
+                        psi_soil=-0.5, gdd_since_budbreak=1000.)
+
+
+@benchmark('macro')
+def run_vsp_grapevine():
+    return _one_day_run('vsp_ww_grapevine', lambda wd: _field_vine(wd, axe_ii=True))
+
+
+@benchmark('macro')
+def run_gdc_grapevine():
+    return _one_day_run('gdc_can1_grapevine', lambda wd: _field_vine(wd, axe_ii=False))
+
+
+# =============================================================================
+# Runner
+# =============================================================================
+
+def time_benchmark(name, repeat):
+    """Times a benchmark.
+
+    Args:
+        name (str): name of a registered benchmark
+        repeat (int): number of timed calls (macro benchmarks are called once)
+
+    Returns:
+        (dict): the record of the benchmark
+    """
+    kind, setup = BENCHMARKS[name]
+    if kind == 'macro':
+        repeat = 1
+
+    func = setup()
+    durations, metrics = [], {}
+    for _ in range(repeat):
+        time_on = perf_counter()
+        metrics = func() or {}
+        durations.append(perf_counter() - time_on)
+
+    return {'benchmark': name, 'kind': kind, 'repeat': repeat, 'min': min(durations),
+            'median': float(median(durations)), 'mean': sum(durations) / len(durations), 'metrics': metrics}
+
+
+def environment():
+    """Describes the code version and the machine on which benchmarks are run."""
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                         cwd=dirname(abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'date': datetime.now().isoformat(), 'version': __version__, 'commit': commit,
+            'python': platform.python_version(), 'machine': platform.node(), 'processor': platform.processor()}
+
+
+def last_results(history_path):
+    """Reads the last recorded result of each benchmark from a history file."""
+    results = {}
+    try:
+        with open(history_path) as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    results[record['benchmark']] = record
+    except IOError:
+        pass
+    return results
+
+
+def main(argv=None):
+    parser = ArgumentParser(description='Runs the performance benchmarks of hydroshoot.')
+    parser.add_argument('-k', '--keyword', default='', help='only run benchmarks whose name contains this keyword')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='number of timed calls of micro benchmarks')
+    parser.add_argument('--macro', action='store_true', help='also run macro benchmarks (one day simulations)')
+    parser.add_argument('--scaling', action='store_true',
+                        help='also run scaling benchmarks (synthetic canopies of 100 to 100 000 leaves)')
+    parser.add_argument('--history', default=default_history, help='path to the JSON lines history file')
+    parser.add_argument('--label', default='', help='free text recorded with the results (e.g. the tested change)')
+    parser.add_argument('--no-record', action='store_true', help='do not append the results to the history')
+    args = parser.parse_args(argv)
+
+    baseline = last_results(args.history)
+    env = environment()
+
+    for name, (kind, _) in BENCHMARKS.items():
+        if args.keyword not in name or (kind == 'macro' and not args.macro) or (
+                kind == 'scaling' and not args.scaling):
+            continue
+        record = dict(env, label=args.label, **time_benchmark(name, args.repeat))
+
+        previous = baseline.get(name)
+        ratio = '' if previous is None else '(x%.2f vs %s)' % (record['min'] / previous['min'], previous['commit'])
+        print('%-25s %10.4f s %s' % (name, record['min'], ratio))
+
+        if not args.no_record:
+            with open(args.history, 'a') as f:
+                f.write(json.dumps(record, sort_keys=True) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,21 @@
+from os.path import join
+
+import non_regression_data
+from hydroshoot import batch
+
+
+def test_run_batch_reports_results_and_failures_per_scenario():
+    g = non_regression_data.potted_syrah()
+    specs = [{'name': 'potted', 'wd': join(non_regression_data.sources_dir, ''), 'write_result': False,
+              'kwargs': {'psi_soil': -0.5, 'gdd_since_budbreak': 1000.}},
+             {'name': 'missing', 'wd': join(non_regression_data.sources_dir, 'missing', '')}]
+
+    results = batch.run_batch(g, specs, processes=2)
+
+    assert list(results.keys()) == ['potted', 'missing']
+    assert results['potted']['error'] is None
+    assert len(results['potted']['result']) == len(non_regression_data.reference_time_series_output())
+    assert results['missing']['result'] is None
+    assert results['missing']['error'] is not None
+    assert all(result['runtime'] >= 0. for result in results.values())
+    assert 'psi_head' not in g.property_names()
@@ -0,0 +1,33 @@
+from hydroshoot import climate
+
+
+def write_meteo(file_path, nb_steps):
+    with open(file_path, 'w') as f:
+        f.write('time;Tac;hs;Rg;u\n')
+        for hour in range(nb_steps):
+            f.write('2012-08-01 %02d:00;25.;50.;%d;1.\n' % (hour, 100 * hour))
+
+
+def test_parse_meteo_adds_default_co2_concentration_and_atmospheric_pressure(tmpdir):
+    file_path = str(tmpdir.join('meteo.input'))
+    write_meteo(file_path, 3)
+
+    meteo = climate.parse_meteo(file_path)
+    assert list(meteo.Ca) == [400.] * 3
+    assert list(meteo.Pa) == [101.3] * 3
+    assert list(meteo.index) == list(meteo.time)
+
+
+def test_read_meteo_caches_parsed_table_by_file_content(tmpdir):
+    file_path = str(tmpdir.join('meteo.input'))
+    cache_dir = tmpdir.join('cache')
+    write_meteo(file_path, 3)
+
+    meteo = climate.read_meteo(file_path, str(cache_dir))
+    assert len(cache_dir.listdir()) == 1
+    assert climate.read_meteo(file_path, str(cache_dir)).equals(meteo)
+    assert len(cache_dir.listdir()) == 1
+
+    write_meteo(file_path, 4)
+    assert len(climate.read_meteo(file_path, str(cache_dir))) == 4
+    assert len(cache_dir.listdir()) == 2
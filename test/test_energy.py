@@ -1,5 +1,6 @@
 from non_regression_data import potted_syrah, meteo
 from hydroshoot.energy import form_factors_simplified, leaf_temperature, forced_soil_temperature
+from numpy import array, zeros
 from numpy.testing import assert_almost_equal
 import openalea.plantgl.all as pgl
 import hydroshoot.energy as energy
@@ -42,6 +43,22 @@ def test_form_factors_simplified():
     assert_almost_equal(sum(k_leaves.values()), 147.7, 1)
 
 
+def test_form_factors_matrix():
+    g = potted_syrah()
+    leaves = energy.get_leaves(g, leaf_lbl_prefix='L')
+    k_soil, k_sky, k_leaves = energy.form_factors_matrix(g, length_conv=1.e-2, limit=-1.e-4)
+    assert k_leaves.shape == (len(leaves), len(leaves))
+    assert k_leaves.nnz > 0
+    assert (k_leaves.data <= -1.e-4).all()
+    assert_almost_equal(k_leaves.diagonal(), zeros(len(leaves)))
+    for vid in leaves:
+        assert 0. <= k_sky[vid] <= 1.
+        assert 0. <= k_soil[vid] <= 1.
+
+    # a lower threshold retains more leaf pairs
+    assert energy.form_factors_matrix(g, length_conv=1.e-2, limit=-1.e-6)[2].nnz > k_leaves.nnz
+
+
 def test_heat_boundary_layer_conductance():
     g = potted_syrah()
     met = meteo().iloc[[12], :]
@@ -79,4 +96,34 @@ def test_leaf_temperature():
     for vid in tleaf:
         assert tleaf[vid] != met.Tac[0]
         if vid != first:
-            assert tleaf[vid] != tleaf[first]
\ No newline at end of file
+            assert tleaf[vid] != tleaf[first]
+
+
+def test_solve_leaf_energy_balance_closes_the_energy_budget_of_each_leaf():
+    shortwave_abs = array([0., 250., 600.])
+    longwave_inc = array([350., 400., 450.])
+    evap = array([0., 0.002, 0.004])
+    gbh = array([20., 40., 60.])
+    temp_air = 300.
+
+    t_leaf = energy.solve_leaf_energy_balance(array([temp_air] * 3), shortwave_abs, longwave_inc, evap, gbh,
+                                              temp_air)
+    residual = (shortwave_abs + longwave_inc - 2. * energy.e_leaf * energy.sigma * t_leaf ** 4 -
+                energy.lambda_ * evap - gbh * (t_leaf - temp_air))
+    assert_almost_equal(residual, zeros(3), 6)
+
+
+def test_solve_leaf_temperature_converges_to_the_energy_balance_of_each_leaf():
+    shortwave_abs = array([0., 250., 600.])
+    longwave_sky_soil = array([380., 400., 420.])
+    ff_leaves = array([0.1, 0.2, 0.3])
+    evap = array([0., 0.002, 0.004])
+    gbh = array([20., 40., 60.])
+
+    t_leaf, it = energy.solve_leaf_temperature(array([27.] * 3), shortwave_abs, longwave_sky_soil, ff_leaves, evap,
+                                               gbh, 27., t_error_crit=1.e-6)
+    t_leaf_k = t_leaf + 273.15
+    longwave_inc = energy.e_leaf * (longwave_sky_soil + energy.e_leaf * ff_leaves * energy.sigma * t_leaf_k ** 4)
+    assert it < 99
+    assert_almost_equal(energy.solve_leaf_energy_balance(t_leaf_k, shortwave_abs, longwave_inc, evap, gbh, 300.15),
+                        t_leaf_k, 4)
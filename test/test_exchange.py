@@ -338,3 +338,106 @@ def test_transpiration_rate_incrases_as_vapor_pressure_deficit_increases(leaf_lo
     transpiration = [exchange.transpiration_rate(leaf_temp, ea, gs, gb, atmospheric_pressure)
                      for ea in linspace(es, 0, 10)]
     assert all(x <= y for x, y in zip(transpiration, transpiration[1:]))
+
+
+def test_leaf_gas_exchange_rates_matches_single_leaf_calculations(leaf_local_weather=setup_leaf_local_weather()):
+    photo_params = exchange.par_photo_default()
+    photo_n_params = exchange.par_25_N_dict()
+    leaf_temperature = linspace(10., 42., 9)
+    ppfd = linspace(0., 2000., 9)
+    psi = linspace(0., -2., 9)
+    leaf_nitrogen = linspace(1., 3., 9)
+    leaf_length = linspace(5., 15., 9)
+
+    for model in ('misson', 'tuzet', 'linear', 'vpd'):
+        gs_params = {'model': model, 'g0': 0.02, 'm0': 5.278, 'psi0': -1.0, 'D0': 30.0, 'n': 4.0}
+        a_n, c_i, gs, gb, e = exchange.leaf_gas_exchange_rates(
+            leaf_temperature, ppfd, psi, leaf_nitrogen, leaf_length, leaf_local_weather['Tac'],
+            leaf_local_weather['hs'], leaf_local_weather['u'], leaf_local_weather['Ca'], leaf_local_weather['Pa'],
+            photo_params, photo_n_params, gs_params)
+
+        for i in range(len(leaf_temperature)):
+            leaf_par_photo = dict(photo_params)
+            for param_name, n_param_name in (('Vcm25', 'Vcm25_N'), ('Jm25', 'Jm25_N'), ('TPU25', 'TPU25_N'),
+                                             ('Rd', 'Rd_N')):
+                leaf_par_photo[param_name] = (photo_n_params[n_param_name][0] * leaf_nitrogen[i] +
+                                              photo_n_params[n_param_name][1])
+            leaf_par_photo['dHd'] = exchange.dHd_sensibility(psi[i], leaf_temperature[i], dhd_max=200.,
+                                                             dhd_inhib_beg=195., dHd_inhib_max=180.,
+                                                             psi_inhib_beg=-.75, psi_inhib_max=-2.,
+                                                             temp_inhib_beg=32, temp_inhib_max=33)
+            meteo_leaf = leaf_local_weather.copy()
+            meteo_leaf['PPFD'] = ppfd[i]
+            a_n_leaf, _, c_i_leaf, gs_leaf = exchange.an_gs_ci(leaf_par_photo, meteo_leaf, psi[i],
+                                                               leaf_temperature[i], model, 0.02, 2. / 3.,
+                                                               leaf_local_weather['Ca'], 5.278, -1.0, 30.0, 4.0)
+            testing.assert_almost_equal(a_n[i], a_n_leaf, decimal=6)
+            testing.assert_almost_equal(c_i[i], c_i_leaf, decimal=6)
+            testing.assert_almost_equal(gs[i], gs_leaf, decimal=6)
+
+
+def test_leaf_gas_exchange_rates_yield_transpiration_insensitive_to_leaf_water_potential_in_the_dark(
+        leaf_local_weather=setup_leaf_local_weather()):
+    photo_params = exchange.par_photo_default()
+    photo_n_params = exchange.par_25_N_dict()
+    psi = linspace(0., -2., 9)
+    leaf_temperature, ppfd, leaf_nitrogen, leaf_length = [[x] * len(psi) for x in (25., 0., 2., 10.)]
+
+    for model in ('misson', 'tuzet', 'linear'):
+        gs_params = {'model': model, 'g0': 0.02, 'm0': 5.278, 'psi0': -1.0, 'D0': 30.0, 'n': 4.0}
+        a_n, c_i, gs, gb, e = exchange.leaf_gas_exchange_rates(
+            leaf_temperature, ppfd, psi, leaf_nitrogen, leaf_length, leaf_local_weather['Tac'],
+            leaf_local_weather['hs'], leaf_local_weather['u'], leaf_local_weather['Ca'], leaf_local_weather['Pa'],
+            photo_params, photo_n_params, gs_params)
+
+        testing.assert_almost_equal(gs, 0.02, decimal=6)
+        testing.assert_almost_equal(e, e[0], decimal=9)
+        assert all(a_n < 0.)
+
+
+def test_leaf_dark_exchange_rates_matches_leaf_gas_exchange_rates_without_irradiance(
+        leaf_local_weather=setup_leaf_local_weather()):
+    photo_params = exchange.par_photo_default()
+    photo_n_params = exchange.par_25_N_dict()
+    leaf_temperature = linspace(10., 42., 9)
+    psi = linspace(0., -2., 9)
+    leaf_nitrogen = linspace(1., 3., 9)
+    leaf_length = linspace(5., 15., 9)
+    weather = [leaf_local_weather[x] for x in ('Tac', 'hs', 'u', 'Ca', 'Pa')]
+
+    for model in ('misson', 'tuzet', 'linear', 'vpd'):
+        gs_params = {'model': model, 'g0': 0.02, 'm0': 5.278, 'psi0': -1.0, 'D0': 30.0, 'n': 4.0}
+        dark_rates = exchange.leaf_dark_exchange_rates(leaf_temperature, psi, leaf_nitrogen, leaf_length, *weather,
+                                                       photo_params, photo_n_params, gs_params)
+        rates = exchange.leaf_gas_exchange_rates(leaf_temperature, [0.] * 9, psi, leaf_nitrogen, leaf_length,
+                                                 *weather, photo_params, photo_n_params, gs_params)
+
+        a_n, c_i, gs, gb, e = dark_rates
+        testing.assert_almost_equal(a_n, rates[0], decimal=6)
+        testing.assert_almost_equal(c_i, rates[1], decimal=2)
+        testing.assert_array_equal(gs, 0.02)
+        for dark_rate, rate in zip(dark_rates[2:], rates[2:]):
+            testing.assert_almost_equal(dark_rate, rate, decimal=6)
+
+
+def test_leaf_gas_exchange_rates_matches_reference_values(leaf_local_weather=setup_leaf_local_weather()):
+    # reference values computed with the per-leaf implementation preceding the vectorized kernel
+    reference = {'misson': ([7.642884837180613, 10.914334727148443, 1.408372906576858],
+                            [342.3961166083847, 311.1169036112292, 342.7925500381231],
+                            [0.21761312392937732, 0.19900095426194686, 0.02752479300742481]),
+                 'tuzet': ([7.60615070392365, 10.950035223523372, 1.3967288241853026],
+                           [340.52700161692354, 312.05391615307235, 340.3214518284654],
+                           [0.20856651130279968, 0.20220948243720166, 0.025544444685257375])}
+    leaves = [2, 4, 6]
+
+    for model, (a_n_ref, c_i_ref, gs_ref) in reference.items():
+        gs_params = {'model': model, 'g0': 0.02, 'm0': 5.278, 'psi0': -1.0, 'D0': 30.0, 'n': 4.0}
+        a_n, c_i, gs, gb, e = exchange.leaf_gas_exchange_rates(
+            linspace(10., 42., 9)[leaves], linspace(0., 2000., 9)[leaves], linspace(0., -2., 9)[leaves],
+            linspace(1., 3., 9)[leaves], linspace(5., 15., 9)[leaves], leaf_local_weather['Tac'],
+            leaf_local_weather['hs'], leaf_local_weather['u'], leaf_local_weather['Ca'], leaf_local_weather['Pa'],
+            exchange.par_photo_default(), exchange.par_25_N_dict(), gs_params)
+
+        testing.assert_almost_equal(a_n, a_n_ref, decimal=6)
+        testing.assert_almost_equal(c_i, c_i_ref, decimal=6)
+        testing.assert_almost_equal(gs, gs_ref, decimal=6)
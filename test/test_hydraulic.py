@@ -36,6 +36,15 @@ def test_cavitation_factor_increases_as_segment_water_potential_decreases():
         assert all(x >= y for x, y in zip(cavitation, cavitation[1:]))
 
 
+def test_cavitation_factor_derivative_matches_finite_differences():
+    eps = 1.e-6
+    for model in ('misson', 'tuzet', 'linear'):
+        for psi in arange(-0.05, -3, -0.1):
+            derivative = (hydraulic.cavitation_factor(psi + eps, model, -0.51, 3) -
+                          hydraulic.cavitation_factor(psi - eps, model, -0.51, 3)) / (2. * eps)
+            assert abs(hydraulic.cavitation_factor_derivative(psi, model, -0.51, 3) - derivative) < 1.e-5
+
+
 def test_def_param_soil_returns_the_right_soil_property_values():
     ref_values = {'Sand': (0.045, 0.430, 0.145, 2.68, 712.8),
                   'Loamy_Sand': (0.057, 0.410, 0.124, 2.28, 350.2),
@@ -118,3 +127,56 @@ def test_hydraulic_prop_attributes_the_right_properties_to_the_different_organs(
         assert hasattr(n, 'FluxC')
         if n.label.startswith(('in', 'cx', 'Pet')):
             assert hasattr(n, 'Kmax')
+
+
+def test_hydraulic_tree_gives_the_same_hydraulic_structure_as_mtg_traversal():
+    shoots = []
+    for _ in range(2):
+        simple_shoot = potted_syrah()
+        vid_base = architecture.mtg_base(simple_shoot, vtx_label='inT')
+        simple_shoot.node(simple_shoot.root).vid_base = vid_base
+        for vtx_id in traversal.pre_order2(simple_shoot, vid_base):
+            n = simple_shoot.node(vtx_id)
+            n.psi_head = -0.2
+            if n.label.startswith('LI'):
+                n.E = 0.002
+                n.An = 10.
+        shoots.append(simple_shoot)
+
+    mtg_shoot, tree_shoot = shoots
+    hydraulic_tree = hydraulic.HydraulicTree(tree_shoot, length_conv=1.e-2)
+    assert all(hydraulic_tree.parent[row] < row for row in range(1, len(hydraulic_tree)))
+
+    hydraulic.hydraulic_prop(mtg_shoot)
+    hydraulic.hydraulic_prop(tree_shoot, hydraulic_tree=hydraulic_tree)
+    n_iter_mtg = hydraulic.xylem_water_potential(mtg_shoot, psi_soil=-0.5)
+    n_iter_tree = hydraulic.xylem_water_potential(tree_shoot, psi_soil=-0.5, hydraulic_tree=hydraulic_tree)
+
+    assert n_iter_mtg == n_iter_tree
+    for prop in ('Flux', 'psi_head'):
+        for vtx_id, value in mtg_shoot.property(prop).items():
+            assert abs(tree_shoot.property(prop)[vtx_id] - value) < 1.e-9
+
+
+def test_xylem_water_potential_newton_solver_converges_to_the_relaxation_solution():
+    shoots = []
+    for _ in range(2):
+        simple_shoot = potted_syrah()
+        vid_base = architecture.mtg_base(simple_shoot, vtx_label='inT')
+        simple_shoot.node(simple_shoot.root).vid_base = vid_base
+        for vtx_id in traversal.pre_order2(simple_shoot, vid_base):
+            n = simple_shoot.node(vtx_id)
+            n.psi_head = -0.2
+            if n.label.startswith('LI'):
+                n.E = 0.005
+                n.An = 10.
+        hydraulic.hydraulic_prop(simple_shoot)
+        shoots.append(simple_shoot)
+
+    relaxation_shoot, newton_shoot = shoots
+    hydraulic.xylem_water_potential(relaxation_shoot, psi_soil=-0.5, psi_error_crit=1.e-9, max_iter=200)
+    n_iter = hydraulic.xylem_water_potential(newton_shoot, psi_soil=-0.5, psi_error_crit=1.e-6, solver='newton')
+
+    assert n_iter <= 10
+    for vtx_id, psi in relaxation_shoot.property('psi_head').items():
+        assert abs(newton_shoot.property('psi_head')[vtx_id] - psi) < 1.e-5
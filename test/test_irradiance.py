@@ -1,6 +1,15 @@
+import time
+
 from non_regression_data import potted_syrah, meteo
-from hydroshoot.irradiance import irradiance_distribution, hsCaribu, optical_prop, e_conv_PPFD
+from hydroshoot import irradiance
+from hydroshoot.irradiance import (irradiance_distribution, hsCaribu, optical_prop, e_conv_PPFD,
+                                   DirectionalResponses, LightScene, is_dark, utc_times, solar_sources,
+                                   sky_directions, IrradianceCache,
+                                   DirectionBins)
+from numpy import savez
 from numpy.testing import assert_almost_equal
+from pandas import date_range
+from pytz import timezone, utc
 
 
 def test_irradiance_distribution():
@@ -113,4 +122,196 @@ def test_hsCaribu():
     assert len(g.property('geometry')) == ng
     # non regression test
     ei_sum = sum(g.property('Ei').values())
-    assert_almost_equal(ei_sum, 14.83, 2)
\ No newline at end of file
+    assert_almost_equal(ei_sum, 14.83, 2)
+
+
+def test_directional_responses():
+    g = potted_syrah()
+    unit_scene_length = 'cm'
+    g = optical_prop(g)
+    sources = [(300., (0., 0., -1.)), (100., (0.5, 0., -0.866))]
+
+    responses = DirectionalResponses(g, unit_scene_length, direct=False, infinite=False)
+    ei, eabs = responses.irradiance(sources)
+    assert len(responses.directions) == 2
+
+    # weighted responses match a single run with all sources
+    g, cs = hsCaribu(g, unit_scene_length, source=sources, direct=False)
+    for vid in ei:
+        assert_almost_equal(ei[vid], g.property('Ei')[vid], 3)
+        assert_almost_equal(eabs[vid], g.property('Eabs')[vid], 3)
+
+    # known directions are not recomputed
+    assert responses.compute([direction for energy, direction in sources]) == 0
+
+    # night
+    ei, eabs = responses.irradiance([(0, (0, 0, -1))])
+    assert sum(ei.values()) == 0
+
+
+def test_direction_bins_snap_within_tolerance():
+    bins = DirectionBins([(0., 0., -2.), (1., 0., -1.)], tolerance=5.)
+
+    direction, deviation = bins.snap((0.05, 0., -1.))
+    assert direction == (0., 0., -1.)
+    assert_almost_equal(deviation, 2.862, 3)
+
+    direction, deviation = bins.snap((0.5, 0., -1.))
+    assert direction is None
+    assert deviation > 5.
+
+
+def test_directional_responses_with_binned_directions():
+    g = optical_prop(potted_syrah())
+    bins = DirectionBins([(0., 0., -1.), (0.6, 0., -0.8)], tolerance=2.)
+    responses = DirectionalResponses(g, 'cm', direct=False, infinite=False, bins=bins)
+
+    ei, eabs = responses.irradiance([(300., (0.01, 0., -1.))], sun=(0.01, 0., -1.))
+    ei_bin, eabs_bin = responses.irradiance([(300., (0., 0., -1.))])
+    assert len(responses.directions) == 1
+    assert ei == ei_bin
+
+    responses.irradiance([(100., (0.61, 0., -0.8))], sun=(0.61, 0., -0.8))
+    assert len(responses.directions) == 2
+
+    # directions beyond the tolerance are computed exactly
+    responses.irradiance([(100., (0., 0.5, -0.866))], sun=(0., 0.5, -0.866))
+    assert len(responses.directions) == 3
+
+    report = responses.binning_report(samples=1)
+    assert report['directions'] == 3
+    assert report['binned'] == 2
+    assert report['responses'] == 3
+    assert report['max_deviation'] < 2.
+    assert 0 <= report['max_error'] < 0.1
+
+
+def test_directional_responses_bin_only_the_sun_direction():
+    g = optical_prop(potted_syrah())
+    sky, weights = sky_directions('16', 'soc')
+    sun = (0.61, 0., -0.8)
+    responses = DirectionalResponses(g, 'cm', direct=False, infinite=False,
+                                     bins=DirectionBins([(0.6, 0., -0.8)], tolerance=90.))
+
+    source = [(100. * weight, tuple(direction)) for weight, direction in zip(weights, sky.tolist())]
+    responses.irradiance(source + [(300., sun)], sun=sun)
+
+    # turtle sky directions lie within the tolerance of the bin, but are computed exactly
+    assert all(responses.direction_key(direction) in responses.directions for direction in sky.tolist())
+    assert responses.direction_key((0.6, 0., -0.8)) in responses.directions
+    assert responses.direction_key(sun) not in responses.directions
+    assert len(responses.directions) == len(sky) + 1
+
+    report = responses.binning_report(samples=0)
+    assert report['directions'] == 1
+    assert report['binned'] == 1
+    assert report['max_deviation'] > 0.
+
+
+def test_light_scene_matches_hsCaribu():
+    g = optical_prop(potted_syrah())
+    scene = LightScene(g, 'cm', direct=False, infinite=False)
+
+    for sources in ([(300., (0., 0., -1.))], [(100., (0.5, 0., -0.866)), (50., (0., 0.5, -0.866))]):
+        ei, eabs = scene.irradiance(sources)
+        g, cs = hsCaribu(g, 'cm', source=sources, direct=False)
+        for vid in ei:
+            assert_almost_equal(ei[vid], g.property('Ei')[vid], 6)
+            assert_almost_equal(eabs[vid], g.property('Eabs')[vid], 6)
+
+    # night
+    ei, eabs = scene.irradiance([(0, (0, 0, -1))])
+    assert sum(ei.values()) == 0
+    assert set(ei) == set(g.property('geometry'))
+
+
+def test_is_dark_only_for_null_irradiance():
+    met = meteo()
+    assert is_dark(met.iloc[[0], :], 'Rg_Watt/m2')
+    assert not is_dark(met.iloc[[12], :], 'Rg_Watt/m2')
+
+    met['PPFD'] = met.Rg * e_conv_PPFD('Rg_Watt/m2')
+    assert is_dark(met.iloc[[0], :], 'PPFD_umol/m2/s')
+    assert not is_dark(met.iloc[[0, 12], :], 'PPFD_umol/m2/s')
+
+
+def test_utc_times_at_daylight_saving_time_changes():
+    tz = timezone('Europe/Paris')
+    dates = date_range('2012-03-24', '2012-03-26', freq='H').append(date_range('2012-10-27', '2012-10-29', freq='H'))
+    times = utc_times(dates, 'Europe/Paris')
+    for date, time in zip(dates, times):
+        assert time == tz.localize(date.to_pydatetime()).astimezone(utc)
+
+
+def test_irradiance_distribution_from_precomputed_solar_sources():
+    location = (43.61, 3.87, 44.0)
+    e_type = 'Rg_Watt/m2'
+    met = meteo()
+    solar = solar_sources(met, location, e_type)
+    assert list(solar.index) == list(met.index)
+
+    for rows in ([12], [60], list(range(24)), list(range(48, 72))):
+        assert irradiance_distribution(met.iloc[rows, :], location, e_type, solar=solar.iloc[rows]) == \
+               irradiance_distribution(met.iloc[rows, :], location, e_type)
+
+
+def test_sky_directions_are_shared_and_persisted(tmpdir):
+    directions, weights = sky_directions('16', 'soc')
+    assert directions.shape == (16, 3)
+    assert weights.shape == (16,)
+    assert not directions.flags.writeable
+    assert sky_directions('16', 'soc')[0] is directions
+
+    cache_dir = tmpdir.join('cache')
+    irradiance._sky_cache.clear()
+    sky_directions('16', 'soc', cache_dir=str(cache_dir))
+    assert cache_dir.listdir() == [cache_dir.join('sky_turtle16_soc.npz')]
+
+    irradiance._sky_cache.clear()
+    cached_directions, cached_weights = sky_directions('16', 'soc', cache_dir=str(cache_dir))
+    assert (cached_directions == directions).all()
+    assert (cached_weights == weights).all()
+
+
+def test_irradiance_cache_keys_and_evicts_least_recently_used_results(tmpdir):
+    cache = IrradianceCache(str(tmpdir.join('cache')), max_size=1.2e-3, decimals=6)
+
+    key = cache.key('scene', [(100., (0., 0., -1.))])
+    assert key == cache.key('scene', [(100. + 1.e-9, (0., -0., -1.))])
+    assert key != cache.key('other scene', [(100., (0., 0., -1.))])
+    assert key != cache.key('scene', [(101., (0., 0., -1.))])
+
+    assert cache.get(key) is None
+    cache.put(key, [1., 2.], [0.5, 1.])
+    ei, eabs = cache.get(key)
+    assert list(ei) == [1., 2.] and list(eabs) == [0.5, 1.]
+
+    # results take about 0.5 kB each, so that the cache holds two of them
+    keys = [cache.key('scene', [(float(energy), (0., 0., -1.))]) for energy in range(3)]
+    for i, other_key in enumerate(keys):
+        time.sleep(0.01)
+        cache.get(key)  # keeps the first results in use
+        cache.put(other_key, [float(i)] * 2, [float(i)] * 2)
+
+    assert cache.get(key) is not None
+    assert cache.get(keys[-1]) is not None
+    assert all(cache.get(k) is None for k in keys[:-1])
+
+
+def test_irradiance_cache_removes_corrupt_results(tmpdir):
+    cache = IrradianceCache(str(tmpdir.join('cache')))
+
+    for content in (b'not a zip file', b'PK\x03\x04 truncated'):
+        key = cache.key('scene', [(len(content), (0., 0., -1.))])
+        cache.put(key, [1., 2.], [0.5, 1.])
+        with open(cache._path(key), 'wb') as f:
+            f.write(content)
+        assert cache.get(key) is None
+        assert not tmpdir.join('cache', cache.prefix + key + '.npz').exists()
+
+    # results missing from a valid file
+    key = cache.key('scene', [(1., (0., 0., -1.))])
+    with open(cache._path(key), 'wb') as f:
+        savez(f, ei=[1., 2.])
+    assert cache.get(key) is None
+    assert not tmpdir.join('cache', cache.prefix + key + '.npz').exists()
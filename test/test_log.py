@@ -0,0 +1,19 @@
+import logging
+
+from hydroshoot import log
+
+
+def test_set_console_level_silences_all_messages_when_level_is_none():
+    log.set_console_level(None)
+    assert not log.logger.isEnabledFor(logging.CRITICAL)
+    assert not logging.getLogger('hydroshoot.solver').isEnabledFor(logging.INFO)
+
+
+def test_set_console_level_enables_messages_of_hydroshoot_modules():
+    log.set_console_level(logging.DEBUG)
+    assert logging.getLogger('hydroshoot.solver').isEnabledFor(logging.DEBUG)
+
+    log.set_console_level(logging.INFO)
+    assert logging.getLogger('hydroshoot.model').isEnabledFor(logging.INFO)
+    assert not logging.getLogger('hydroshoot.solver').isEnabledFor(logging.DEBUG)
+    assert len([h for h in log.logger.handlers if isinstance(h, logging.StreamHandler)]) == 1
@@ -1,9 +1,27 @@
 """ A global test of hydroshoot model on potted grapevine, to secure refactoring"""
+from json import dump, load
 from os.path import join
-from numpy.testing import assert_array_almost_equal
+from shutil import copyfile
+
+from numpy import median, zeros
+from numpy.testing import assert_array_almost_equal, assert_allclose, assert_array_equal
+from pandas import read_csv
 
 import non_regression_data
-from hydroshoot import model
+from hydroshoot import model, exchange
+from hydroshoot.params import Params
+
+
+def copy_inputs(tmpdir, **simulation):
+    """Copies the inputs of the potted grapevine to `tmpdir`, overriding the given simulation parameters."""
+    copyfile(join(non_regression_data.sources_dir, 'meteo.input'), str(tmpdir.join('meteo.input')))
+    with open(join(non_regression_data.sources_dir, 'params.json')) as f:
+        params = load(f)
+    params['simulation'].update(simulation)
+    with open(str(tmpdir.join('params.json')), 'w') as f:
+        dump(params, f)
+    tmpdir.mkdir('output')
+    return join(str(tmpdir), '')
 
 
 def test_potted_grapevine():
@@ -13,3 +31,82 @@ def test_potted_grapevine():
     ref = non_regression_data.reference_time_series_output()
     # do not compare date index
     assert_array_almost_equal(ref.iloc[0, 1:], results.reset_index(drop=True).iloc[0, :], decimal=0)
+
+
+def test_iter_run_yields_one_record_per_time_step():
+    g = non_regression_data.potted_syrah()
+    records = list(model.iter_run(g, join(non_regression_data.sources_dir, ''), psi_soil=-0.5,
+                                  gdd_since_budbreak=1000., leaf_properties=['Tlc', 'gs']))
+    ref = non_regression_data.reference_time_series_output()
+    assert len(records) == len(ref)
+    for record in records:
+        assert len(record['leaf_properties']['gs']) == len(record['leaf_vids'])
+        assert record['Tleaf'] == median(record['leaf_properties']['Tlc'])
+
+
+def test_write_checkpoint_replaces_previous_checkpoint(tmpdir):
+    file_path = str(tmpdir.join('checkpoint.pckl'))
+    model.write_checkpoint(file_path, {'step': 1, 'psi_soil': -0.5})
+    model.write_checkpoint(file_path, {'step': 2, 'psi_soil': -0.6})
+    assert model.read_checkpoint(file_path) == {'step': 2, 'psi_soil': -0.6}
+    assert tmpdir.listdir() == [tmpdir.join('checkpoint.pckl')]
+
+
+def test_dark_time_steps_are_solved_with_the_night_equations(tmpdir):
+    wd = copy_inputs(tmpdir, sdate='2012-08-01 01:00:00', edate='2012-08-01 03:00:00')
+    g = non_regression_data.potted_syrah()
+    records = list(model.iter_run(g, wd, psi_soil=-0.5, gdd_since_budbreak=1000.,
+                                  leaf_properties=['Tlc', 'psi_head', 'Na', 'Length', 'An', 'gs', 'E']))
+
+    params = Params(wd + 'params.json')
+    meteo = read_csv(wd + 'meteo.input', sep=';', index_col='time', parse_dates=True)
+    assert len(records) == 3
+    for record in records:
+        # a single hydraulic pass per leaf temperature iteration
+        assert record['Rg'] == 0.
+        assert record['iterations']['hydraulic'] == record['iterations']['temperature']
+
+        # closed form night equations (An = -Rd, gs = g0) as the limit of the full equations without irradiance
+        leaf = record['leaf_properties']
+        a_n, _, gs, _, e = exchange.leaf_gas_exchange_rates(
+            leaf['Tlc'], zeros(len(record['leaf_vids'])), leaf['psi_head'], leaf['Na'], leaf['Length'],
+            *meteo.loc[record['date'], ['Tac', 'hs', 'u', 'Ca', 'Pa']], params.exchange.par_photo,
+            params.exchange.par_photo_N, params.exchange.par_gs, params.exchange.rbt)
+        assert_array_equal(leaf['gs'], params.exchange.par_gs['g0'])
+        assert_allclose(leaf['An'], a_n, rtol=1.e-2)
+        assert_allclose(leaf['E'], e, rtol=1.e-2)
+
+
+def test_iter_run_resumed_from_a_checkpoint_matches_an_uninterrupted_run(tmpdir):
+    simulation = {'sdate': '2012-08-01 10:00:00', 'edate': '2012-08-01 12:00:00'}
+    kwargs = {'psi_soil': -0.5, 'gdd_since_budbreak': 1000., 'leaf_properties': ['psi_head', 'Tlc', 'An', 'gs']}
+    prop_names = ('psi_head', 'Tlc', 'An', 'gs', 'E', 'Flux', 'FluxC')
+
+    g_ref = non_regression_data.potted_syrah()
+    reference = list(model.iter_run(g_ref, copy_inputs(tmpdir.mkdir('uninterrupted'), **simulation), **kwargs))
+
+    # interrupted after the second time step, then resumed from its checkpoint
+    wd = copy_inputs(tmpdir.mkdir('resumed'), **simulation)
+    records = model.iter_run(non_regression_data.potted_syrah(), wd, checkpoint_interval=1, **kwargs)
+    for _ in range(2):
+        next(records)
+    records.close()
+
+    g = non_regression_data.potted_syrah()
+    resumed = list(model.iter_run(g, wd, checkpoint_interval=1, resume=True, **kwargs))
+
+    assert len(resumed) == len(reference) == 3
+    for record, ref_record in zip(resumed, reference):
+        assert record['date'] == ref_record['date']
+        for loop in ('temperature', 'hydraulic', 'xylem'):
+            assert record['iterations'][loop] == ref_record['iterations'][loop]
+        assert_allclose([record[name] for name in ('Rg', 'An', 'E', 'Tleaf', 'psi_soil')],
+                        [ref_record[name] for name in ('Rg', 'An', 'E', 'Tleaf', 'psi_soil')], rtol=1.e-6)
+    assert 'leaf_properties' not in resumed[1]
+    for name in kwargs['leaf_properties']:
+        assert_allclose(resumed[-1]['leaf_properties'][name], reference[-1]['leaf_properties'][name], rtol=1.e-6)
+    for name in prop_names:
+        vids = sorted(g_ref.property(name))
+        assert sorted(g.property(name)) == vids
+        assert_allclose([g.property(name)[vid] for vid in vids], [g_ref.property(name)[vid] for vid in vids],
+                        rtol=1.e-6)
@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+
+from numpy import testing
+from openalea.mtg import MTG
+
+from hydroshoot import output
+
+
+def fill_store(path, vids, nb_steps=12, chunk_size=5):
+    g = MTG()
+    first_date = datetime(2012, 8, 1)
+    with output.ColumnarWriter(path, vids, ('psi_head', 'Tlc'), chunk_size=chunk_size) as writer:
+        for i in range(nb_steps):
+            g.properties()['psi_head'] = {vid: -0.1 * i - 0.01 * vid for vid in vids}
+            g.properties()['Tlc'] = {vids[-1]: 20. + i}
+            writer.append(g, first_date + timedelta(hours=i))
+    return first_date
+
+
+def test_columnar_store_reads_back_the_written_time_series(tmpdir):
+    path = str(tmpdir.join('results'))
+    vids = [3, 5, 7]
+    first_date = fill_store(path, vids)
+
+    reader = output.ColumnarReader(path)
+    assert len(reader.times) == 12
+
+    psi = reader.read('psi_head', start=first_date + timedelta(hours=3), end=first_date + timedelta(hours=6),
+                      vids=[5])
+    testing.assert_almost_equal(psi[5].values, [-0.35, -0.45, -0.55, -0.65])
+
+    assert reader.snapshot('Tlc', first_date + timedelta(hours=2)) == {7: 22.}
+
+
+def test_columnar_store_truncate_removes_posterior_time_steps(tmpdir):
+    path = str(tmpdir.join('results'))
+    vids = [3, 5, 7]
+    first_date = fill_store(path, vids)
+
+    output.ColumnarWriter(path, vids, ('psi_head', 'Tlc'), chunk_size=5, append=True).truncate(
+        first_date + timedelta(hours=6))
+    assert output.ColumnarReader(path).times[-1] == first_date + timedelta(hours=6)
+
+
+def test_columnar_store_is_overwritten_by_a_new_run(tmpdir):
+    path = str(tmpdir.join('results'))
+    vids = [3, 5, 7]
+    fill_store(path, vids, nb_steps=3)
+    first_date = fill_store(path, vids, nb_steps=3)
+
+    reader = output.ColumnarReader(path)
+    assert list(reader.times) == [first_date + timedelta(hours=i) for i in range(3)]
@@ -0,0 +1,46 @@
+from multiprocessing import get_context
+
+from hydroshoot import irradiance
+from hydroshoot.pipeline import IrradiancePipeline
+from hydroshoot.stages import forked_workers_allowed
+from non_regression_data import meteo
+
+
+class WeightedEnergy(object):
+    """Stands for a light scene of two elements, each intercepting a fixed share of the energy of sources."""
+
+    def irradiance(self, source):
+        energy = sum(isource[0] for isource in source)
+        return {1: 0.8 * energy, 2: 0.2 * energy}, {1: 0.7 * energy, 2: 0.1 * energy}
+
+
+def test_pipeline_matches_irradiance_computed_in_main_process():
+    met = meteo().iloc[:48]
+    args = dict(geo_location=(43.61, 3.87, 44.0), irradiance_unit='Rg_Watt/m2', time_zone='Europe/Paris',
+                turtle_sectors='16')
+    solar = irradiance.solar_sources(met, args['geo_location'], args['irradiance_unit'], args['time_zone'])
+    light_scene = WeightedEnergy()
+    steps = [step for step in range(len(met)) if not irradiance.is_dark(met.iloc[step:step + 1], 'Rg_Watt/m2')]
+
+    with IrradiancePipeline(light_scene, met, solar, steps, processes=2, lookahead=3, **args) as pipeline:
+        for step in steps:
+            diffuse_ratio, ei, eabs = pipeline.get(step)
+            source, expected_ratio = irradiance.irradiance_distribution(met.iloc[[step]], **args)
+            assert diffuse_ratio == expected_ratio
+            assert (ei, eabs) == light_scene.irradiance(source)
+
+
+def _pipeline_in_daemonic_process(_):
+    try:
+        IrradiancePipeline(WeightedEnergy(), meteo().iloc[:2], None, [0, 1], processes=1)
+    except RuntimeError as err:
+        return err.args[0]
+    return None
+
+
+def test_pipeline_raises_error_in_daemonic_processes():
+    assert forked_workers_allowed()
+
+    with get_context('fork').Pool(1) as pool:
+        message = pool.map(_pipeline_in_daemonic_process, [0])[0]
+    assert message.startswith('Irradiance workers can only be forked from a non-daemonic process')
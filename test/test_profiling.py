@@ -0,0 +1,47 @@
+from datetime import datetime
+
+from hydroshoot.profiling import PhaseTimer, profile_table, PHASES
+
+
+def test_phase_timer_sums_durations_of_repeated_phases():
+    timer = PhaseTimer()
+    for _ in range(3):
+        with timer.phase('hydraulic_prop'):
+            sum(range(1000))
+    with timer.phase('leaf_temperature'):
+        pass
+
+    assert timer.calls == {'hydraulic_prop': 3, 'leaf_temperature': 1}
+    assert all(duration >= 0. for duration in timer.durations.values())
+
+    timer.reset()
+    assert timer.durations == {}
+
+
+def test_phase_timer_times_phases_that_raise_errors():
+    timer = PhaseTimer()
+    try:
+        with timer.phase('hsCaribu'):
+            raise ValueError
+    except ValueError:
+        pass
+
+    assert 'hsCaribu' in timer.durations
+
+
+def test_profile_table_has_one_row_per_timed_record():
+    iterations = {'temperature': 3, 'hydraulic': 5, 'xylem': 12, 't_error': 0.01, 'psi_error': 0.002}
+    records = [
+        {'date': datetime(2012, 8, 1, 0), 'iterations': iterations},
+        {'date': datetime(2012, 8, 1, 1), 'iterations': iterations,
+         'timings': {'gas_exchange_rates': 0.1, 'leaf_temperature': 0.2, 'total': 0.4}},
+        {'date': datetime(2012, 8, 1, 2), 'iterations': iterations,
+         'timings': {'irradiance_distribution': 0.5, 'hsCaribu': 1., 'gas_exchange_rates': 0.1, 'total': 1.8}}]
+
+    table = profile_table(records)
+
+    assert list(table.index) == [datetime(2012, 8, 1, 1), datetime(2012, 8, 1, 2)]
+    assert list(table.columns[:4]) == [name for name in PHASES if name in table.columns]
+    assert table.loc[datetime(2012, 8, 1, 2), 'total'] == 1.8
+    assert table['iter_xylem'].tolist() == [12, 12]
+    assert table['psi_error'].tolist() == [0.002, 0.002]
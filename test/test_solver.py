@@ -0,0 +1,60 @@
+import pytest
+from numpy import array, testing
+
+from hydroshoot.solver import WarmStart
+
+
+def test_warm_start_has_no_guess_before_a_time_step_is_solved():
+    assert WarmStart().guess(psi_soil=-0.2, air_temperature=25.) is None
+
+
+def test_warm_start_follows_changes_of_boundary_conditions():
+    warm_start = WarmStart('previous')
+    warm_start.update(array([-0.2, -0.5]), -0.2, array([27., 30.]), 25.)
+
+    psi, temperature = warm_start.guess(psi_soil=-0.3, air_temperature=20.)
+    testing.assert_almost_equal(psi, [-0.3, -0.6])
+    testing.assert_almost_equal(temperature, [22., 25.])
+
+
+def test_warm_start_extrapolates_the_last_two_time_steps():
+    warm_start = WarmStart('extrapolated')
+    warm_start.update(array([-0.2, -0.3]), -0.2, array([25.]), 25.)
+    psi, temperature = warm_start.guess(psi_soil=-0.2, air_temperature=25.)
+    testing.assert_almost_equal(psi, [-0.2, -0.3])
+
+    warm_start.update(array([-0.2, -0.5]), -0.2, array([26.]), 25.)
+    warm_start.update(array([-0.2, -0.6]), -0.2, array([28.]), 25.)
+    psi, temperature = warm_start.guess(psi_soil=-0.2, air_temperature=25.)
+    testing.assert_almost_equal(psi, [-0.2, -0.7])
+    testing.assert_almost_equal(temperature, [30.])
+    assert len(warm_start) == 2
+
+
+def test_warm_start_bounds_xylem_water_potential_by_soil_water_potential():
+    warm_start = WarmStart('extrapolated')
+    warm_start.update(array([-0.5]), -0.2, array([25.]), 25.)
+    warm_start.update(array([-0.3]), -0.2, array([25.]), 25.)
+
+    psi, _ = warm_start.guess(psi_soil=-0.2, air_temperature=25.)
+    testing.assert_almost_equal(psi, [-0.2])
+
+
+def test_warm_start_raises_error_for_unrecognized_mode():
+    with pytest.raises(ValueError, match="must be one of 'previous' or 'extrapolated', got 'linear'"):
+        WarmStart('linear')
+
+
+def test_warm_start_compares_iterations_of_cold_and_warm_time_steps():
+    warm_start = WarmStart()
+    savings = warm_start.savings()
+    assert savings['temperature'] == {'cold_steps': 0, 'warm_steps': 0, 'cold': None, 'warm': None, 'saved': None}
+
+    warm_start.record({'temperature': 6, 'hydraulic': 30, 'xylem': 300, 'warm_start': False})
+    warm_start.record({'temperature': 3, 'hydraulic': 10, 'xylem': 120, 'warm_start': True})
+    warm_start.record({'temperature': 2, 'hydraulic': 12, 'xylem': 100, 'warm_start': True})
+
+    savings = warm_start.savings()
+    assert savings['temperature'] == {'cold_steps': 1, 'warm_steps': 2, 'cold': 6., 'warm': 2.5, 'saved': 7.}
+    assert savings['hydraulic']['saved'] == 38.
+    assert savings['xylem']['saved'] == 380.
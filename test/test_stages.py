@@ -0,0 +1,58 @@
+import time
+from multiprocessing import get_context
+
+from hydroshoot.stages import StageRunner
+
+
+def _sleep(duration, value):
+    time.sleep(duration)
+    return value
+
+
+def _fail():
+    raise ValueError('stage failed')
+
+
+def test_stages_run_concurrently_and_report_critical_path():
+    for processes in (0, 2):
+        runner = StageRunner(processes)
+        with runner.stage('setup'):
+            time.sleep(0.05)
+        runner.submit('long', _sleep, 0.3, 'long')
+        runner.submit('short', _sleep, 0.1, 'short')
+        with runner.stage('main'):
+            time.sleep(0.05)
+        assert runner.result('short') == 'short'
+        assert runner.result('long') == 'long'
+
+        report = runner.report()
+        assert set(report.index) == {'setup', 'long', 'short', 'main'}
+        if processes == 0:
+            assert report.critical.all()
+            assert report.end.max() >= 0.5
+        else:
+            assert list(report.index[report.critical]) == ['setup', 'long']
+            assert report.end.max() < 0.5
+            assert (report.process[['long', 'short']] == 'worker').all()
+
+
+def test_stage_errors_are_raised_in_main_process():
+    runner = StageRunner(1)
+    runner.submit('failing', _fail)
+    try:
+        runner.result('failing')
+    except ValueError as err:
+        assert err.args[0] == 'stage failed'
+    else:
+        raise AssertionError('error not raised')
+
+
+def _run_stages_in_daemonic_process(_):
+    runner = StageRunner(2)
+    runner.submit('short', _sleep, 0., 'short')
+    return runner.processes, runner.result('short'), runner.report().process['short']
+
+
+def test_stages_run_in_main_process_of_daemonic_processes():
+    with get_context('fork').Pool(1) as pool:
+        assert pool.map(_run_stages_in_daemonic_process, [0]) == [(0, 'short', 'main')]
@@ -0,0 +1,34 @@
+from numpy import isnan
+from numpy.testing import assert_array_equal
+
+from hydroshoot import energy
+from hydroshoot.state import ShootState
+from non_regression_data import potted_syrah
+
+
+def test_shoot_state_rows_follow_the_order_of_vertices():
+    state = ShootState([5, 3, 9])
+    assert len(state) == 3
+    assert_array_equal(state.rows([9, 5]), [2, 0])
+
+
+def test_shoot_state_broadcasts_scalar_values():
+    state = ShootState([5, 3, 9])
+    state['psi_head'] = -0.5
+    assert 'psi_head' in state
+    assert_array_equal(state['psi_head'], [-0.5, -0.5, -0.5])
+
+
+def test_shoot_state_round_trips_mtg_properties():
+    g = potted_syrah()
+    leaves = energy.get_leaves(g, leaf_lbl_prefix='L')
+    g.properties()['Tlc'] = {vid: float(vid) for vid in leaves}
+
+    state = ShootState.from_mtg(g, g.property('label').keys(), ['Tlc'])
+    leaf_rows = state.rows(leaves)
+    assert_array_equal(state['Tlc'][leaf_rows], leaves)
+    assert isnan(state['Tlc']).sum() == len(state) - len(leaves)
+
+    state['Tlc'][leaf_rows] += 1.
+    state.to_mtg(g, ['Tlc'], rows=leaf_rows)
+    assert all(g.node(vid).Tlc == vid + 1. for vid in leaves)
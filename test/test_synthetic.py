@@ -0,0 +1,29 @@
+import pytest
+
+from hydroshoot import synthetic, energy
+
+
+def test_digitization_table_has_the_required_numbers_of_plants_shoots_and_leaves():
+    for training in synthetic.TRAINING_SYSTEMS:
+        table = synthetic.digitization_table(n_plants=3, n_shoots=7, n_leaves=12, training=training)
+        assert list(table.columns) == synthetic.COLUMNS
+        assert sorted(table.Plant_Nb.unique()) == [1, 2, 3]
+        shoots = table[table.Rameau != 0]
+        assert len(shoots[shoots.Row == 0]) == 3 * 7
+        assert len(shoots[shoots.Row > 0]) == 3 * 7 * 12
+
+
+def test_digitization_table_is_reproducible():
+    table = synthetic.digitization_table(n_shoots=4, n_leaves=5, seed=1)
+    assert table.equals(synthetic.digitization_table(n_shoots=4, n_leaves=5, seed=1))
+    assert not table.equals(synthetic.digitization_table(n_shoots=4, n_leaves=5, seed=2))
+
+
+def test_digitization_table_raises_error_on_unknown_training_system():
+    with pytest.raises(ValueError, match="Unknown training system 'pergola'"):
+        synthetic.digitization_table(training='pergola')
+
+
+def test_synthetic_mtg_has_one_leaf_per_primary_internode():
+    g = synthetic.synthetic_mtg(n_plants=2, n_shoots=3, n_leaves=4, training='vsp')
+    assert len(energy.get_leaves(g, leaf_lbl_prefix='L')) == 2 * 3 * 4